@@ -4,7 +4,8 @@ from django.utils.translation import gettext_lazy as _
 from django.contrib.auth import get_user_model
 from .models import (
     Endereco, Familia, Responsavel, MembroFamilia, Turma, 
-    Encontro, Presenca, EntregaCesta, ConfiguracaoSistema
+    Encontro, Presenca, EntregaCesta, ConfiguracaoSistema, ProgramaSocial, FrequenciaMensal,
+    AlocacaoTurma
 )
 
 User = get_user_model()
@@ -50,7 +51,7 @@ class MembroFamiliaInline(admin.StackedInline):
 @admin.register(Familia)
 class FamiliaAdmin(admin.ModelAdmin):
     list_display = ('nome', 'endereco', 'recebe_programas_sociais', 'data_cadastro')
-    list_filter = ('recebe_programas_sociais', 'data_cadastro')
+    list_filter = ('recebe_programas_sociais', 'programas', 'data_cadastro')
     search_fields = ('nome', 'endereco__rua', 'endereco__bairro', 'endereco__cidade')
     inlines = [ResponsavelInline, MembroFamiliaInline]
     fieldsets = (
@@ -64,6 +65,11 @@ class FamiliaAdmin(admin.ModelAdmin):
     )
     readonly_fields = ('data_cadastro', 'data_atualizacao')
 
+@admin.register(ProgramaSocial)
+class ProgramaSocialAdmin(admin.ModelAdmin):
+    list_display = ('nome',)
+    search_fields = ('nome',)
+
 @admin.register(Responsavel)
 class ResponsavelAdmin(admin.ModelAdmin):
     list_display = ('nome_completo', 'familia', 'principal', 'telefone', 'data_nascimento')
@@ -118,6 +124,34 @@ class PresencaAdmin(admin.ModelAdmin):
     list_select_related = ('membro', 'encontro', 'usuario_registro')
     readonly_fields = ('data_registro', 'usuario_registro')
 
+@admin.register(AlocacaoTurma)
+class AlocacaoTurmaAdmin(admin.ModelAdmin):
+    # Recalculada por atendimento.turmas; apenas consulta
+    list_display = ('membro', 'turma', 'data_referencia')
+    list_filter = ('turma',)
+    search_fields = ('membro__nome_completo',)
+    list_select_related = ('membro', 'turma')
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(FrequenciaMensal)
+class FrequenciaMensalAdmin(admin.ModelAdmin):
+    # Mantida pelos sinais de Presenca e Encontro; apenas consulta
+    list_display = ('membro', 'mes', 'total_encontros', 'total_presente', 'total_faltas')
+    list_filter = ('mes',)
+    search_fields = ('membro__nome_completo',)
+    list_select_related = ('membro',)
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
 @admin.register(EntregaCesta)
 class EntregaCestaAdmin(admin.ModelAdmin):
     list_display = ('familia', 'data_entrega', 'usuario_registro', 'data_registro')
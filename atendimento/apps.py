@@ -5,3 +5,6 @@ class AtendimentoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'atendimento'
     verbose_name = 'Atendimento Social'
+
+    def ready(self):
+        from . import signals  # noqa: F401
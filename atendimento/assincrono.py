@@ -0,0 +1,99 @@
+"""
+Ações assíncronas em ViewSets do DRF.
+
+O DRF só despacha handlers síncronos. Com AsyncViewSetMixin, uma ação declarada
+com "async def" vira uma view assíncrona do Django no perfil ASGI
+(SERVIDOR=asgi, workers do uvicorn): ela espera o banco sem prender uma thread
+do worker, e relatórios demorados não bloqueiam a chamada. Autenticação,
+permissões e throttling continuam síncronos e rodam via sync_to_async.
+
+No perfil WSGI (padrão) a rota continua uma view síncrona comum do DRF e só a
+ação roda com async_to_sync.
+"""
+
+from inspect import isawaitable
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+
+# Itens lidos por vez de um iterador síncrono (relatórios em streaming) quando servido por ASGI
+LOTE_STREAMING = 500
+
+
+def servido_por_asgi(request):
+    return isinstance(getattr(request, '_request', request), ASGIRequest)
+
+
+def _proximos(iterador, quantidade):
+    lote = []
+    for item in iterador:
+        lote.append(item)
+        if len(lote) >= quantidade:
+            break
+    return lote
+
+
+async def iterar_em_thread(iteravel, lote=LOTE_STREAMING):
+    """
+    Percorre um iterador síncrono (consultas com .iterator()) fora do event loop.
+
+    O StreamingHttpResponse servido por ASGI carregaria um iterador síncrono
+    inteiro na memória antes de enviar; aqui as linhas saem em lotes.
+    """
+    iterador = iter(iteravel)
+    while True:
+        itens = await sync_to_async(_proximos)(iterador, lote)
+        if not itens:
+            return
+        for item in itens:
+            yield item
+
+
+class AsyncViewSetMixin:
+    # None: assíncrona só no perfil ASGI (settings.PERFIL_SERVIDOR)
+    assincrona = None
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        assincrona = initkwargs.get('assincrona', cls.assincrona)
+        if assincrona is None:
+            assincrona = settings.PERFIL_SERVIDOR['asgi']
+        # Uma rota é assíncrona quando todas as ações mapeadas nela são
+        initkwargs['assincrona'] = bool(
+            assincrona and actions and all(iscoroutinefunction(getattr(cls, acao)) for acao in actions.values())
+        )
+        view = super().as_view(actions, **initkwargs)
+        if initkwargs['assincrona']:
+            markcoroutinefunction(view)
+        return view
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.assincrona:
+            return self.dispatch_async(request, *args, **kwargs)
+        metodo = request.method.lower()
+        handler = getattr(self, metodo, None)
+        if iscoroutinefunction(handler):
+            setattr(self, metodo, async_to_sync(handler))
+        return super().dispatch(request, *args, **kwargs)
+
+    async def dispatch_async(self, request, *args, **kwargs):
+        # Mesmo fluxo de APIView.dispatch, aguardando o handler (coberto por ASGITests)
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            response = handler(request, *args, **kwargs)
+            # OPTIONS e métodos não permitidos continuam síncronos
+            if isawaitable(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
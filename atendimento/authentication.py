@@ -0,0 +1,132 @@
+"""
+Autenticação JWT sem consulta ao banco nas leituras.
+
+Os tokens emitidos por CustomTokenObtainPairSerializer carregam tipo, is_staff
+e is_active. Requisições de leitura (GET, HEAD, OPTIONS) são autenticadas só
+com esses claims, como um UsuarioToken. Escritas precisam de um Usuario de
+verdade (usuario_registro, por exemplo), que vem de um cache curto por processo,
+invalidado em todos os workers quando o usuário muda.
+Tokens antigos, sem os claims, continuam passando pela consulta ao banco.
+"""
+
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+# Claims exigidos para autenticar sem ir ao banco
+CLAIMS_USUARIO = ('tipo', 'is_staff', 'is_active')
+
+
+def adicionar_claims(token, user):
+    token['email'] = user.email
+    token['first_name'] = user.first_name
+    token['last_name'] = user.last_name
+    token['tipo'] = user.tipo
+    token['is_staff'] = user.is_staff
+    token['is_active'] = user.is_active
+    return token
+
+
+class UsuarioToken(TokenUser):
+    """
+    Usuário montado a partir dos claims do token (email, tipo, is_staff...).
+
+    Atributos ausentes são lidos do token por TokenUser.__getattr__.
+    """
+
+    @property
+    def is_active(self):
+        return self.token.get('is_active', True)
+
+
+def _chave_versao(user_id):
+    return f'jwt:usuario:{user_id}:versao'
+
+
+class UsuariosEmCache:
+    """
+    Usuários carregados do banco, por id, válidos por JWT_USUARIO_CACHE_TTL segundos.
+
+    Cada usuário tem uma versão no cache padrão, compartilhada pelos workers: a
+    cópia guardada só vale enquanto a versão for a mesma de quando foi carregada,
+    e alterar o usuário (desativá-lo, por exemplo) grava outra versão.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.usuarios = {}
+
+    def versao(self, user_id):
+        chave = _chave_versao(user_id)
+        valor = cache.get(chave)
+        if valor is None:
+            # Ausente ou despejada: uma versão nova descarta as cópias antigas
+            cache.add(chave, time.time_ns(), None)
+            valor = cache.get(chave)
+        return valor
+
+    def obter(self, user_id, versao):
+        with self.lock:
+            item = self.usuarios.get(user_id)
+        if item is None or item[0] < time.monotonic() or item[1] != versao:
+            return None
+        # Cópia: o mesmo objeto não é compartilhado entre requisições concorrentes
+        return copy.copy(item[2])
+
+    def guardar(self, user, versao):
+        expira = time.monotonic() + settings.JWT_USUARIO_CACHE_TTL
+        with self.lock:
+            self.usuarios[user.pk] = (expira, versao, copy.copy(user))
+
+    def remover(self, user_id):
+        with self.lock:
+            self.usuarios.pop(user_id, None)
+        # Só depois do commit: antes dele outro worker poderia recarregar o usuário
+        # antigo e guardá-lo já com a nova versão
+        transaction.on_commit(lambda: cache.set(_chave_versao(user_id), time.time_ns(), None))
+
+    def limpar(self):
+        with self.lock:
+            self.usuarios.clear()
+
+
+usuarios = UsuariosEmCache()
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+
+        if request.method in SAFE_METHODS and all(claim in validated_token for claim in CLAIMS_USUARIO):
+            if not validated_token['is_active']:
+                raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+            return UsuarioToken(validated_token), validated_token
+        return self.get_user(validated_token), validated_token
+
+    def get_user(self, validated_token):
+        if settings.JWT_USUARIO_CACHE_TTL <= 0:
+            return super().get_user(validated_token)
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        # Lida antes do banco: uma alteração no meio do caminho invalida a cópia guardada
+        versao = usuarios.versao(user_id)
+        user = usuarios.obter(user_id, versao)
+        if user is None:
+            user = super().get_user(validated_token)
+            usuarios.guardar(user, versao)
+        return user
@@ -0,0 +1,115 @@
+"""
+Índices de nomes em memória para os endpoints de autocomplete.
+
+Cada processo mantém um índice ordenado de prefixos (sem acentos, em
+minúsculas) por tipo de registro. A busca é um bisect na lista, sem ir ao
+banco. Quando um registro muda, os sinais gravam uma nova versão no cache
+compartilhado (Redis, ou arquivos compartilhados pelos workers da máquina);
+cada processo compara a sua versão com a do cache (no máximo uma vez por
+VERIFICAR_A_CADA segundos) e refaz o índice quando ficou para trás. Como
+garantia para instâncias que não dividem o cache, o índice também é refeito
+depois de RECONSTRUIR_APOS segundos.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+from django.db import transaction
+
+from .cache import get_cache
+from .filters import remover_acentos
+from .models import Familia, MembroFamilia
+
+# Intervalo mínimo, em segundos, entre consultas à versão no cache compartilhado
+VERIFICAR_A_CADA = 1.0
+# Idade máxima do índice, mesmo sem mudança de versão
+RECONSTRUIR_APOS = 300
+
+
+def normalizar(texto):
+    return ' '.join(remover_acentos(texto).lower().split())
+
+
+def _chave_versao(nome):
+    return f'autocomplete:{nome}:versao'
+
+
+class IndiceNomes:
+    def __init__(self, nome, carregar):
+        self.nome = nome
+        # Função que devolve pares (id, nome) do banco
+        self.carregar = carregar
+        self.lock = threading.Lock()
+        self.versao = None
+        self.verificado_em = 0.0
+        self.carregado_em = 0.0
+        # (chaves, entradas) trocadas juntas, para leituras sem lock
+        self.dados = ([], [])
+
+    def versao_compartilhada(self):
+        cache = get_cache()
+        versao = cache.get(_chave_versao(self.nome))
+        if versao is None:
+            cache.add(_chave_versao(self.nome), time.time_ns(), None)
+            versao = cache.get(_chave_versao(self.nome))
+        return versao
+
+    def atualizar(self):
+        agora = time.monotonic()
+        if self.versao is not None and agora - self.verificado_em < VERIFICAR_A_CADA:
+            return
+        versao = self.versao_compartilhada()
+        expirado = agora - self.carregado_em > RECONSTRUIR_APOS
+        if versao == self.versao and not expirado:
+            self.verificado_em = agora
+            return
+        with self.lock:
+            if versao == self.versao and self.carregado_em > agora - RECONSTRUIR_APOS:
+                return
+            # Uma entrada por palavra: "ana sil" e "silva" encontram "Ana Silva"
+            entradas = []
+            for pk, nome in self.carregar():
+                # Nome é opcional em Familia
+                if not nome or not normalizar(nome):
+                    continue
+                palavras = normalizar(nome).split(' ')
+                for i in range(len(palavras)):
+                    entradas.append((' '.join(palavras[i:]), pk, nome))
+            entradas.sort()
+            self.dados = ([entrada[0] for entrada in entradas], entradas)
+            self.versao = versao
+            self.verificado_em = self.carregado_em = agora
+
+    def invalidar(self):
+        # Depois do commit, para que o índice refeito já veja a alteração
+        transaction.on_commit(self._gravar_versao)
+
+    def _gravar_versao(self):
+        # Força a comparação com o cache na próxima busca deste processo
+        self.versao = None
+        get_cache().set(_chave_versao(self.nome), time.time_ns(), None)
+
+    def buscar(self, termo, limite=10):
+        self.atualizar()
+        termo = normalizar(termo)
+        if not termo:
+            return []
+        chaves, entradas = self.dados
+        resultados = {}
+        i = bisect_left(chaves, termo)
+        while i < len(chaves) and chaves[i].startswith(termo) and len(resultados) < limite:
+            _, pk, nome = entradas[i]
+            resultados.setdefault(pk, nome)
+            i += 1
+        return sorted(resultados.items(), key=lambda item: normalizar(item[1]))
+
+
+membros = IndiceNomes(
+    'membros',
+    lambda: MembroFamilia.objects.filter(ativo=True).values_list('id', 'nome_completo').iterator()
+)
+familias = IndiceNomes(
+    'familias',
+    lambda: Familia.objects.values_list('id', 'nome').iterator()
+)
@@ -0,0 +1,86 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+# Relatórios cujo resultado depende de cada modelo
+RELATORIOS_POR_MODELO = {
+    'Presenca': ['frequencia_membros', 'frequencia_mensal'],
+    'Encontro': ['frequencia_membros', 'frequencia_mensal'],
+    'MembroFamilia': ['frequencia_membros', 'frequencia_mensal', 'grade_roupas'],
+    'Familia': ['frequencia_membros', 'frequencia_mensal', 'entregas_cestas', 'resumo_mensal', 'programas_sociais'],
+    'ProgramaSocial': ['programas_sociais'],
+    'EntregaCesta': ['entregas_cestas', 'resumo_mensal'],
+}
+
+
+def get_cache():
+    return caches[settings.RELATORIOS_CACHE_ALIAS]
+
+
+def _chave_versao(nome):
+    return f'relatorios:{nome}:versao'
+
+
+def versao(nome):
+    cache = get_cache()
+    chave = _chave_versao(nome)
+    valor = cache.get(chave)
+    if valor is None:
+        cache.add(chave, time.time_ns(), None)
+        valor = cache.get(chave)
+    return valor
+
+
+def chave_relatorio(nome, params):
+    # A ordem dos parâmetros não importa e 'format' não altera os dados
+    itens = sorted(
+        (campo, valor)
+        for campo in params
+        if campo != 'format'
+        for valor in params.getlist(campo)
+    )
+    resumo = hashlib.sha1(urlencode(itens).encode()).hexdigest()
+    return f'relatorios:{nome}:{versao(nome)}:{resumo}'
+
+
+def etag(nome, params, formato):
+    """
+    ETag do resultado: muda quando o relatório é invalidado ou os parâmetros mudam.
+    """
+    chave = f'{chave_relatorio(nome, params)}:{formato}'
+    return '"%s"' % hashlib.sha1(chave.encode()).hexdigest()
+
+
+def obter(nome, params, produzir):
+    """
+    Devolve o resultado do relatório guardado no cache, produzindo-o se preciso.
+    """
+    cache = get_cache()
+    chave = chave_relatorio(nome, params)
+    resultado = cache.get(chave)
+    if resultado is None:
+        resultado = produzir()
+        cache.set(chave, resultado, settings.RELATORIOS_CACHE_TIMEOUT)
+    return resultado
+
+
+def _gravar_versoes(nomes):
+    # Uma nova versão torna inacessíveis as entradas antigas, que expiram sozinhas.
+    # Usa o relógio em vez de incr() para não reaproveitar versões se a chave for despejada.
+    cache = get_cache()
+    for nome in nomes:
+        cache.set(_chave_versao(nome), time.time_ns(), None)
+
+
+def invalidar(*nomes):
+    # Só depois do commit: antes dele outra requisição poderia guardar, já na versão
+    # nova, um resultado calculado sem as alterações
+    transaction.on_commit(lambda: _gravar_versoes(nomes))
+
+
+def invalidar_modelo(model):
+    invalidar(*RELATORIOS_POR_MODELO.get(model.__name__, []))
@@ -0,0 +1,144 @@
+"""
+Campos esparsos: ?fields=id,nome escolhe os campos da resposta e ?omit=observacoes
+remove campos. Vale para as listagens e detalhes (GET) das ModelViewSets e também
+restringe as colunas lidas do banco com QuerySet.only().
+"""
+
+import time
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+from core.metrics import medir_serializacao
+
+FIELDS_PARAM = 'fields'
+OMIT_PARAM = 'omit'
+
+
+def lista_param(request, nome):
+    valor = request.query_params.get(nome, '')
+    return {campo.strip() for campo in valor.split(',') if campo.strip()}
+
+
+def campos_solicitados(request, disponiveis):
+    """
+    Nomes de campos do serializer pedidos na requisição, ou None se não houver seleção.
+    """
+    if request is None or request.method != 'GET':
+        return None
+    incluir = lista_param(request, FIELDS_PARAM)
+    omitir = lista_param(request, OMIT_PARAM)
+    if not incluir and not omitir:
+        return None
+    campos = [campo for campo in disponiveis if campo in incluir] if incluir else list(disponiveis)
+    return [campo for campo in campos if campo not in omitir]
+
+
+class CamposDinamicosSerializerMixin:
+    """
+    Aplica ?fields= / ?omit= ao serializer principal da view (não aos aninhados).
+
+    Campos que não vêm de uma coluna do modelo (propriedades, por exemplo)
+    declaram em Meta.dependencias as colunas de que precisam, para que a view
+    saiba quais carregar.
+
+    Também mede o tempo de serialização para as métricas da requisição.
+    """
+
+    def principal(self):
+        pai = self.parent
+        if isinstance(pai, serializers.ListSerializer):
+            pai = pai.parent
+        return pai is None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.principal():
+            return fields
+        campos = campos_solicitados(self.context.get('request'), fields)
+        if campos is None:
+            return fields
+        return {nome: campo for nome, campo in fields.items() if nome in campos}
+
+    def to_representation(self, instance):
+        # Só o principal é medido: os aninhados já entram no tempo dele
+        if not self.principal():
+            return super().to_representation(instance)
+        inicio = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            medir_serializacao(self.context.get('request'), time.perf_counter() - inicio)
+
+    def colunas(self, campos):
+        """
+        Colunas do modelo necessárias para os campos, ou None se não der para saber.
+        """
+        model = self.Meta.model
+        dependencias = getattr(self.Meta, 'dependencias', {})
+        fields = super().get_fields()
+        colunas = {model._meta.pk.name}
+        for nome in campos:
+            # Campos ainda não vinculados têm source None: vale o nome do campo
+            origem = fields[nome].source or nome
+            if nome in dependencias:
+                colunas.update(dependencias[nome])
+                continue
+            try:
+                campo_modelo = model._meta.get_field(origem)
+            except FieldDoesNotExist:
+                return None
+            if campo_modelo.concrete and not campo_modelo.many_to_many:
+                colunas.add(campo_modelo.name)
+            elif not campo_modelo.is_relation:
+                return None
+        return colunas
+
+
+class CamposDinamicosViewMixin:
+    """
+    Restringe o queryset de list/retrieve às colunas dos campos pedidos.
+    """
+    acoes_campos_dinamicos = ('list', 'retrieve')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in self.acoes_campos_dinamicos:
+            return queryset
+
+        serializer = self.get_serializer()
+        if not isinstance(serializer, CamposDinamicosSerializerMixin):
+            return queryset
+        campos = campos_solicitados(self.request, serializer.get_fields())
+        if campos is None:
+            return queryset
+        colunas = serializer.colunas(campos)
+        if colunas is None:
+            return queryset
+
+        # Colunas da ordenação são lidas pela paginação por cursor
+        ordering = list(getattr(self, 'ordering', None) or [])
+        ordering += lista_param(self.request, 'ordering')
+        for campo in ordering:
+            nome = campo.lstrip('-')
+            try:
+                campo_modelo = queryset.model._meta.get_field(nome)
+            except FieldDoesNotExist:
+                continue
+            if campo_modelo.concrete:
+                colunas.add(campo_modelo.name)
+
+        # select_related/prefetch_related de campos que não serão serializados
+        # seriam desperdício (e select_related de um campo adiado é erro)
+        if isinstance(queryset.query.select_related, dict):
+            relacionados = [nome for nome in queryset.query.select_related if nome in colunas]
+            queryset = queryset.select_related(None)
+            if relacionados:
+                queryset = queryset.select_related(*relacionados)
+        prefetch = [
+            lookup for lookup in queryset._prefetch_related_lookups
+            if getattr(lookup, 'prefetch_through', lookup).split('__')[0] in campos
+        ]
+        queryset = queryset.prefetch_related(None).prefetch_related(*prefetch)
+
+        return queryset.only(*colunas)
@@ -0,0 +1,70 @@
+import unicodedata
+from functools import reduce
+from operator import add, or_
+
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connections
+from django.db.models import F, Func, Q, TextField
+from django.db.models.functions import Greatest, Lower
+from rest_framework import filters
+
+
+class SemAcento(Func):
+    # Wrapper IMMUTABLE de unaccent() criado pela migração 0004, utilizável em índices
+    function = 'f_unaccent'
+    output_field = TextField()
+
+
+def maior(expressoes):
+    # Greatest() exige pelo menos duas expressões
+    return expressoes[0] if len(expressoes) == 1 else Greatest(*expressoes)
+
+
+def remover_acentos(texto):
+    return ''.join(c for c in unicodedata.normalize('NFKD', texto) if not unicodedata.combining(c))
+
+
+class BuscaTextualFilter(filters.SearchFilter):
+    """
+    SearchFilter que, no PostgreSQL, ignora acentos e ordena pela relevância.
+
+    Cada campo de busca é comparado como lower(f_unaccent(campo)), expressão
+    coberta pelos índices GIN (pg_trgm) da migração 0004, e os resultados são
+    ordenados pela similaridade de trigramas com os termos buscados (a menos
+    que ?ordering= seja informado). Nos demais bancos o comportamento é o do
+    SearchFilter padrão.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        search_fields = self.get_search_fields(view, request)
+        search_terms = self.get_search_terms(request)
+
+        if connections[queryset.db].vendor != 'postgresql':
+            return super().filter_queryset(request, queryset, view)
+        if not search_fields or not search_terms:
+            return queryset
+
+        # Prefixos de busca (^, =, @, $) não se aplicam aqui
+        campos = [campo.lstrip('^=@$') for campo in search_fields]
+        expressoes = {
+            f'_busca_{i}': Lower(SemAcento(F(campo)))
+            for i, campo in enumerate(campos)
+        }
+        queryset = queryset.annotate(**expressoes)
+
+        termos = [remover_acentos(termo).lower() for termo in search_terms]
+        for termo in termos:
+            queryset = queryset.filter(reduce(or_, (
+                Q(**{f'{nome}__contains': termo}) for nome in expressoes
+            )))
+
+        if request.query_params.get(filters.OrderingFilter.ordering_param):
+            return queryset
+
+        similaridades = [
+            maior([TrigramWordSimilarity(termo, F(nome)) for nome in expressoes])
+            for termo in termos
+        ]
+        return queryset.annotate(relevancia=reduce(add, similaridades)).order_by(
+            '-relevancia', *queryset.query.order_by or queryset.model._meta.ordering
+        )
@@ -0,0 +1,111 @@
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.functions import TruncMonth
+
+from .models import Encontro, Presenca, FrequenciaMensal
+
+# Tamanho dos lotes gravados no banco
+BATCH_SIZE = 2000
+
+
+def inicio_do_mes(data):
+    return data.replace(day=1)
+
+
+def proximo_mes(data):
+    return (inicio_do_mes(data) + timedelta(days=32)).replace(day=1)
+
+
+def no_mes(campo, meses):
+    # data >= início do mês E data < início do mês seguinte, para cada mês
+    return reduce(or_, (
+        Q(**{f'{campo}__gte': mes, f'{campo}__lt': proximo_mes(mes)}) for mes in meses
+    ))
+
+
+def encontros_por_mes(meses=None):
+    """
+    Quantidade de encontros ativos em cada mês: {date(ano, mes, 1): total}.
+    """
+    encontros = Encontro.objects.filter(ativo=True)
+    if meses is not None:
+        encontros = encontros.filter(no_mes('data', meses))
+    return dict(
+        encontros.annotate(mes=TruncMonth('data')).order_by()
+        .values('mes').annotate(total=Count('id')).values_list('mes', 'total')
+    )
+
+
+def recalcular(membro_ids=None, meses=None):
+    """
+    Refaz as linhas de FrequenciaMensal dos membros e meses indicados.
+
+    None em membro_ids ou meses significa todos. O custo depende apenas do
+    recorte: salvar uma presença recalcula um membro em um mês (poucas
+    presenças), alterar um encontro recalcula o mês inteiro.
+    """
+    if meses is not None:
+        meses = sorted({inicio_do_mes(mes) for mes in meses})
+        if not meses:
+            return
+    if membro_ids is not None:
+        membro_ids = set(membro_ids)
+        if not membro_ids:
+            return
+
+    presencas = Presenca.objects.filter(encontro__ativo=True)
+    atuais = FrequenciaMensal.objects.all()
+    if meses is not None:
+        presencas = presencas.filter(no_mes('encontro__data', meses))
+        atuais = atuais.filter(mes__in=meses)
+    if membro_ids is not None:
+        presencas = presencas.filter(membro_id__in=membro_ids)
+        atuais = atuais.filter(membro_id__in=membro_ids)
+
+    totais = encontros_por_mes(meses)
+    linhas = presencas.annotate(mes=TruncMonth('encontro__data')).order_by().values('membro_id', 'mes').annotate(
+        total_presente=Count('id', filter=Q(presente=True)),
+        total_faltas=Count('id', filter=Q(presente=False)),
+    )
+    novas = [
+        FrequenciaMensal(
+            membro_id=linha['membro_id'],
+            mes=linha['mes'],
+            total_encontros=totais.get(linha['mes'], 0),
+            total_presente=linha['total_presente'],
+            total_faltas=linha['total_faltas'],
+        )
+        for linha in linhas
+    ]
+
+    # Sem savepoint: quem chama dentro de uma transação (registrar_presencas) já a controla
+    with transaction.atomic(savepoint=False):
+        # Remove as linhas que ficaram sem presenças no recorte
+        chaves = {(nova.membro_id, nova.mes) for nova in novas}
+        obsoletas = [
+            pk for pk, membro_id, mes in atuais.values_list('id', 'membro_id', 'mes')
+            if (membro_id, mes) not in chaves
+        ]
+        if obsoletas:
+            FrequenciaMensal.objects.filter(id__in=obsoletas).delete()
+        FrequenciaMensal.objects.bulk_create(
+            novas,
+            batch_size=BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['membro', 'mes'],
+            update_fields=['total_encontros', 'total_presente', 'total_faltas'],
+        )
+
+
+def reconstruir():
+    """
+    Apaga e refaz toda a tabela de frequência mensal a partir das presenças.
+    """
+    with transaction.atomic():
+        FrequenciaMensal.objects.all().delete()
+        recalcular()
+    return FrequenciaMensal.objects.count()
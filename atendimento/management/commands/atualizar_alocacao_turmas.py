@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from atendimento import turmas
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula a tabela AlocacaoTurma (membros por turma pela idade de hoje). '
+        'Deve rodar uma vez por dia quando TURMAS_ALOCACAO_PRECALCULADA está ligado.'
+    )
+
+    def handle(self, *args, **options):
+        total = turmas.alocar()
+        self.stdout.write(self.style.SUCCESS(f'{total} alocações de membros em turmas gravadas.'))
@@ -0,0 +1,179 @@
+import json
+import statistics
+import time
+import tracemalloc
+from datetime import date
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.views import APIView
+
+from atendimento.models import Encontro
+from atendimento.urls import router
+
+User = get_user_model()
+
+RELATORIOS = ['frequencia-membros', 'frequencia-mensal', 'entregas-cestas', 'grade-roupas', 'programas-sociais']
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, max(0, round(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede consultas SQL, latência (p50/p95) e pico de memória de cada endpoint da API '
+        'e grava o resultado em JSON, opcionalmente comparando com uma execução anterior.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticoes', type=int, default=10, help='Requisições por endpoint')
+        parser.add_argument('--saida', default='benchmark.json', help='Arquivo JSON de resultado')
+        parser.add_argument('--comparar', help='JSON de uma execução anterior para comparação')
+        parser.add_argument('--cache-frio', action='store_true', help='Limpa o cache antes de cada requisição')
+        parser.add_argument('--filtro', help='Mede apenas endpoints cujo nome contenha este texto')
+
+    def handle(self, *args, **options):
+        if options['repeticoes'] < 1:
+            raise CommandError('--repeticoes deve ser maior que zero')
+
+        self.client = Client(raise_request_exception=False)
+        usuario, _ = User.objects.get_or_create(
+            email='benchmark@example.com',
+            defaults={'username': 'benchmark', 'tipo': 'atendente'}
+        )
+        self.client.force_login(usuario)
+
+        endpoints = self.endpoints()
+        if options['filtro']:
+            endpoints = [(nome, url) for nome, url in endpoints if options['filtro'] in nome]
+
+        resultados = {}
+        # O Client usa o host "testserver"; o throttling limitaria as centenas de requisições
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']), \
+                mock.patch.object(APIView, 'get_throttles', return_value=[]):
+            for nome, url in endpoints:
+                resultados[nome] = self.medir(url, options['repeticoes'], options['cache_frio'])
+                r = resultados[nome]
+                self.stdout.write(
+                    f"{nome:55} {r['status']:>3} {r['consultas']:>5} consultas  "
+                    f"p50 {r['p50_ms']:>9.2f} ms  p95 {r['p95_ms']:>9.2f} ms  {r['memoria_pico_kb']:>9.1f} KB"
+                )
+
+        relatorio = {
+            'gerado_em': timezone.now().isoformat(),
+            'banco': connection.vendor,
+            'repeticoes': options['repeticoes'],
+            'cache_frio': options['cache_frio'],
+            'volume': {
+                model.__name__: model.objects.count()
+                for model in {viewset.queryset.model for _, viewset, _ in router.registry}
+            },
+            'endpoints': resultados,
+        }
+        with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+            json.dump(relatorio, arquivo, indent=2, ensure_ascii=False)
+        self.stdout.write(self.style.SUCCESS(f"Resultado gravado em {options['saida']}"))
+
+        if options['comparar']:
+            with open(options['comparar'], encoding='utf-8') as arquivo:
+                self.comparar(json.load(arquivo), relatorio)
+
+    def endpoints(self):
+        """
+        Lista (nome, url) de todos os endpoints GET do router e dos relatórios.
+        """
+        endpoints = []
+        for prefixo, viewset, basename in router.registry:
+            base = f'/api/{prefixo}/'
+            endpoints.append((f'{viewset.__name__}.list', base))
+
+            objeto = viewset.queryset.order_by('pk').first()
+            if objeto is not None:
+                endpoints.append((f'{viewset.__name__}.retrieve', f'{base}{objeto.pk}/'))
+
+            for acao in viewset.get_extra_actions():
+                if 'get' not in acao.mapping:
+                    continue
+                if acao.detail:
+                    if objeto is None:
+                        continue
+                    url = f'{base}{objeto.pk}/{acao.url_path}/'
+                else:
+                    url = f'{base}{acao.url_path}/'
+                endpoints.append((f'{viewset.__name__}.{acao.__name__}', url))
+
+        # Período coberto pelos encontros cadastrados
+        datas = Encontro.objects.order_by('data').values_list('data', flat=True)
+        inicio = datas.first() or date.today()
+        fim = datas.last() or date.today()
+        periodo = f'?data_inicio={inicio.isoformat()}&data_fim={fim.isoformat()}'
+        for relatorio in RELATORIOS:
+            endpoints.append((
+                f"RelatoriosViewSet.{relatorio.replace('-', '_')}",
+                f'/api/relatorios/{relatorio}/{periodo}'
+            ))
+        return endpoints
+
+    def requisicao(self, url, cache_frio):
+        if cache_frio:
+            cache.clear()
+        response = self.client.get(url, secure=True)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    def medir(self, url, repeticoes, cache_frio):
+        # Aquecimento: conexões, imports e, sem --cache-frio, o cache dos relatórios
+        response = self.requisicao(url, cache_frio)
+
+        latencias = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            self.requisicao(url, cache_frio)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+
+        # Consultas e memória numa passada separada: o tracemalloc distorce a latência
+        tracemalloc.start()
+        try:
+            with CaptureQueriesContext(connection) as consultas:
+                self.requisicao(url, cache_frio)
+            _, pico = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'url': url,
+            'status': response.status_code,
+            'consultas': len(consultas),
+            'p50_ms': round(statistics.median(latencias), 3),
+            'p95_ms': round(percentil(latencias, 95), 3),
+            'memoria_pico_kb': round(pico / 1024, 1),
+        }
+
+    def comparar(self, anterior, atual):
+        self.stdout.write('')
+        self.stdout.write(f"Comparação com a execução de {anterior.get('gerado_em')}:")
+        for nome, depois in atual['endpoints'].items():
+            antes = anterior['endpoints'].get(nome)
+            if antes is None:
+                self.stdout.write(f'{nome:55} (novo)')
+                continue
+            variacoes = []
+            for campo in ('consultas', 'p50_ms', 'p95_ms', 'memoria_pico_kb'):
+                if antes[campo]:
+                    variacoes.append(f'{campo} {(depois[campo] - antes[campo]) / antes[campo] * 100:+7.1f}%')
+                else:
+                    variacoes.append(f'{campo} {antes[campo]} -> {depois[campo]}')
+            linha = f"{nome:55} " + '  '.join(variacoes)
+            piorou = depois['p95_ms'] > antes['p95_ms'] * 1.2 or depois['consultas'] > antes['consultas']
+            self.stdout.write(self.style.WARNING(linha) if piorou else linha)
@@ -0,0 +1,200 @@
+import random
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from atendimento import autocomplete, frequencia
+from atendimento.models import (
+    Endereco, Familia, Responsavel, MembroFamilia, Turma,
+    Encontro, Presenca, EntregaCesta, ProgramaSocial
+)
+
+User = get_user_model()
+
+NOMES_F = ['Ana', 'Beatriz', 'Camila', 'Débora', 'Eduarda', 'Fernanda', 'Gabriela', 'Helena', 'Isabela',
+           'Júlia', 'Larissa', 'Letícia', 'Manuela', 'Maria', 'Natália', 'Sofia', 'Valentina', 'Yasmin']
+NOMES_M = ['Antônio', 'Bruno', 'Carlos', 'Davi', 'Enzo', 'Felipe', 'Gabriel', 'Heitor', 'João',
+           'Lucas', 'Matheus', 'Miguel', 'Nicolas', 'Pedro', 'Rafael', 'Samuel', 'Thiago', 'Vinícius']
+SOBRENOMES = ['Alves', 'Araújo', 'Barbosa', 'Cardoso', 'Conceição', 'Costa', 'Ferreira', 'Gomes', 'Lima',
+              'Martins', 'Oliveira', 'Pereira', 'Ribeiro', 'Rodrigues', 'Santos', 'Silva', 'Souza']
+RUAS = ['Rua das Flores', 'Rua São João', 'Avenida Brasil', 'Rua Sete de Setembro', 'Travessa da Paz',
+        'Rua Dom Pedro II', 'Rua da Esperança', 'Avenida Getúlio Vargas']
+BAIRROS = ['Centro', 'Vila Nova', 'Jardim América', 'Boa Vista', 'São José', 'Santa Luzia']
+PROGRAMAS = ['Bolsa Família', 'BPC', 'Vale Gás', 'Tarifa Social', 'Pé-de-Meia']
+TAMANHOS_CAMISETA = [t for t, _ in MembroFamilia.TAMANHO_CAMISETA_CHOICES]
+TURMAS = [('Bebês', 0, 2), ('3 a 5 anos', 3, 5), ('6 a 8 anos', 6, 8), ('9 a 11 anos', 9, 11), ('12 a 17 anos', 12, 17)]
+
+BATCH_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = 'Gera um conjunto de dados sintéticos para testes de desempenho.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--familias', type=int, default=500, help='Quantidade de famílias')
+        parser.add_argument('--encontros', type=int, default=52, help='Quantidade de encontros semanais')
+        parser.add_argument('--seed', type=int, default=42, help='Semente do gerador aleatório')
+        parser.add_argument('--limpar', action='store_true', help='Apaga os dados de atendimento existentes antes')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        hoje = date.today()
+
+        with transaction.atomic():
+            if options['limpar']:
+                self.limpar()
+
+            usuario, _ = User.objects.get_or_create(
+                email='benchmark@example.com',
+                defaults={'username': 'benchmark', 'tipo': 'atendente'}
+            )
+            self.criar_turmas()
+            familias = self.criar_familias(options['familias'], hoje)
+            membros = self.criar_membros(familias, hoje)
+            encontros = self.criar_encontros(options['encontros'], hoje)
+            presencas = self.criar_presencas(membros, encontros, usuario)
+            entregas = self.criar_entregas(familias, encontros, usuario)
+            # bulk_create não dispara os sinais que mantêm o resumo mensal e os índices
+            frequencia.reconstruir()
+        autocomplete.membros.invalidar()
+        autocomplete.familias.invalidar()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Criados: {len(familias)} famílias, {len(membros)} membros, {len(encontros)} encontros, '
+            f'{presencas} presenças e {entregas} entregas de cestas.'
+        ))
+
+    def limpar(self):
+        Presenca.objects.all().delete()
+        EntregaCesta.objects.all().delete()
+        Encontro.objects.all().delete()
+        Familia.objects.all().delete()
+        Endereco.objects.all().delete()
+        ProgramaSocial.objects.all().delete()
+
+    def nome(self, sexo):
+        primeiro = self.random.choice(NOMES_F if sexo == 'F' else NOMES_M)
+        return f'{primeiro} {self.random.choice(SOBRENOMES)} {self.random.choice(SOBRENOMES)}'
+
+    def nascimento(self, hoje, idade_min, idade_max):
+        return hoje - timedelta(days=self.random.randint(idade_min * 365, idade_max * 365 + 364))
+
+    def criar_turmas(self):
+        for nome, idade_minima, idade_maxima in TURMAS:
+            Turma.objects.get_or_create(nome=nome, defaults={
+                'idade_minima': idade_minima, 'idade_maxima': idade_maxima
+            })
+
+    def criar_familias(self, quantidade, hoje):
+        enderecos = Endereco.objects.bulk_create([
+            Endereco(
+                rua=self.random.choice(RUAS), numero=str(self.random.randint(1, 2000)),
+                bairro=self.random.choice(BAIRROS), cidade='São Paulo', estado='SP',
+                cep=f'0{self.random.randint(1000, 9999)}-{self.random.randint(100, 999)}'
+            )
+            for _ in range(quantidade)
+        ], batch_size=BATCH_SIZE)
+
+        familias = []
+        for endereco in enderecos:
+            programas = []
+            if self.random.random() < 0.6:
+                programas = self.random.sample(PROGRAMAS, self.random.randint(1, 3))
+            familias.append(Familia(
+                nome=f'Família {self.random.choice(SOBRENOMES)}',
+                endereco=endereco,
+                recebe_programas_sociais=bool(programas),
+                programas_sociais='; '.join(programas) or None,
+            ))
+        familias = Familia.objects.bulk_create(familias, batch_size=BATCH_SIZE)
+
+        # bulk_create não passa por Familia.save(): monta a relação com os programas aqui
+        ProgramaSocial.objects.bulk_create([ProgramaSocial(nome=nome) for nome in PROGRAMAS], ignore_conflicts=True)
+        ids = dict(ProgramaSocial.objects.values_list('nome', 'id'))
+        Relacao = Familia.programas.through
+        Relacao.objects.bulk_create([
+            Relacao(familia_id=familia.id, programasocial_id=ids[nome])
+            for familia in familias
+            for nome in (familia.programas_sociais or '').split('; ') if nome
+        ], batch_size=BATCH_SIZE)
+
+        responsaveis = []
+        for familia in familias:
+            for i in range(self.random.choice([1, 1, 2])):
+                sexo = self.random.choice('FFM')
+                responsaveis.append(Responsavel(
+                    nome_completo=self.nome(sexo),
+                    cpf=f'{self.random.randint(100, 999)}.{self.random.randint(100, 999)}.'
+                        f'{self.random.randint(100, 999)}-{self.random.randint(10, 99)}',
+                    telefone=f'(11) 9{self.random.randint(1000, 9999)}-{self.random.randint(1000, 9999)}',
+                    data_nascimento=self.nascimento(hoje, 20, 60),
+                    sexo=sexo, familia=familia, principal=(i == 0),
+                ))
+        Responsavel.objects.bulk_create(responsaveis, batch_size=BATCH_SIZE)
+        return familias
+
+    def criar_membros(self, familias, hoje):
+        membros = []
+        for familia in familias:
+            for _ in range(self.random.choices([1, 2, 3, 4, 5, 6], weights=[20, 30, 25, 15, 7, 3])[0]):
+                sexo = self.random.choice('FM')
+                nascimento = self.nascimento(hoje, 0, 17)
+                idade = (hoje - nascimento).days // 365
+                membros.append(MembroFamilia(
+                    nome_completo=self.nome(sexo),
+                    data_nascimento=nascimento,
+                    sexo=sexo,
+                    numero_calcado=min(50, max(18, 18 + idade * 15 // 10)) if idade >= 2 else None,
+                    tamanho_calca=str(min(16, 2 + idade // 2 * 2)) if self.random.random() < 0.8 else None,
+                    tamanho_camiseta=TAMANHOS_CAMISETA[min(len(TAMANHOS_CAMISETA) - 1, idade // 3)],
+                    familia=familia,
+                    ativo=self.random.random() < 0.9,
+                ))
+        return MembroFamilia.objects.bulk_create(membros, batch_size=BATCH_SIZE)
+
+    def criar_encontros(self, quantidade, hoje):
+        # Sábados, do mais recente para trás
+        sabado = hoje - timedelta(days=(hoje.weekday() - 5) % 7)
+        datas = [sabado - timedelta(weeks=i) for i in range(quantidade)]
+        existentes = set(Encontro.objects.filter(data__in=datas).values_list('data', flat=True))
+        Encontro.objects.bulk_create([
+            Encontro(data=data, descricao='Encontro semanal')
+            for data in datas if data not in existentes
+        ], batch_size=BATCH_SIZE)
+        return list(Encontro.objects.filter(data__in=datas))
+
+    def criar_presencas(self, membros, encontros, usuario):
+        total = 0
+        lote = []
+        for encontro in encontros:
+            for membro in membros:
+                if not membro.ativo:
+                    continue
+                sorteio = self.random.random()
+                if sorteio < 0.7:
+                    lote.append(Presenca(membro=membro, encontro=encontro, presente=True, usuario_registro=usuario))
+                elif sorteio < 0.85:
+                    lote.append(Presenca(membro=membro, encontro=encontro, presente=False, usuario_registro=usuario))
+            if len(lote) >= BATCH_SIZE:
+                Presenca.objects.bulk_create(lote, batch_size=BATCH_SIZE, ignore_conflicts=True)
+                total += len(lote)
+                lote = []
+        Presenca.objects.bulk_create(lote, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        return total + len(lote)
+
+    def criar_entregas(self, familias, encontros, usuario):
+        # Uma distribuição por mês, no primeiro encontro do mês
+        dias = {}
+        for encontro in sorted(encontros, key=lambda e: e.data):
+            dias.setdefault((encontro.data.year, encontro.data.month), encontro.data)
+
+        entregas = [
+            EntregaCesta(familia=familia, data_entrega=dia, usuario_registro=usuario)
+            for dia in dias.values()
+            for familia in familias
+            if self.random.random() < 0.7
+        ]
+        EntregaCesta.objects.bulk_create(entregas, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        return len(entregas)
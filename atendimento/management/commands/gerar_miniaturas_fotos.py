@@ -0,0 +1,48 @@
+import os
+
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+
+from atendimento import miniaturas
+from atendimento.models import MembroFamilia
+
+# Diretório onde membro_foto_upload_path gravava as fotos enviadas no cadastro (id ainda None)
+DIRETORIO_SEM_ID = os.path.join('membros_fotos', 'None') + os.sep
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera as miniaturas das fotos dos membros que ainda não as têm (ou estão desatualizadas) '
+        'e move as fotos gravadas em membros_fotos/None/ para um diretório próprio.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--refazer', action='store_true', help='Refaz também as miniaturas atualizadas')
+
+    def handle(self, *args, **options):
+        geradas = movidas = falhas = 0
+        membros = MembroFamilia.objects.only('id', 'foto', 'foto_miniaturas').order_by('id')
+        for membro in membros.iterator():
+            try:
+                if membro.foto.name and membro.foto.name.startswith(DIRETORIO_SEM_ID):
+                    self.mover(membro)
+                    movidas += 1
+                if miniaturas.pendente(membro) or (options['refazer'] and membro.foto):
+                    miniaturas.gerar(membro.id, refazer=options['refazer'])
+                    geradas += 1
+            except OSError as erro:
+                # Arquivo ausente no storage ou imagem inválida
+                falhas += 1
+                self.stderr.write(f'Membro {membro.id} ({membro.foto.name}): {erro}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{geradas} membros com miniaturas geradas, {movidas} fotos movidas, {falhas} falhas.'
+        ))
+
+    def mover(self, membro):
+        antigo = membro.foto.name
+        with membro.foto.open('rb') as arquivo:
+            conteudo = ContentFile(arquivo.read())
+        membro.foto.save(os.path.basename(antigo), conteudo, save=False)
+        MembroFamilia.objects.filter(pk=membro.pk).update(foto=membro.foto.name)
+        membro.foto.storage.delete(antigo)
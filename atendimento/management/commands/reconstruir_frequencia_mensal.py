@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from atendimento import frequencia
+from atendimento.cache import invalidar
+
+
+class Command(BaseCommand):
+    help = 'Refaz do zero o resumo mensal de frequência (FrequenciaMensal) a partir das presenças.'
+
+    def handle(self, *args, **options):
+        total = frequencia.reconstruir()
+        invalidar('frequencia_mensal')
+        self.stdout.write(self.style.SUCCESS(f'{total} linhas de frequência mensal geradas.'))
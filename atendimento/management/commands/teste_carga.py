@@ -0,0 +1,238 @@
+import http.client
+import json
+import random
+import statistics
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from atendimento.models import Encontro, MembroFamilia
+
+from .benchmark_api import percentil
+
+User = get_user_model()
+
+NOMES_BUSCA = ['ana', 'jo', 'mar', 'pe', 'lu', 'car', 'sil', 'fer']
+RELATORIOS = ['frequencia-membros', 'frequencia-mensal', 'entregas-cestas', 'grade-roupas', 'programas-sociais']
+
+# Peso de cada tarefa por cenário, como as tasks de um locustfile: a recepção faz
+# muitas leituras curtas e registra presenças; a coordenação abre relatórios
+CENARIOS = {
+    'chamada': {
+        'membros_por_turma': 3,
+        'presencas_encontro': 3,
+        'registrar_presencas': 2,
+        'autocomplete_membros': 4,
+    },
+    'relatorios': {
+        **{f"relatorio_{nome.replace('-', '_')}": 1 for nome in RELATORIOS},
+        'resumo_mensal_cestas': 1,
+    },
+}
+CENARIOS['misto'] = {**CENARIOS['chamada'], **CENARIOS['relatorios']}
+
+
+class Cliente:
+    """
+    Um usuário virtual: conexão HTTP persistente e token JWT próprios.
+    """
+
+    def __init__(self, url, email, senha):
+        partes = urlsplit(url)
+        self.classe = http.client.HTTPSConnection if partes.scheme == 'https' else http.client.HTTPConnection
+        self.host = partes.netloc
+        self.prefixo = partes.path.rstrip('/')
+        self.credenciais = {'email': email, 'password': senha}
+        self.conexao = None
+        self.token = None
+
+    def enviar(self, metodo, caminho, corpo=None):
+        if self.conexao is None:
+            self.conexao = self.classe(self.host, timeout=60)
+        cabecalhos = {'Accept': 'application/json'}
+        if self.token:
+            cabecalhos['Authorization'] = f'Bearer {self.token}'
+        if corpo is not None:
+            corpo = json.dumps(corpo)
+            cabecalhos['Content-Type'] = 'application/json'
+        try:
+            self.conexao.request(metodo, self.prefixo + caminho, body=corpo, headers=cabecalhos)
+            resposta = self.conexao.getresponse()
+            conteudo = resposta.read()
+        except (OSError, http.client.HTTPException):
+            # Conexão fechada pelo servidor (max_requests, timeout): a próxima reabre
+            self.conexao.close()
+            self.conexao = None
+            raise
+        return resposta.status, conteudo
+
+    def entrar(self):
+        self.token = None
+        status, conteudo = self.enviar('POST', '/api/token/', self.credenciais)
+        if status != 200:
+            raise CommandError(f'Falha no login ({status}): {conteudo[:200]!r}')
+        self.token = json.loads(conteudo)['access']
+
+    def requisicao(self, metodo, caminho, corpo=None):
+        status, conteudo = self.enviar(metodo, caminho, corpo)
+        if status == 401:
+            # Token expirado durante uma execução longa
+            self.entrar()
+            status, conteudo = self.enviar(metodo, caminho, corpo)
+        return status
+
+
+class Command(BaseCommand):
+    help = (
+        'Teste de carga contra uma instância em execução (gunicorn, runserver): usuários virtuais '
+        'concorrentes executam as tarefas do cenário, com pesos, e o resultado (requisições por '
+        'segundo, p50/p95 e erros por tarefa) é gravado em JSON com o rótulo do perfil testado.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Endereço da instância')
+        parser.add_argument('--usuarios', type=int, default=10, help='Usuários virtuais concorrentes')
+        parser.add_argument('--duracao', type=float, default=60, help='Duração em segundos')
+        parser.add_argument('--pausa', type=float, default=0, help='Pausa entre as tarefas de um usuário (s)')
+        parser.add_argument('--cenario', choices=sorted(CENARIOS), default='misto')
+        parser.add_argument('--perfil', default='', help='Rótulo do perfil do servidor (ex.: "3x3 gthread")')
+        parser.add_argument('--email', default='carga@example.com', help='Usuário do teste')
+        parser.add_argument('--senha', default='teste-carga', help='Senha do usuário do teste')
+        parser.add_argument('--saida', default='teste_carga.json', help='Arquivo JSON de resultado')
+        parser.add_argument('--seed', type=int, default=42, help='Semente do gerador aleatório')
+
+    def handle(self, *args, **options):
+        if options['usuarios'] < 1 or options['duracao'] <= 0:
+            raise CommandError('--usuarios e --duracao devem ser maiores que zero')
+
+        # A instância testada usa o mesmo banco: o usuário e os ids vêm daqui
+        usuario, _ = User.objects.get_or_create(
+            email=options['email'],
+            defaults={'username': options['email'].split('@')[0], 'tipo': 'atendente'}
+        )
+        if not usuario.check_password(options['senha']):
+            usuario.set_password(options['senha'])
+            usuario.save(update_fields=['password'])
+
+        self.encontros = list(Encontro.objects.order_by('-data').values_list('id', flat=True)[:10])
+        self.membros = list(MembroFamilia.objects.filter(ativo=True).values_list('id', flat=True))
+        if not self.encontros or not self.membros:
+            raise CommandError('Sem encontros ou membros: rode antes "gerar_dados_sinteticos"')
+        datas = Encontro.objects.order_by('data').values_list('data', flat=True)
+        self.periodo = f'?data_inicio={datas.first().isoformat()}&data_fim={datas.last().isoformat()}'
+
+        pesos = CENARIOS[options['cenario']]
+        self.tarefas = list(pesos)
+        self.pesos = [pesos[tarefa] for tarefa in self.tarefas]
+        self.latencias = defaultdict(list)
+        self.erros = defaultdict(lambda: defaultdict(int))
+        self.lock = threading.Lock()
+
+        clientes = [Cliente(options['url'], options['email'], options['senha']) for _ in range(options['usuarios'])]
+        for cliente in clientes:
+            cliente.entrar()
+
+        self.stdout.write(
+            f"{options['usuarios']} usuários, cenário {options['cenario']}, "
+            f"{options['duracao']:.0f}s contra {options['url']}..."
+        )
+        inicio = time.perf_counter()
+        fim = inicio + options['duracao']
+        threads = [
+            threading.Thread(
+                target=self.usuario_virtual,
+                args=(cliente, random.Random(options['seed'] + i), fim, options['pausa'])
+            )
+            for i, cliente in enumerate(clientes)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        decorrido = time.perf_counter() - inicio
+
+        relatorio = {
+            'gerado_em': timezone.now().isoformat(),
+            'url': options['url'],
+            'perfil': options['perfil'],
+            'cenario': options['cenario'],
+            'usuarios': options['usuarios'],
+            'duracao_s': round(decorrido, 1),
+            'total': self.resumo(sum(self.latencias.values(), []), self.somar_erros(), decorrido),
+            'tarefas': {
+                tarefa: self.resumo(self.latencias[tarefa], self.erros[tarefa], decorrido)
+                for tarefa in self.tarefas
+            },
+        }
+        for tarefa, r in [*relatorio['tarefas'].items(), ('total', relatorio['total'])]:
+            linha = (
+                f"{tarefa:35} {r['requisicoes']:>7} req  {r['req_por_s']:>8.1f} req/s  "
+                f"p50 {r['p50_ms']:>9.2f} ms  p95 {r['p95_ms']:>9.2f} ms  {r['erros']:>5} erros"
+            )
+            self.stdout.write(self.style.WARNING(linha) if r['erros'] else linha)
+
+        with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+            json.dump(relatorio, arquivo, indent=2, ensure_ascii=False)
+        self.stdout.write(self.style.SUCCESS(f"Resultado gravado em {options['saida']}"))
+
+    def somar_erros(self):
+        total = defaultdict(int)
+        for erros in self.erros.values():
+            for motivo, quantidade in erros.items():
+                total[motivo] += quantidade
+        return total
+
+    def resumo(self, latencias, erros, decorrido):
+        return {
+            'requisicoes': len(latencias) + sum(erros.values()),
+            'req_por_s': round(len(latencias) / decorrido, 2),
+            'p50_ms': round(statistics.median(latencias), 3) if latencias else 0,
+            'p95_ms': round(percentil(latencias, 95), 3) if latencias else 0,
+            'erros': sum(erros.values()),
+            # Por status (429 indica o throttling da instância, veja THROTTLE_* no README)
+            'erros_por_motivo': dict(erros),
+        }
+
+    def usuario_virtual(self, cliente, aleatorio, fim, pausa):
+        while time.perf_counter() < fim:
+            tarefa = aleatorio.choices(self.tarefas, self.pesos)[0]
+            metodo, caminho, corpo = self.montar(tarefa, aleatorio)
+            inicio = time.perf_counter()
+            try:
+                status = cliente.requisicao(metodo, caminho, corpo)
+            except (OSError, http.client.HTTPException) as exc:
+                status = type(exc).__name__
+            latencia = (time.perf_counter() - inicio) * 1000
+            with self.lock:
+                if status == 200:
+                    self.latencias[tarefa].append(latencia)
+                else:
+                    self.erros[tarefa][str(status)] += 1
+            if pausa:
+                time.sleep(pausa)
+
+    def montar(self, tarefa, aleatorio):
+        """
+        (método, caminho, corpo) de uma execução da tarefa.
+        """
+        if tarefa == 'membros_por_turma':
+            return 'GET', '/api/turmas/membros_por_turma/', None
+        if tarefa == 'presencas_encontro':
+            return 'GET', f'/api/encontros/{aleatorio.choice(self.encontros)}/presencas/', None
+        if tarefa == 'registrar_presencas':
+            membros = aleatorio.sample(self.membros, min(20, len(self.membros)))
+            corpo = {'presencas': [
+                {'membro_id': membro_id, 'presente': aleatorio.random() < 0.8} for membro_id in membros
+            ]}
+            return 'POST', f'/api/encontros/{aleatorio.choice(self.encontros)}/registrar_presencas/', corpo
+        if tarefa == 'autocomplete_membros':
+            return 'GET', f'/api/membros/autocomplete/?q={aleatorio.choice(NOMES_BUSCA)}', None
+        if tarefa == 'resumo_mensal_cestas':
+            return 'GET', f'/api/entregas-cestas/resumo_mensal/{self.periodo}', None
+        relatorio = tarefa.removeprefix('relatorio_').replace('_', '-')
+        return 'GET', f'/api/relatorios/{relatorio}/{self.periodo}', None
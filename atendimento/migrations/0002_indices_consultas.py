@@ -0,0 +1,29 @@
+# Generated by Django 4.2.10 on 2026-10-18 16:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('atendimento', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='entregacesta',
+            index=models.Index(fields=['data_entrega'], name='entrega_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='familia',
+            index=models.Index(condition=models.Q(('recebe_programas_sociais', True)), fields=['nome', 'data_cadastro'], name='familia_programas_nome_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='membrofamilia',
+            index=models.Index(condition=models.Q(('ativo', True)), fields=['ativo', 'data_nascimento'], name='membro_ativo_nasc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='responsavel',
+            index=models.Index(fields=['cpf'], name='responsavel_cpf_idx'),
+        ),
+    ]
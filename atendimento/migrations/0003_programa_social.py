@@ -0,0 +1,58 @@
+# Generated by Django 4.2.10 on 2026-10-18 16:44
+
+from django.db import migrations, models
+
+
+def separar_programas(texto):
+    # Mesmas regras do relatório: vírgula, ponto-e-vírgula ou quebra de linha
+    return [p.strip() for p in texto.replace(';', ',').replace('\n', ',').split(',') if p.strip()]
+
+
+def popular_programas(apps, schema_editor):
+    Familia = apps.get_model('atendimento', 'Familia')
+    ProgramaSocial = apps.get_model('atendimento', 'ProgramaSocial')
+    Relacao = Familia.programas.through
+
+    programas_por_familia = {}
+    for familia_id, texto in Familia.objects.exclude(programas_sociais__isnull=True).values_list('id', 'programas_sociais'):
+        nomes = list(dict.fromkeys(separar_programas(texto)))
+        if nomes:
+            programas_por_familia[familia_id] = nomes
+
+    todos = {nome for nomes in programas_por_familia.values() for nome in nomes}
+    ProgramaSocial.objects.bulk_create([ProgramaSocial(nome=nome) for nome in todos], ignore_conflicts=True)
+    ids = dict(ProgramaSocial.objects.values_list('nome', 'id'))
+
+    Relacao.objects.bulk_create([
+        Relacao(familia_id=familia_id, programasocial_id=ids[nome])
+        for familia_id, nomes in programas_por_familia.items()
+        for nome in nomes
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('atendimento', '0002_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProgramaSocial',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=200, unique=True)),
+            ],
+            options={
+                'verbose_name': 'Programa Social',
+                'verbose_name_plural': 'Programas Sociais',
+                'ordering': ['nome'],
+            },
+        ),
+        migrations.AddField(
+            model_name='familia',
+            name='programas',
+            field=models.ManyToManyField(blank=True, related_name='familias', to='atendimento.programasocial'),
+        ),
+        migrations.RunPython(popular_programas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+from django.db import migrations
+
+# Colunas usadas pelos search_fields de FamiliaViewSet, MembroFamiliaViewSet
+# e ResponsavelViewSet
+INDICES_BUSCA = [
+    ('familia_nome_trgm_idx', 'atendimento_familia', 'nome'),
+    ('endereco_rua_trgm_idx', 'atendimento_endereco', 'rua'),
+    ('endereco_bairro_trgm_idx', 'atendimento_endereco', 'bairro'),
+    ('endereco_cidade_trgm_idx', 'atendimento_endereco', 'cidade'),
+    ('membro_nome_trgm_idx', 'atendimento_membrofamilia', 'nome_completo'),
+    ('responsavel_nome_trgm_idx', 'atendimento_responsavel', 'nome_completo'),
+    ('responsavel_cpf_trgm_idx', 'atendimento_responsavel', 'cpf'),
+    ('responsavel_tel_trgm_idx', 'atendimento_responsavel', 'telefone'),
+]
+
+
+def criar_indices_busca(apps, schema_editor):
+    # Busca textual só existe no PostgreSQL; no SQLite o SearchFilter padrão é usado
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS unaccent')
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # unaccent() não é IMMUTABLE e por isso não pode ser usada em índices
+    schema_editor.execute(
+        "CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text AS "
+        "$$ SELECT public.unaccent('public.unaccent', $1) $$ "
+        "LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT"
+    )
+    for nome, tabela, coluna in INDICES_BUSCA:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {nome} ON {tabela} '
+            f'USING gin (lower(f_unaccent({coluna})) gin_trgm_ops)'
+        )
+
+
+def remover_indices_busca(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for nome, tabela, coluna in INDICES_BUSCA:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {nome}')
+    schema_editor.execute('DROP FUNCTION IF EXISTS f_unaccent(text)')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('atendimento', '0003_programa_social'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indices_busca, remover_indices_busca),
+    ]
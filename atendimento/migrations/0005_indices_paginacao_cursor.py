@@ -0,0 +1,25 @@
+# Generated by Django 4.2.10 on 2026-10-18 16:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('atendimento', '0004_busca_textual'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='entregacesta',
+            name='entrega_data_idx',
+        ),
+        migrations.AddIndex(
+            model_name='entregacesta',
+            index=models.Index(fields=['data_entrega', 'id'], name='entrega_data_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='presenca',
+            index=models.Index(fields=['data_registro', 'id'], name='presenca_registro_id_idx'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 4.2.10 on 2026-10-18 16:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Q
+from django.db.models.functions import TruncMonth
+
+
+def popular_frequencia(apps, schema_editor):
+    # Mesmo cálculo de atendimento.frequencia.recalcular(), com os modelos históricos
+    Encontro = apps.get_model('atendimento', 'Encontro')
+    Presenca = apps.get_model('atendimento', 'Presenca')
+    FrequenciaMensal = apps.get_model('atendimento', 'FrequenciaMensal')
+
+    totais = dict(
+        Encontro.objects.filter(ativo=True).annotate(mes=TruncMonth('data')).order_by()
+        .values('mes').annotate(total=Count('id')).values_list('mes', 'total')
+    )
+    linhas = Presenca.objects.filter(encontro__ativo=True).annotate(
+        mes=TruncMonth('encontro__data')
+    ).order_by().values('membro_id', 'mes').annotate(
+        total_presente=Count('id', filter=Q(presente=True)),
+        total_faltas=Count('id', filter=Q(presente=False)),
+    )
+    FrequenciaMensal.objects.bulk_create([
+        FrequenciaMensal(
+            membro_id=linha['membro_id'],
+            mes=linha['mes'],
+            total_encontros=totais.get(linha['mes'], 0),
+            total_presente=linha['total_presente'],
+            total_faltas=linha['total_faltas'],
+        )
+        for linha in linhas
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('atendimento', '0005_indices_paginacao_cursor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FrequenciaMensal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(help_text='Primeiro dia do mês')),
+                ('total_encontros', models.PositiveIntegerField(default=0)),
+                ('total_presente', models.PositiveIntegerField(default=0)),
+                ('total_faltas', models.PositiveIntegerField(default=0)),
+                ('membro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='frequencias_mensais', to='atendimento.membrofamilia')),
+            ],
+            options={
+                'verbose_name': 'Frequência Mensal',
+                'verbose_name_plural': 'Frequências Mensais',
+                'ordering': ['membro_id', 'mes'],
+                'indexes': [models.Index(fields=['mes', 'membro'], name='frequencia_mes_membro_idx')],
+                'unique_together': {('membro', 'mes')},
+            },
+        ),
+        migrations.RunPython(popular_frequencia, migrations.RunPython.noop),
+    ]
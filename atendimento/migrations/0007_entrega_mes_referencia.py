@@ -0,0 +1,26 @@
+from django.db import migrations, models
+from django.db.models.functions import TruncMonth
+
+
+def preencher_mes_referencia(apps, schema_editor):
+    EntregaCesta = apps.get_model('atendimento', 'EntregaCesta')
+    EntregaCesta.objects.update(mes_referencia=TruncMonth('data_entrega'))
+
+
+class Migration(migrations.Migration):
+    # Só a coluna e os dados: a constraint vem na 0010, em outra transação (no
+    # PostgreSQL, ALTER TABLE depois do UPDATE na mesma transação falharia com
+    # "pending trigger events")
+
+    dependencies = [
+        ('atendimento', '0006_frequencia_mensal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entregacesta',
+            name='mes_referencia',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.RunPython(preencher_mes_referencia, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.10 on 2026-10-18 17:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('atendimento', '0007_entrega_mes_referencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlocacaoTurma',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_referencia', models.DateField(help_text='Data usada no cálculo da idade')),
+                ('membro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alocacoes_turma', to='atendimento.membrofamilia')),
+                ('turma', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alocacoes', to='atendimento.turma')),
+            ],
+            options={
+                'verbose_name': 'Alocação em Turma',
+                'verbose_name_plural': 'Alocações em Turmas',
+                'unique_together': {('turma', 'membro')},
+            },
+        ),
+    ]
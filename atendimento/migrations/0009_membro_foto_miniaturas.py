@@ -0,0 +1,18 @@
+# Generated by Django 4.2.10 on 2026-10-18 17:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('atendimento', '0008_alocacao_turma'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='membrofamilia',
+            name='foto_miniaturas',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,52 @@
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def verificar_duplicadas(apps, schema_editor):
+    # Antes só (familia, data_entrega) era único: dados antigos podem ter duas
+    # entregas da mesma família no mesmo mês, que a constraint recusaria
+    EntregaCesta = apps.get_model('atendimento', 'EntregaCesta')
+    duplicadas = (
+        EntregaCesta.objects.values('familia_id', 'mes_referencia')
+        .annotate(total=Count('id'))
+        .filter(total__gt=1)
+        .order_by('familia_id', 'mes_referencia')
+    )
+    linhas = []
+    for grupo in duplicadas:
+        ids = EntregaCesta.objects.filter(
+            familia_id=grupo['familia_id'], mes_referencia=grupo['mes_referencia']
+        ).order_by('data_entrega', 'id').values_list('id', flat=True)
+        linhas.append(
+            f"  família {grupo['familia_id']}, {grupo['mes_referencia']:%m/%Y}: "
+            f"entregas {', '.join(map(str, ids))}"
+        )
+    if linhas:
+        raise RuntimeError(
+            'Há famílias com mais de uma entrega de cesta no mesmo mês. Remova ou corrija '
+            'as entregas excedentes e rode a migração de novo:\n' + '\n'.join(linhas)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('atendimento', '0009_membro_foto_miniaturas'),
+    ]
+
+    operations = [
+        migrations.RunPython(verificar_duplicadas, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='entregacesta',
+            name='mes_referencia',
+            field=models.DateField(editable=False),
+        ),
+        migrations.AlterUniqueTogether(
+            name='entregacesta',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='entregacesta',
+            constraint=models.UniqueConstraint(fields=('familia', 'mes_referencia'), name='entrega_familia_mes_unica', violation_error_message='Já existe uma entrega de cesta para esta família neste mês.'),
+        ),
+    ]
@@ -0,0 +1,138 @@
+"""
+Miniaturas das fotos dos membros.
+
+As fotos chegam dos celulares com vários MB; as listagens usam miniaturas
+quadradas de tamanho fixo em WebP e JPEG. A geração roda fora da requisição,
+num pool de threads, depois do commit da transação que gravou a foto. Os nomes
+gerados ficam em MembroFamilia.foto_miniaturas junto com o nome da foto de
+origem, o que permite saber se as miniaturas ainda correspondem à foto atual.
+"""
+
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+from PIL import Image, ImageOps
+
+from .models import MembroFamilia
+
+logger = logging.getLogger(__name__)
+
+# Lados, em pixels, das miniaturas quadradas
+TAMANHOS = (96, 320)
+
+FORMATOS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def atualizadas(membro):
+    return bool(membro.foto) and membro.foto_miniaturas.get('origem') == membro.foto.name
+
+
+def pendente(membro):
+    # Foto nova, trocada ou removida (com miniaturas antigas para apagar)
+    return (membro.foto.name or '') != membro.foto_miniaturas.get('origem', '')
+
+
+def nome_miniatura(origem, tamanho, formato):
+    diretorio, arquivo = os.path.split(origem)
+    base = os.path.splitext(arquivo)[0]
+    return os.path.join(diretorio, 'miniaturas', f'{base}-{tamanho}.{formato}')
+
+
+def nomes_gerados(miniaturas):
+    return [nome for tamanho in TAMANHOS for nome in miniaturas.get(str(tamanho), {}).values()]
+
+
+def renderizar(arquivo):
+    """
+    Conteúdo de cada miniatura da foto: {(tamanho, formato): bytes}.
+    """
+    with Image.open(arquivo) as imagem:
+        # JPEGs grandes são decodificados já reduzidos (uma vez para todos os tamanhos)
+        imagem.draft('RGB', (max(TAMANHOS) * 2, max(TAMANHOS) * 2))
+        # Fotos de celular vêm deitadas, com a orientação só no EXIF
+        imagem = ImageOps.exif_transpose(imagem).convert('RGB')
+    conteudos = {}
+    for tamanho in TAMANHOS:
+        miniatura = ImageOps.fit(imagem, (tamanho, tamanho), Image.LANCZOS)
+        for formato, (formato_pil, opcoes) in FORMATOS.items():
+            saida = io.BytesIO()
+            miniatura.save(saida, formato_pil, **opcoes)
+            conteudos[tamanho, formato] = saida.getvalue()
+    return conteudos
+
+
+def gerar(membro_id, refazer=False, liberar_conexao=False):
+    """
+    Gera (ou apaga) as miniaturas do membro conforme a foto atual.
+
+    Sem refazer, não faz nada se as miniaturas já correspondem à foto. Com
+    liberar_conexao, a conexão com o banco volta ao pool (core.banco) enquanto
+    a foto é decodificada e as miniaturas gravadas.
+    """
+    membro = MembroFamilia.objects.filter(pk=membro_id).only('foto', 'foto_miniaturas').first()
+    if membro is None or not (refazer or pendente(membro)):
+        return
+    if liberar_conexao and not connection.in_atomic_block:
+        connection.close()
+    storage = membro.foto.storage
+    antigas = nomes_gerados(membro.foto_miniaturas)
+
+    miniaturas = {'origem': membro.foto.name or ''}
+    if membro.foto:
+        with membro.foto.open('rb'):
+            conteudos = renderizar(membro.foto)
+        for (tamanho, formato), conteudo in conteudos.items():
+            nome = storage.save(nome_miniatura(membro.foto.name, tamanho, formato), ContentFile(conteudo))
+            miniaturas.setdefault(str(tamanho), {})[formato] = nome
+
+    # update() sem sinais; o filtro descarta o resultado se a foto mudou no meio do caminho
+    mesma_foto = Q(foto=membro.foto.name) if membro.foto else Q(foto='') | Q(foto__isnull=True)
+    atualizados = MembroFamilia.objects.filter(mesma_foto, pk=membro_id).update(foto_miniaturas=miniaturas)
+    descartar = antigas if atualizados else nomes_gerados(miniaturas)
+    for nome in descartar:
+        storage.delete(nome)
+
+
+def _gerar_em_segundo_plano(membro_id):
+    # Cada thread do pool tem a sua conexão com o banco
+    close_old_connections()
+    try:
+        gerar(membro_id, liberar_conexao=True)
+    except Exception:
+        logger.exception('Falha ao gerar as miniaturas do membro %s', membro_id)
+    finally:
+        connection.close()
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.MINIATURAS_WORKERS,
+                thread_name_prefix='miniaturas'
+            )
+        return _executor
+
+
+def agendar(membro_id):
+    """
+    Agenda a geração para depois do commit da transação atual.
+    """
+    if not settings.MINIATURAS_ASSINCRONAS:
+        transaction.on_commit(lambda: gerar(membro_id))
+        return
+    transaction.on_commit(lambda: executor().submit(_gerar_em_segundo_plano, membro_id))
@@ -1,14 +1,34 @@
 from django.db import models
+from django.db.models import Case, Count, Q, Value, When
+from django.db.models.functions import Cast, ExtractYear
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 import os
+import uuid
 
 def membro_foto_upload_path(instance, filename):
-    # file will be uploaded to MEDIA_ROOT/membros_fotos/<membro_id>/<filename>
-    return os.path.join('membros_fotos', str(instance.id), filename)
+    # file will be uploaded to MEDIA_ROOT/membros_fotos/<uuid>/<filename>
+    # (o id ainda é None no primeiro save; um diretório por upload também deixa as URLs imutáveis)
+    return os.path.join('membros_fotos', uuid.uuid4().hex, filename)
+
+def separar_programas(texto):
+    # Divide por vírgula, ponto-e-vírgula ou quebra de linha
+    if not texto:
+        return []
+    return [p.strip() for p in texto.replace(';', ',').replace('\n', ',').split(',') if p.strip()]
+
+def subtrair_anos(data, anos):
+    # 29/02 vira 28/02 quando o ano de destino não é bissexto
+    try:
+        return data.replace(year=data.year - anos)
+    except ValueError:
+        return data.replace(year=data.year - anos, day=28)
+
+def calcular_idade(data_nascimento, hoje):
+    return hoje.year - data_nascimento.year - ((hoje.month, hoje.day) < (data_nascimento.month, data_nascimento.day))
 
 class UsuarioManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
@@ -64,15 +84,57 @@ class Endereco(models.Model):
         verbose_name = 'Endereço'
         verbose_name_plural = 'Endereços'
 
+class ProgramaSocial(models.Model):
+    nome = models.CharField(max_length=200, unique=True)
+    
+    def __str__(self):
+        return self.nome
+    
+    class Meta:
+        verbose_name = 'Programa Social'
+        verbose_name_plural = 'Programas Sociais'
+        ordering = ['nome']
+
 class Familia(models.Model):
     nome = models.CharField(max_length=200, blank=True, null=True, help_text="Nome de referência para a família (opcional)")
     endereco = models.OneToOneField(Endereco, on_delete=models.PROTECT, related_name='familia')
     observacoes = models.TextField(blank=True, null=True)
     recebe_programas_sociais = models.BooleanField(default=False)
     programas_sociais = models.TextField(blank=True, null=True, help_text="Lista de programas sociais que a família recebe")
+    programas = models.ManyToManyField(ProgramaSocial, blank=True, related_name='familias')
     data_cadastro = models.DateTimeField(auto_now_add=True)
     data_atualizacao = models.DateTimeField(auto_now=True)
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        familia = super().from_db(db, field_names, values)
+        # Texto salvo no banco; ausente quando o campo foi adiado (.only()/.defer())
+        if 'programas_sociais' in familia.__dict__:
+            familia._programas_salvos = familia.programas_sociais
+        return familia
+    
+    def save(self, *args, **kwargs):
+        nova = self._state.adding
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'programas_sociais' not in update_fields:
+            return
+        # A relação só muda com o texto: outras edições não regravam os programas
+        anterior = None if nova else getattr(self, '_programas_salvos', False)
+        if anterior is False or (anterior or '') != (self.programas_sociais or ''):
+            self.sincronizar_programas()
+        self._programas_salvos = self.programas_sociais
+    
+    def sincronizar_programas(self):
+        # Mantém a relação com ProgramaSocial igual ao texto de programas_sociais
+        nomes = list(dict.fromkeys(separar_programas(self.programas_sociais)))
+        if nomes:
+            ProgramaSocial.objects.bulk_create(
+                [ProgramaSocial(nome=nome) for nome in nomes],
+                ignore_conflicts=True
+            )
+        self.programas.set(ProgramaSocial.objects.filter(nome__in=nomes))
+    
     def __str__(self):
         return self.nome or f"Família #{self.id}"
     
@@ -80,6 +142,14 @@ class Familia(models.Model):
         verbose_name = 'Família'
         verbose_name_plural = 'Famílias'
         ordering = ['nome', 'data_cadastro']
+        indexes = [
+            # Famílias atendidas por programas sociais, já na ordenação padrão
+            models.Index(
+                fields=['nome', 'data_cadastro'],
+                name='familia_programas_nome_idx',
+                condition=models.Q(recebe_programas_sociais=True)
+            ),
+        ]
 
 class Responsavel(models.Model):
     SEXO_CHOICES = [
@@ -114,6 +184,75 @@ class Responsavel(models.Model):
         verbose_name = 'Responsável'
         verbose_name_plural = 'Responsáveis'
         ordering = ['-principal', 'nome_completo']
+        indexes = [
+            models.Index(fields=['cpf'], name='responsavel_cpf_idx'),
+        ]
+
+class MembroFamiliaQuerySet(models.QuerySet):
+    def com_idade(self, hoje=None):
+        """
+        Anota a idade exata em anos, calculada pelo banco (PostgreSQL e SQLite).
+        """
+        hoje = hoje or timezone.localdate()
+        aniversario_por_vir = Q(data_nascimento__month__gt=hoje.month) | Q(
+            data_nascimento__month=hoje.month, data_nascimento__day__gt=hoje.day
+        )
+        # Cast: no PostgreSQL 14+ EXTRACT devolve numeric
+        return self.annotate(idade=Cast(
+            Value(hoje.year) - ExtractYear('data_nascimento') - Case(
+                When(aniversario_por_vir, then=Value(1)),
+                default=Value(0)
+            ),
+            output_field=models.IntegerField()
+        ))
+    
+    def idade_entre(self, minima=None, maxima=None, hoje=None):
+        """
+        Filtra pela idade exata convertida em intervalo de data_nascimento, que usa índice.
+        """
+        hoje = hoje or timezone.localdate()
+        filtros = {}
+        if minima is not None:
+            # idade >= minima: completou `minima` anos até hoje
+            filtros['data_nascimento__lte'] = subtrair_anos(hoje, minima)
+        if maxima is not None:
+            # idade <= maxima: ainda não completou `maxima + 1` anos
+            filtros['data_nascimento__gt'] = subtrair_anos(hoje, maxima + 1)
+        return self.filter(**filtros)
+    
+    def faixas_etarias(self, limites, hoje=None):
+        """
+        Conta membros por faixa etária em uma consulta agrupada.
+        
+        `limites` são as idades iniciais de cada faixa, em ordem crescente: [0, 3, 6]
+        gera 0-2, 3-5 e 6+. Membros mais novos que o primeiro limite ficam de fora.
+        """
+        hoje = hoje or timezone.localdate()
+        limites = sorted(set(limites))
+        # Da faixa mais nova para a mais velha, a primeira condição verdadeira vence
+        faixa = Case(
+            *[
+                When(data_nascimento__gt=subtrair_anos(hoje, proximo), then=Value(i))
+                for i, proximo in enumerate(limites[1:])
+            ],
+            default=Value(len(limites) - 1),
+            output_field=models.IntegerField()
+        )
+        totais = dict(
+            self.idade_entre(minima=limites[0], hoje=hoje).order_by()
+            .annotate(faixa=faixa).values('faixa').annotate(total=Count('id'))
+            .values_list('faixa', 'total')
+        )
+        faixas = []
+        for i, inicio in enumerate(limites):
+            fim = limites[i + 1] - 1 if i + 1 < len(limites) else None
+            faixas.append({
+                'faixa': f'{inicio}-{fim}' if fim is not None else f'{inicio}+',
+                'idade_minima': inicio,
+                'idade_maxima': fim,
+                'total': totais.get(i, 0),
+            })
+        return faixas
 
 class MembroFamilia(models.Model):
     SEXO_CHOICES = [
@@ -139,15 +278,25 @@ class MembroFamilia(models.Model):
     tamanho_calca = models.CharField(max_length=10, blank=True, null=True, help_text="Ex: 38, 40, 42, P, M, G")
     tamanho_camiseta = models.CharField(max_length=3, choices=TAMANHO_CAMISETA_CHOICES, blank=True, null=True)
     foto = models.ImageField(upload_to=membro_foto_upload_path, blank=True, null=True)
+    # Miniaturas geradas por atendimento.miniaturas: {"origem": foto.name, "96": {"webp": ..., "jpeg": ...}, ...}
+    foto_miniaturas = models.JSONField(default=dict, blank=True, editable=False)
     familia = models.ForeignKey(Familia, on_delete=models.CASCADE, related_name='membros')
     ativo = models.BooleanField(default=True)
     data_cadastro = models.DateTimeField(auto_now_add=True)
     data_atualizacao = models.DateTimeField(auto_now=True)
     
+    objects = MembroFamiliaQuerySet.as_manager()
+    
     @property
     def idade(self):
-        today = timezone.now().date()
-        return today.year - self.data_nascimento.year - ((today.month, today.day) < (self.data_nascimento.month, self.data_nascimento.day))
+        # Valor anotado por MembroFamiliaQuerySet.com_idade(), quando presente
+        if '_idade' in self.__dict__:
+            return self._idade
+        return calcular_idade(self.data_nascimento, timezone.localdate())
+    
+    @idade.setter
+    def idade(self, valor):
+        self._idade = valor
     
     def __str__(self):
         return f"{self.nome_completo} ({self.idade} anos) - {self.familia}"
@@ -156,6 +305,14 @@ class MembroFamilia(models.Model):
         verbose_name = 'Membro da Família'
         verbose_name_plural = 'Membros da Família'
         ordering = ['nome_completo']
+        indexes = [
+            # Filtros por idade (faixas etárias e turmas) sobre membros ativos
+            models.Index(
+                fields=['ativo', 'data_nascimento'],
+                name='membro_ativo_nasc_idx',
+                condition=models.Q(ativo=True)
+            ),
+        ]
 
 class Turma(models.Model):
     nome = models.CharField(max_length=100, help_text="Ex: 3 a 5 anos, 6 a 8 anos, etc.")
@@ -178,6 +335,26 @@ class Turma(models.Model):
     class Meta:
         ordering = ['idade_minima']
 
+class AlocacaoTurma(models.Model):
+    """
+    Membro ativo alocado em uma turma pela idade, pré-calculado por atendimento.turmas.
+
+    Usada quando TURMAS_ALOCACAO_PRECALCULADA está ligado: é atualizada a cada membro
+    ou turma salvos e refeita diariamente pelo comando atualizar_alocacao_turmas,
+    já que as idades mudam com os aniversários.
+    """
+    turma = models.ForeignKey(Turma, on_delete=models.CASCADE, related_name='alocacoes')
+    membro = models.ForeignKey(MembroFamilia, on_delete=models.CASCADE, related_name='alocacoes_turma')
+    data_referencia = models.DateField(help_text='Data usada no cálculo da idade')
+    
+    class Meta:
+        unique_together = ('turma', 'membro')
+        verbose_name = 'Alocação em Turma'
+        verbose_name_plural = 'Alocações em Turmas'
+    
+    def __str__(self):
+        return f"{self.membro} em {self.turma}"
+
 class Encontro(models.Model):
     data = models.DateField(unique=True)
     descricao = models.CharField(max_length=200, blank=True, null=True)
@@ -203,35 +380,93 @@ class Presenca(models.Model):
         unique_together = ('membro', 'encontro')
         verbose_name = 'Presença'
         verbose_name_plural = 'Presenças'
+        indexes = [
+            # Ordenação da listagem e chave da paginação por cursor
+            models.Index(fields=['data_registro', 'id'], name='presenca_registro_id_idx'),
+        ]
     
     def __str__(self):
         status = "Presente" if self.presente else "Faltou"
         return f"{self.membro} - {self.encontro}: {status}"
 
+class FrequenciaMensal(models.Model):
+    """
+    Resumo das presenças de um membro em um mês, mantido por atendimento.frequencia.
+
+    Considera apenas encontros ativos. É atualizado a cada presença ou encontro
+    salvo/excluído e pode ser refeito com o comando reconstruir_frequencia_mensal.
+    """
+    membro = models.ForeignKey(MembroFamilia, on_delete=models.CASCADE, related_name='frequencias_mensais')
+    mes = models.DateField(help_text='Primeiro dia do mês')
+    total_encontros = models.PositiveIntegerField(default=0)
+    total_presente = models.PositiveIntegerField(default=0)
+    total_faltas = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('membro', 'mes')
+        ordering = ['membro_id', 'mes']
+        verbose_name = 'Frequência Mensal'
+        verbose_name_plural = 'Frequências Mensais'
+        indexes = [
+            # Relatórios por período leem todos os membros de um intervalo de meses
+            models.Index(fields=['mes', 'membro'], name='frequencia_mes_membro_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.membro} - {self.mes.strftime('%m/%Y')}: {self.total_presente}/{self.total_encontros}"
+
+MENSAGEM_ENTREGA_DUPLICADA = 'Já existe uma entrega de cesta para esta família neste mês.'
+
+class EntregaCestaQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create não chama save(): preenche o mês de referência aqui
+        objs = list(objs)
+        for entrega in objs:
+            entrega.mes_referencia = entrega.data_entrega.replace(day=1)
+        return super().bulk_create(objs, *args, **kwargs)
+
 class EntregaCesta(models.Model):
     familia = models.ForeignKey(Familia, on_delete=models.CASCADE, related_name='entregas_cestas')
     data_entrega = models.DateField()
+    # Primeiro dia do mês de data_entrega, preenchido em save() e bulk_create()
+    mes_referencia = models.DateField(editable=False)
     observacoes = models.TextField(blank=True, null=True)
     usuario_registro = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, related_name='entregas_registradas')
     data_registro = models.DateTimeField(auto_now_add=True)
     
+    objects = EntregaCestaQuerySet.as_manager()
+    
     class Meta:
-        unique_together = ('familia', 'data_entrega')
         verbose_name = 'Entrega de Cesta'
         verbose_name_plural = 'Entregas de Cestas'
         ordering = ['-data_entrega']
+        constraints = [
+            # Uma entrega por família por mês, garantida pelo banco (também entre requisições simultâneas)
+            models.UniqueConstraint(
+                fields=['familia', 'mes_referencia'],
+                name='entrega_familia_mes_unica',
+                violation_error_message=MENSAGEM_ENTREGA_DUPLICADA
+            ),
+        ]
+        indexes = [
+            # Filtros por período, ordenação da listagem e chave da paginação por
+            # cursor; consultas por família usam o índice da constraint acima
+            models.Index(fields=['data_entrega', 'id'], name='entrega_data_id_idx'),
+        ]
     
     def clean(self):
-        # Verifica se já existe entrega para esta família neste mês/ano
-        if EntregaCesta.objects.filter(
-            familia=self.familia,
-            data_entrega__year=self.data_entrega.year,
-            data_entrega__month=self.data_entrega.month
-        ).exclude(id=self.id).exists():
-            raise ValidationError('Já existe uma entrega de cesta para esta família neste mês.')
+        # Usado pelos formulários (admin), que não validam a constraint porque
+        # mes_referencia não é editável; no save() quem garante a regra é o banco
+        if self.data_entrega and self.familia_id:
+            self.mes_referencia = self.data_entrega.replace(day=1)
+            if EntregaCesta.objects.filter(
+                familia_id=self.familia_id,
+                mes_referencia=self.mes_referencia
+            ).exclude(id=self.id).exists():
+                raise ValidationError(MENSAGEM_ENTREGA_DUPLICADA)
     
     def save(self, *args, **kwargs):
-        self.clean()
+        self.mes_referencia = self.data_entrega.replace(day=1)
         super().save(*args, **kwargs)
     
     def __str__(self):
@@ -0,0 +1,143 @@
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, Cursor, CursorPagination, PageNumberPagination
+
+
+def inverter(campo):
+    return campo[1:] if campo.startswith('-') else f'-{campo}'
+
+
+def condicao_apos(ordering, valores):
+    # (a, b) depois de (x, y) na ordenação: a > x OU (a = x E b > y)
+    condicao = Q()
+    iguais = {}
+    for campo, valor in zip(ordering, valores):
+        nome = campo.lstrip('-')
+        operador = 'lt' if campo.startswith('-') else 'gt'
+        condicao |= Q(**iguais, **{f'{nome}__{operador}': valor})
+        iguais[nome] = valor
+    return condicao
+
+
+class CursorChavePagination(CursorPagination):
+    """
+    CursorPagination cuja posição é formada por todos os campos de `ordering`.
+
+    O CursorPagination do DRF posiciona o cursor só pelo primeiro campo e usa
+    OFFSET dentro dos empates, que são comuns em datas (centenas de entregas
+    no mesmo dia de distribuição). Aqui cada página é um filtro sobre a chave
+    completa, como ('-data_entrega', '-id'), e custa o mesmo em qualquer ponto.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        ordering = list(super().get_ordering(request, queryset, view))
+        # Garante uma chave única no fim da ordenação
+        if not {campo.lstrip('-') for campo in ordering} & {'pk', 'id'}:
+            ordering.append('-pk' if ordering[0].startswith('-') else 'pk')
+        return tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverso = self.cursor is not None and self.cursor.reverse
+
+        ordering = [inverter(campo) for campo in self.ordering] if reverso else list(self.ordering)
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None:
+            try:
+                valores = json.loads(self.cursor.position)
+            except (TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+            queryset = queryset.filter(condicao_apos(ordering, valores))
+
+        resultados = list(queryset[:self.page_size + 1])
+        tem_mais = len(resultados) > self.page_size
+        self.page = resultados[:self.page_size]
+        if reverso:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, tem_mais
+        else:
+            self.has_next, self.has_previous = tem_mais, self.cursor is not None
+        if not self.page:
+            self.has_next = self.has_previous = False
+
+        return self.page
+
+    def posicao(self, instance):
+        return json.dumps([
+            str(getattr(instance, campo.lstrip('-'))) for campo in self.ordering
+        ])
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self.posicao(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self.posicao(self.page[0])))
+
+
+class CursorOpcionalPagination(BasePagination):
+    """
+    Paginação por número de página, com paginação por cursor (keyset) sob demanda.
+
+    O cursor é usado quando a requisição pede ?paginacao=cursor (ou já traz um
+    ?cursor=) ou quando a view define paginacao_cursor = True. A view precisa
+    declarar um `ordering` estável e indexado, como ('-data_registro', '-id'):
+    cada página vira um filtro sobre essas colunas, sem COUNT(*) nem OFFSET.
+    """
+    modo_query_param = 'paginacao'
+
+    def __init__(self):
+        self.por_pagina = PageNumberPagination()
+        self.por_cursor = CursorChavePagination()
+        self.ativa = self.por_pagina
+
+    def usar_cursor(self, request, view):
+        if getattr(view, 'ordering', None) is None:
+            return False
+        if self.por_cursor.cursor_query_param in request.query_params:
+            return True
+        modo = request.query_params.get(self.modo_query_param)
+        if modo is not None:
+            return modo == 'cursor'
+        return getattr(view, 'paginacao_cursor', False)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.ativa = self.por_cursor if self.usar_cursor(request, view) else self.por_pagina
+        return self.ativa.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.ativa.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.ativa.get_paginated_response_schema(schema)
+
+    @property
+    def display_page_controls(self):
+        return self.ativa.display_page_controls
+
+    def to_html(self):
+        return self.ativa.to_html()
+
+    def get_results(self, data):
+        return self.ativa.get_results(data)
+
+    def get_schema_fields(self, view):
+        return self.por_pagina.get_schema_fields(view) + self.por_cursor.get_schema_fields(view)
+
+    def get_schema_operation_parameters(self, view):
+        return (
+            self.por_pagina.get_schema_operation_parameters(view)
+            + self.por_cursor.get_schema_operation_parameters(view)
+        )
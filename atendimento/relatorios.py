@@ -0,0 +1,280 @@
+from django.db.models import Count, Q
+
+from .frequencia import encontros_por_mes, inicio_do_mes
+from .models import MembroFamilia, Encontro, Presenca, EntregaCesta, ProgramaSocial, FrequenciaMensal
+
+# Tamanho dos blocos lidos do banco ao percorrer tabelas grandes
+CHUNK_SIZE = 2000
+
+# Colunas das versões em CSV de cada relatório
+COLUNAS_CSV = {
+    'frequencia_membros': [
+        'membro_id', 'membro_nome', 'familia_id', 'familia_nome',
+        'data', 'presente', 'observacoes'
+    ],
+    'entregas_cestas': [
+        'mes_ano', 'familia_id', 'familia_nome', 'data_entrega',
+        'usuario_registro', 'observacoes'
+    ],
+    'frequencia_mensal': [
+        'membro_id', 'membro_nome', 'familia_id', 'familia_nome',
+        'mes', 'total_encontros', 'total_presente', 'total_faltas'
+    ],
+    'grade_roupas': ['categoria', 'tamanho', 'total'],
+    'programas_sociais': ['programa', 'total_familias'],
+}
+
+
+def frequencia_membros(data_inicio, data_fim, membro_id=None, familia_id=None):
+    """
+    Gera uma linha de frequência por membro ativo no período.
+
+    O custo é constante em número de consultas (encontros, membros e
+    presenças), independente da quantidade de membros ou de encontros.
+    """
+    # Encontros do período, buscados uma única vez
+    encontros_qs = Encontro.objects.filter(
+        data__gte=data_inicio,
+        data__lte=data_fim,
+        ativo=True
+    )
+    encontros = list(encontros_qs.order_by('data').values_list('id', 'data'))
+    total_encontros = len(encontros)
+
+    # Membros ativos com os totais calculados pelo banco
+    membros = MembroFamilia.objects.filter(ativo=True)
+    if membro_id:
+        membros = membros.filter(id=membro_id)
+    if familia_id:
+        membros = membros.filter(familia_id=familia_id)
+
+    no_periodo = Q(presencas__encontro__in=encontros_qs)
+    membros = membros.select_related('familia').annotate(
+        total_presente=Count('presencas', filter=no_periodo & Q(presencas__presente=True)),
+        total_faltas=Count('presencas', filter=no_periodo & Q(presencas__presente=False)),
+    )
+
+    # Matriz membro x encontro montada em memória a partir de uma só consulta
+    matriz = {}
+    if encontros:
+        presencas = Presenca.objects.filter(
+            encontro__in=encontros_qs,
+            membro__in=membros.values('id')
+        ).values_list('membro_id', 'encontro_id', 'presente', 'observacoes')
+        for membro_pk, encontro_pk, presente, observacoes in presencas.iterator(chunk_size=CHUNK_SIZE):
+            matriz.setdefault(membro_pk, {})[encontro_pk] = (presente, observacoes)
+
+    for membro in membros.iterator(chunk_size=CHUNK_SIZE):
+        registros = matriz.get(membro.id, {})
+
+        # Calcula a frequência percentual
+        frequencia_percentual = 0
+        if total_encontros > 0:
+            frequencia_percentual = (membro.total_presente / total_encontros) * 100
+
+        # Detalhes das presenças
+        detalhes = []
+        for encontro_pk, data in encontros:
+            presente, observacoes = registros.get(encontro_pk, (False, ''))
+            detalhes.append({
+                'data': data,
+                'presente': presente,
+                'observacoes': observacoes
+            })
+
+        yield {
+            'membro_id': membro.id,
+            'membro_nome': membro.nome_completo,
+            'familia_id': membro.familia_id,
+            'familia_nome': str(membro.familia),
+            'total_encontros': total_encontros,
+            'total_presente': membro.total_presente,
+            'total_faltas': membro.total_faltas,
+            'frequencia_percentual': round(frequencia_percentual, 2),
+            'detalhes': detalhes
+        }
+
+
+def frequencia_membros_csv(linhas):
+    # Uma linha por membro e encontro
+    for linha in linhas:
+        for detalhe in linha['detalhes']:
+            yield {
+                'membro_id': linha['membro_id'],
+                'membro_nome': linha['membro_nome'],
+                'familia_id': linha['familia_id'],
+                'familia_nome': linha['familia_nome'],
+                **detalhe
+            }
+
+
+def frequencia_mensal(data_inicio, data_fim, membro_id=None, familia_id=None):
+    """
+    Gera uma linha de frequência por membro ativo, mês a mês, a partir do
+    resumo FrequenciaMensal.
+
+    O período é arredondado para meses inteiros. Um ano de histórico lê até
+    12 linhas por membro, em vez de uma presença por encontro.
+    """
+    mes_inicio = inicio_do_mes(data_inicio)
+    mes_fim = inicio_do_mes(data_fim)
+
+    totais = encontros_por_mes()
+    meses = sorted(mes for mes in totais if mes_inicio <= mes <= mes_fim)
+    total_encontros = sum(totais[mes] for mes in meses)
+
+    membros = MembroFamilia.objects.filter(ativo=True)
+    if membro_id:
+        membros = membros.filter(id=membro_id)
+    if familia_id:
+        membros = membros.filter(familia_id=familia_id)
+
+    resumo = {}
+    linhas = FrequenciaMensal.objects.filter(
+        mes__gte=mes_inicio,
+        mes__lte=mes_fim,
+        membro__in=membros.values('id')
+    ).values_list('membro_id', 'mes', 'total_presente', 'total_faltas')
+    for membro_pk, mes, presente, faltas in linhas.iterator(chunk_size=CHUNK_SIZE):
+        resumo.setdefault(membro_pk, {})[mes] = (presente, faltas)
+
+    for membro in membros.select_related('familia').iterator(chunk_size=CHUNK_SIZE):
+        registros = resumo.get(membro.id, {})
+        total_presente = total_faltas = 0
+        detalhes = []
+        for mes in meses:
+            presente, faltas = registros.get(mes, (0, 0))
+            total_presente += presente
+            total_faltas += faltas
+            detalhes.append({
+                'mes': mes.strftime('%Y-%m'),
+                'total_encontros': totais[mes],
+                'total_presente': presente,
+                'total_faltas': faltas,
+            })
+
+        frequencia_percentual = 0
+        if total_encontros > 0:
+            frequencia_percentual = (total_presente / total_encontros) * 100
+
+        yield {
+            'membro_id': membro.id,
+            'membro_nome': membro.nome_completo,
+            'familia_id': membro.familia_id,
+            'familia_nome': str(membro.familia),
+            'total_encontros': total_encontros,
+            'total_presente': total_presente,
+            'total_faltas': total_faltas,
+            'frequencia_percentual': round(frequencia_percentual, 2),
+            'meses': detalhes
+        }
+
+
+def frequencia_mensal_csv(linhas):
+    # Uma linha por membro e mês
+    for linha in linhas:
+        for detalhe in linha['meses']:
+            yield {
+                'membro_id': linha['membro_id'],
+                'membro_nome': linha['membro_nome'],
+                'familia_id': linha['familia_id'],
+                'familia_nome': linha['familia_nome'],
+                **detalhe
+            }
+
+
+def entregas_cestas(data_inicio, data_fim):
+    """
+    Gera as entregas do período agrupadas por mês, do mais recente ao mais antigo.
+
+    As entregas são lidas em blocos e cada mês é emitido assim que termina,
+    então a memória usada é a de um mês, não a do período inteiro.
+    """
+    entregas = EntregaCesta.objects.filter(
+        data_entrega__gte=data_inicio,
+        data_entrega__lte=data_fim
+    ).select_related('familia', 'usuario_registro').order_by('-data_entrega', 'id')
+
+    grupo = None
+    for entrega in entregas.iterator(chunk_size=CHUNK_SIZE):
+        mes_ano = entrega.data_entrega.strftime('%m/%Y')
+
+        if grupo is None or grupo['mes_ano'] != mes_ano:
+            if grupo is not None:
+                yield grupo
+            grupo = {
+                'mes_ano': mes_ano,
+                'mes': entrega.data_entrega.month,
+                'ano': entrega.data_entrega.year,
+                'total_entregas': 0,
+                'familias': []
+            }
+
+        grupo['total_entregas'] += 1
+        grupo['familias'].append({
+            'familia_id': entrega.familia.id,
+            'familia_nome': str(entrega.familia),
+            'data_entrega': entrega.data_entrega,
+            'usuario_registro': entrega.usuario_registro.get_full_name() if entrega.usuario_registro else 'Sistema',
+            'observacoes': entrega.observacoes
+        })
+
+    if grupo is not None:
+        yield grupo
+
+
+def entregas_cestas_csv(grupos):
+    # Uma linha por entrega
+    for grupo in grupos:
+        for familia in grupo['familias']:
+            yield {'mes_ano': grupo['mes_ano'], **familia}
+
+
+def grade_roupas():
+    """
+    Gera a contagem de membros ativos por categoria e tamanho.
+    """
+    membros = MembroFamilia.objects.filter(ativo=True)
+    tamanhos_camiseta = dict(MembroFamilia.TAMANHO_CAMISETA_CHOICES)
+
+    categorias = [
+        ('camisetas', 'tamanho_camiseta'),
+        ('calcas', 'tamanho_calca'),
+        ('calcados', 'numero_calcado'),
+    ]
+    for categoria, campo in categorias:
+        contagem = membros.filter(**{f'{campo}__isnull': False})\
+            .values(campo)\
+            .annotate(total=Count('id'))\
+            .order_by(campo)
+
+        for item in contagem:
+            tamanho = item[campo]
+            if categoria == 'camisetas':
+                tamanho = tamanhos_camiseta.get(tamanho, tamanho)
+            yield {'categoria': categoria, 'tamanho': tamanho, 'total': item['total']}
+
+
+def agrupar_grade_roupas(linhas):
+    # Formato original do relatório: uma lista por categoria
+    resultado = {'camisetas': [], 'calcas': [], 'calcados': []}
+    for linha in linhas:
+        chave = 'numero' if linha['categoria'] == 'calcados' else 'tamanho'
+        resultado[linha['categoria']].append({chave: linha['tamanho'], 'total': linha['total']})
+    return resultado
+
+
+def programas_sociais():
+    """
+    Gera o total de famílias por programa social, do mais frequente ao menos frequente.
+
+    A contagem é um único GROUP BY sobre a relação Familia x ProgramaSocial.
+    """
+    programas = ProgramaSocial.objects.filter(
+        familias__recebe_programas_sociais=True
+    ).values('nome').annotate(
+        total_familias=Count('familias')
+    ).order_by('-total_familias', 'nome')
+
+    for item in programas.iterator(chunk_size=CHUNK_SIZE):
+        yield {'programa': item['nome'], 'total_familias': item['total_familias']}
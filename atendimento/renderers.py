@@ -0,0 +1,72 @@
+import csv
+import json
+
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from .assincrono import iterar_em_thread
+
+
+class Echo:
+    # Pseudo-buffer: o csv.writer devolve cada linha em vez de acumulá-la
+    def write(self, value):
+        return value
+
+
+def linha_ndjson(item):
+    return json.dumps(item, cls=JSONEncoder, ensure_ascii=False) + '\n'
+
+
+def linhas_csv(linhas, colunas):
+    writer = csv.DictWriter(Echo(), fieldnames=colunas, extrasaction='ignore')
+    yield writer.writeheader()
+    for linha in linhas:
+        yield writer.writerow(linha)
+
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, dict):
+            data = [data]
+        return ''.join(linha_ndjson(item) for item in data).encode(self.charset)
+
+
+class CSVRenderer(BaseRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not data:
+            return b''
+        if isinstance(data, dict):
+            data = [data]
+        return ''.join(linhas_csv(data, list(data[0].keys()))).encode(self.charset)
+
+
+def resposta_streaming(formato, linhas, colunas, nome_arquivo, assincrono=False):
+    """
+    Devolve as linhas do relatório à medida que são produzidas, em NDJSON ou CSV.
+
+    Com assincrono (servido por ASGI) o conteúdo é um iterador assíncrono que
+    lê as linhas em lotes fora do event loop.
+    """
+    if formato == CSVRenderer.format:
+        conteudo = linhas_csv(linhas, colunas)
+        content_type = 'text/csv; charset=utf-8'
+    else:
+        conteudo = (linha_ndjson(linha) for linha in linhas)
+        content_type = 'application/x-ndjson; charset=utf-8'
+    if assincrono:
+        conteudo = iterar_em_thread(conteudo)
+    response = StreamingHttpResponse(conteudo, content_type=content_type)
+    if formato == CSVRenderer.format:
+        response['Content-Disposition'] = f'attachment; filename="{nome_arquivo}.csv"'
+    return response
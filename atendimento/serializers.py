@@ -1,8 +1,10 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from . import miniaturas
+from .campos import CamposDinamicosSerializerMixin
 from .models import (
     Endereco, Familia, Responsavel, MembroFamilia, 
-    Turma, Encontro, Presenca, EntregaCesta, ConfiguracaoSistema
+    Turma, Encontro, Presenca, EntregaCesta, ConfiguracaoSistema, FrequenciaMensal
 )
 
 User = get_user_model()
@@ -13,13 +15,15 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'email', 'first_name', 'last_name', 'tipo', 'is_active']
         read_only_fields = ['id', 'is_active']
 
-class EnderecoSerializer(serializers.ModelSerializer):
+class EnderecoSerializer(CamposDinamicosSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Endereco
         fields = '__all__'
 
-class FamiliaSerializer(serializers.ModelSerializer):
+class FamiliaSerializer(CamposDinamicosSerializerMixin, serializers.ModelSerializer):
     endereco = EnderecoSerializer()
+    # Derivado de programas_sociais, que continua sendo o campo editável
+    programas = serializers.SlugRelatedField(many=True, read_only=True, slug_field='nome')
     
     class Meta:
         model = Familia
@@ -41,43 +45,65 @@ class FamiliaSerializer(serializers.ModelSerializer):
             instance.endereco = endereco
         return super().update(instance, validated_data)
 
-class ResponsavelSerializer(serializers.ModelSerializer):
+class ResponsavelSerializer(CamposDinamicosSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Responsavel
         fields = '__all__'
         read_only_fields = ['data_cadastro', 'data_atualizacao']
 
-class MembroFamiliaSerializer(serializers.ModelSerializer):
+class MembroFamiliaSerializer(CamposDinamicosSerializerMixin, serializers.ModelSerializer):
     idade = serializers.ReadOnlyField()
+    # {"96": {"webp": url, "jpeg": url}, "320": {...}}; null enquanto não foram geradas
+    foto_thumb = serializers.SerializerMethodField()
     
     class Meta:
         model = MembroFamilia
-        fields = '__all__'
+        exclude = ['foto_miniaturas']
         read_only_fields = ['data_cadastro', 'data_atualizacao', 'idade']
+        # Colunas usadas por campos que não são do modelo (?fields=)
+        dependencias = {'idade': ['data_nascimento'], 'foto_thumb': ['foto', 'foto_miniaturas']}
+    
+    def get_foto_thumb(self, obj):
+        if not miniaturas.atualizadas(obj):
+            return None
+        storage = obj.foto.storage
+        request = self.context.get('request')
+        urls = {}
+        for tamanho in miniaturas.TAMANHOS:
+            urls[str(tamanho)] = {}
+            for formato, nome in obj.foto_miniaturas.get(str(tamanho), {}).items():
+                url = storage.url(nome)
+                urls[str(tamanho)][formato] = request.build_absolute_uri(url) if request else url
+        return urls
 
-class TurmaSerializer(serializers.ModelSerializer):
+class TurmaSerializer(CamposDinamicosSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Turma
         fields = '__all__'
 
-class EncontroSerializer(serializers.ModelSerializer):
+class EncontroSerializer(CamposDinamicosSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Encontro
         fields = '__all__'
 
-class PresencaSerializer(serializers.ModelSerializer):
+class PresencaSerializer(CamposDinamicosSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Presenca
         fields = '__all__'
         read_only_fields = ['data_registro', 'usuario_registro']
 
-class EntregaCestaSerializer(serializers.ModelSerializer):
+class FrequenciaMensalSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = FrequenciaMensal
+        fields = ['mes', 'total_encontros', 'total_presente', 'total_faltas']
+
+class EntregaCestaSerializer(CamposDinamicosSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = EntregaCesta
         fields = '__all__'
         read_only_fields = ['data_registro', 'usuario_registro']
 
-class ConfiguracaoSistemaSerializer(serializers.ModelSerializer):
+class ConfiguracaoSistemaSerializer(CamposDinamicosSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = ConfiguracaoSistema
         fields = '__all__'
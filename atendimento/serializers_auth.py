@@ -1,6 +1,10 @@
 from rest_framework import serializers
+from rest_framework.exceptions import AuthenticationFailed
 from django.contrib.auth import get_user_model
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from .authentication import adicionar_claims
 
 User = get_user_model()
 
@@ -9,13 +13,8 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     def get_token(cls, user):
         token = super().get_token(user)
         
-        # Adiciona claims personalizados ao token
-        token['email'] = user.email
-        token['first_name'] = user.first_name
-        token['last_name'] = user.last_name
-        token['tipo'] = user.tipo
-        
-        return token
+        # Adiciona claims personalizados ao token (usados por ClaimsJWTAuthentication)
+        return adicionar_claims(token, user)
 
     def validate(self, attrs):
         data = super().validate(attrs)
@@ -31,6 +30,23 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         
         return data
 
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Renova os claims a partir do banco: o refresh token pode ter dias e o
+    tipo ou o status do usuário podem ter mudado desde o login.
+    """
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        access = AccessToken(data['access'])
+        user = User.objects.filter(**{api_settings.USER_ID_FIELD: access[api_settings.USER_ID_CLAIM]}).first()
+        if user is None or not user.is_active:
+            raise AuthenticationFailed('Usuário inativo ou inexistente.', code='user_inactive')
+        
+        data['access'] = str(adicionar_claims(access, user))
+        if 'refresh' in data:
+            data['refresh'] = str(adicionar_claims(RefreshToken(data['refresh']), user))
+        return data
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
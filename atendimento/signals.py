@@ -0,0 +1,147 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from . import autocomplete, frequencia, miniaturas, turmas
+from .authentication import usuarios
+from .cache import invalidar_modelo
+from .models import Usuario, Familia, MembroFamilia, Turma, Encontro, Presenca, EntregaCesta, ProgramaSocial
+
+
+@receiver(post_save, sender=Familia)
+@receiver(post_save, sender=MembroFamilia)
+@receiver(post_save, sender=Encontro)
+@receiver(post_save, sender=Presenca)
+@receiver(post_save, sender=EntregaCesta)
+@receiver(post_delete, sender=Familia)
+@receiver(post_delete, sender=MembroFamilia)
+@receiver(post_delete, sender=Encontro)
+@receiver(post_delete, sender=Presenca)
+@receiver(post_delete, sender=EntregaCesta)
+def invalidar_relatorios(sender, **kwargs):
+    invalidar_modelo(sender)
+
+
+@receiver(m2m_changed, sender=Familia.programas.through)
+def invalidar_programas(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidar_modelo(ProgramaSocial)
+
+
+# Frequência mensal (atendimento.frequencia)
+
+@receiver(pre_save, sender=Presenca)
+def guardar_presenca_anterior(sender, instance, raw=False, **kwargs):
+    # Uma presença alterada pode ter mudado de membro ou de encontro
+    if instance.pk and not raw:
+        instance._frequencia_anterior = Presenca.objects.filter(pk=instance.pk).values_list(
+            'membro_id', 'encontro__data'
+        ).first()
+
+
+@receiver(post_save, sender=Presenca)
+def atualizar_frequencia_presenca(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    chaves = {(instance.membro_id, frequencia.inicio_do_mes(instance.encontro.data))}
+    anterior = getattr(instance, '_frequencia_anterior', None)
+    if anterior is not None:
+        chaves.add((anterior[0], frequencia.inicio_do_mes(anterior[1])))
+    for membro_id, mes in chaves:
+        frequencia.recalcular(membro_ids=[membro_id], meses=[mes])
+
+
+@receiver(post_delete, sender=Presenca)
+def atualizar_frequencia_presenca_excluida(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Presenca):
+        frequencia.recalcular(membro_ids=[instance.membro_id], meses=[instance.encontro.data])
+    elif isinstance(origin, QuerySet) and origin.model is Presenca:
+        # Presenca.objects.filter(...).delete(): um recálculo para o conjunto todo
+        pendentes = origin.__dict__.get('_frequencia_pendente')
+        if pendentes is None:
+            pendentes = origin._frequencia_pendente = (set(), set())
+            transaction.on_commit(lambda: recalcular_excluidas(*pendentes))
+        pendentes[0].add(instance.membro_id)
+        pendentes[1].add(instance.encontro_id)
+    # Em cascata não há o que fazer linha a linha: o encontro excluído recalcula o
+    # mês inteiro, e as linhas de um membro excluído somem junto com ele
+
+
+def recalcular_excluidas(membro_ids, encontro_ids):
+    # Encontros excluídos na mesma transação já recalcularam os seus meses
+    meses = Encontro.objects.filter(id__in=encontro_ids).values_list('data', flat=True)
+    frequencia.recalcular(membro_ids=membro_ids, meses=list(meses))
+
+
+@receiver(pre_save, sender=Encontro)
+def guardar_encontro_anterior(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._frequencia_anterior = Encontro.objects.filter(pk=instance.pk).values_list(
+            'data', 'ativo'
+        ).first()
+
+
+@receiver(post_save, sender=Encontro)
+def atualizar_frequencia_encontro(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, '_frequencia_anterior', None)
+    # Só a data e o status alteram os totais do mês
+    if not created and anterior == (instance.data, instance.ativo):
+        return
+    meses = [instance.data]
+    if anterior is not None:
+        meses.append(anterior[0])
+    frequencia.recalcular(meses=meses)
+
+
+@receiver(post_delete, sender=Encontro)
+def atualizar_frequencia_encontro_excluido(sender, instance, **kwargs):
+    frequencia.recalcular(meses=[instance.data])
+
+
+# Alocação pré-calculada de turmas (atendimento.turmas)
+
+@receiver(post_save, sender=MembroFamilia)
+def atualizar_alocacao_membro(sender, instance, raw=False, **kwargs):
+    if settings.TURMAS_ALOCACAO_PRECALCULADA and not raw:
+        turmas.alocar(membro_ids=[instance.id])
+
+
+@receiver(post_save, sender=Turma)
+@receiver(post_delete, sender=Turma)
+def atualizar_alocacao_turmas(sender, raw=False, **kwargs):
+    if settings.TURMAS_ALOCACAO_PRECALCULADA and not raw:
+        turmas.alocar()
+
+
+# Índices de autocomplete (atendimento.autocomplete)
+
+@receiver(post_save, sender=MembroFamilia)
+@receiver(post_delete, sender=MembroFamilia)
+def invalidar_autocomplete_membros(sender, **kwargs):
+    autocomplete.membros.invalidar()
+
+
+@receiver(post_save, sender=Familia)
+@receiver(post_delete, sender=Familia)
+def invalidar_autocomplete_familias(sender, **kwargs):
+    autocomplete.familias.invalidar()
+
+
+# Miniaturas das fotos (atendimento.miniaturas)
+
+@receiver(post_save, sender=MembroFamilia)
+def agendar_miniaturas(sender, instance, raw=False, **kwargs):
+    if not raw and miniaturas.pendente(instance):
+        miniaturas.agendar(instance.id)
+
+
+# Usuários em cache para a autenticação JWT (atendimento.authentication)
+
+@receiver(post_save, sender=Usuario)
+@receiver(post_delete, sender=Usuario)
+def remover_usuario_em_cache(sender, instance, **kwargs):
+    usuarios.remover(instance.pk)
@@ -1,3 +1,1343 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from datetime import date, timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, InterfaceError, connection, connections, transaction
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, resolve
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework.throttling import SimpleRateThrottle
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core import banco, servidor
+from core.banco import pool as pools
+from core.metrics import metricas
+
+from . import miniaturas, throttling
+from .authentication import usuarios
+from .models import (
+    Endereco, Familia, Responsavel, MembroFamilia, Turma, Encontro, Presenca, EntregaCesta, FrequenciaMensal,
+    AlocacaoTurma
+)
+from .views import EncontroViewSet, RelatoriosViewSet
+
+User = get_user_model()
+
+# Cache e contadores de throttling próprios desta execução: o cache em arquivo padrão
+# (CACHE_DIR) é o mesmo do runserver/gunicorn locais e de outras execuções dos testes
+PASTA_TESTES = tempfile.TemporaryDirectory(prefix='social-testes-')
+CACHE_TESTES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'testes'}}
+
+
+def criar_familia(nome='Família Teste', **kwargs):
+    endereco = Endereco.objects.create(
+        rua='Rua A', numero='1', bairro='Centro',
+        cidade='São Paulo', estado='SP', cep='01000-000'
+    )
+    return Familia.objects.create(nome=nome, endereco=endereco, **kwargs)
+
+
+def criar_membro(familia, nome='Membro', data_nascimento=date(2015, 5, 10), **kwargs):
+    return MembroFamilia.objects.create(
+        nome_completo=nome, data_nascimento=data_nascimento,
+        sexo='F', familia=familia, **kwargs
+    )
+
+
+@override_settings(
+    SECURE_SSL_REDIRECT=False,
+    CACHES=CACHE_TESTES,
+    THROTTLE_REDIS_URL='',
+    THROTTLE_SQLITE_PATH=os.path.join(PASTA_TESTES.name, 'throttle.sqlite3'),
+)
+class APITestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        throttling.contador().limpar()
+        self.usuario = User.objects.create_user(
+            email='atendente@example.com', password='senha-forte-123',
+            username='atendente', tipo='atendente'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+
+    def assertConsultasNoMaximo(self, maximo, url, params=None):
+        # Limite fixo de consultas por requisição, independente do volume de dados
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(
+            len(consultas), maximo,
+            '\n'.join(q['sql'] for q in consultas.captured_queries)
+        )
+        return response
+
+
+class FrequenciaMembrosTests(APITestCase):
+    url = '/api/relatorios/frequencia-membros/'
+
+    def setUp(self):
+        super().setUp()
+        self.familia = criar_familia()
+        self.ana = criar_membro(self.familia, 'Ana')
+        self.bruno = criar_membro(self.familia, 'Bruno')
+        self.encontros = [
+            Encontro.objects.create(data=date(2024, 3, dia)) for dia in (2, 9, 16)
+        ]
+        Encontro.objects.create(data=date(2024, 3, 23), ativo=False)
+        Presenca.objects.create(membro=self.ana, encontro=self.encontros[0], presente=True)
+        Presenca.objects.create(membro=self.ana, encontro=self.encontros[1], presente=False, observacoes='Doente')
+        Presenca.objects.create(membro=self.bruno, encontro=self.encontros[2], presente=True)
+
+    def test_totais_e_detalhes(self):
+        response = self.client.get(self.url, {'data_inicio': '2024-03-01', 'data_fim': '2024-03-31'})
+        self.assertEqual(response.status_code, 200)
+        linhas = {linha['membro_nome']: linha for linha in response.data}
+
+        ana = linhas['Ana']
+        self.assertEqual(ana['total_encontros'], 3)
+        self.assertEqual(ana['total_presente'], 1)
+        self.assertEqual(ana['total_faltas'], 1)
+        self.assertEqual(ana['frequencia_percentual'], 33.33)
+        self.assertEqual(
+            [(d['data'], d['presente'], d['observacoes']) for d in ana['detalhes']],
+            [(date(2024, 3, 2), True, None), (date(2024, 3, 9), False, 'Doente'), (date(2024, 3, 16), False, '')]
+        )
+        self.assertEqual(linhas['Bruno']['total_presente'], 1)
+        self.assertEqual(linhas['Bruno']['total_faltas'], 0)
+
+    def test_consultas_nao_crescem_com_membros(self):
+        params = {'data_inicio': '2024-03-01', 'data_fim': '2024-03-31'}
+        with self.assertNumQueries(3):
+            self.client.get(self.url, params)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(10):
+                membro = criar_membro(self.familia, f'Extra {i}')
+                Presenca.objects.create(membro=membro, encontro=self.encontros[0])
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, params)
+        self.assertEqual(len(response.data), 12)
+
+    def test_parametros_obrigatorios(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 400)
+
+
+class RelatoriosStreamingTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.familia = criar_familia(
+            'Silva', recebe_programas_sociais=True, programas_sociais='Bolsa Família; Vale Gás'
+        )
+        criar_membro(self.familia, 'Ana', tamanho_camiseta='P', numero_calcado=30)
+        outra = criar_familia('Souza')
+        for dia in (5, 20):
+            EntregaCesta.objects.create(familia=self.familia if dia == 5 else outra, data_entrega=date(2024, 2, dia))
+        EntregaCesta.objects.create(familia=self.familia, data_entrega=date(2024, 3, 5))
+
+    def conteudo(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson_entregas_por_mes(self):
+        response = self.client.get('/api/relatorios/entregas-cestas/', {
+            'data_inicio': '2024-01-01', 'data_fim': '2024-12-31', 'format': 'ndjson'
+        })
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        grupos = [json.loads(linha) for linha in self.conteudo(response).splitlines()]
+        self.assertEqual([(g['mes_ano'], g['total_entregas']) for g in grupos], [('03/2024', 1), ('02/2024', 2)])
+
+    def test_json_mantem_formato(self):
+        response = self.client.get('/api/relatorios/entregas-cestas/', {
+            'data_inicio': '2024-01-01', 'data_fim': '2024-12-31'
+        })
+        self.assertEqual([g['mes_ano'] for g in response.data], ['03/2024', '02/2024'])
+
+        response = self.client.get('/api/relatorios/grade-roupas/')
+        self.assertEqual(response.data['camisetas'], [{'tamanho': 'P', 'total': 1}])
+        self.assertEqual(response.data['calcados'], [{'numero': 30, 'total': 1}])
+
+    def test_csv(self):
+        response = self.client.get('/api/relatorios/programas-sociais/', {'format': 'csv'})
+        self.assertIn('attachment', response['Content-Disposition'])
+        linhas = list(csv.DictReader(io.StringIO(self.conteudo(response))))
+        self.assertEqual(
+            sorted((l['programa'], l['total_familias']) for l in linhas),
+            [('Bolsa Família', '1'), ('Vale Gás', '1')]
+        )
+
+        response = self.client.get('/api/relatorios/entregas-cestas/', {
+            'data_inicio': '2024-01-01', 'data_fim': '2024-12-31', 'format': 'csv'
+        })
+        linhas = list(csv.DictReader(io.StringIO(self.conteudo(response))))
+        self.assertEqual(len(linhas), 3)
+        self.assertEqual(linhas[0]['familia_nome'], 'Silva')
+
+    def test_parametros_invalidos_antes_do_streaming(self):
+        for relatorio in ('frequencia-membros', 'frequencia-mensal', 'entregas-cestas'):
+            for formato in ('ndjson', 'csv'):
+                response = self.client.get(f'/api/relatorios/{relatorio}/', {
+                    'data_inicio': 'xx', 'data_fim': '2024-01-01', 'format': formato
+                })
+                self.assertEqual(response.status_code, 400, (relatorio, formato))
+                self.assertFalse(response.streaming)
+
+        response = self.client.get('/api/relatorios/frequencia-membros/', {
+            'data_inicio': '2024-01-01', 'data_fim': '2024-12-31', 'membro_id': 'x', 'format': 'ndjson'
+        })
+        self.assertEqual(response.status_code, 400)
+
+
+class RegistrarPresencasTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        familia = criar_familia()
+        self.membros = [criar_membro(familia, f'Membro {i}') for i in range(5)]
+        self.inativo = criar_membro(familia, 'Inativo', ativo=False)
+        self.encontro = Encontro.objects.create(data=date(2024, 4, 6))
+        self.url = f'/api/encontros/{self.encontro.id}/registrar_presencas/'
+
+    def test_cria_atualiza_e_rejeita(self):
+        Presenca.objects.create(membro=self.membros[0], encontro=self.encontro, presente=False)
+        payload = {'presencas': [
+            {'membro_id': self.membros[0].id, 'presente': True},
+            {'membro_id': self.membros[1].id, 'presente': True, 'observacoes': 'Chegou tarde'},
+            {'membro_id': self.inativo.id, 'presente': True},
+            {'membro_id': 999999},
+        ]}
+        response = self.client.post(self.url, payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        status = [r['status'] for r in response.data['resultados']]
+        self.assertEqual(status, ['updated', 'created', 'error', 'error'])
+
+        presenca = Presenca.objects.get(membro=self.membros[1], encontro=self.encontro)
+        self.assertEqual(response.data['resultados'][1]['presenca_id'], presenca.id)
+        self.assertEqual(presenca.observacoes, 'Chegou tarde')
+        self.assertEqual(presenca.usuario_registro, self.usuario)
+        self.assertTrue(Presenca.objects.get(membro=self.membros[0], encontro=self.encontro).presente)
+
+    def test_consultas_constantes(self):
+        payload = {'presencas': [{'membro_id': m.id, 'presente': True} for m in self.membros]}
+        # encontro, membros, existentes, savepoint, insert, ids,
+        # resumo mensal (encontros do mês, totais, linhas atuais, upsert), release
+        with self.assertNumQueries(11):
+            self.client.post(self.url, payload, format='json')
+        self.assertEqual(Presenca.objects.filter(encontro=self.encontro).count(), 5)
+
+
+class IndicesTests(TestCase):
+    def plano(self, queryset):
+        # No PostgreSQL tabelas pequenas sempre levam a seq scan; desliga para
+        # verificar se o índice é utilizável pela consulta
+        if connection.vendor != 'postgresql':
+            return queryset.explain()
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+            try:
+                return queryset.explain()
+            finally:
+                cursor.execute('RESET enable_seqscan')
+
+    def assertUsaIndice(self, queryset, indice):
+        plano = self.plano(queryset)
+        self.assertIn(indice, plano, plano)
+
+    def test_consultas_usam_indices(self):
+        hoje = date(2024, 6, 1)
+        self.assertUsaIndice(
+            MembroFamilia.objects.filter(
+                ativo=True, data_nascimento__gte=date(2015, 1, 1), data_nascimento__lte=hoje
+            ),
+            'membro_ativo_nasc_idx'
+        )
+        self.assertUsaIndice(Responsavel.objects.filter(cpf='123.456.789-00'), 'responsavel_cpf_idx')
+        self.assertUsaIndice(
+            EntregaCesta.objects.filter(data_entrega__gte=date(2024, 1, 1), data_entrega__lte=hoje),
+            'entrega_data_id_idx'
+        )
+        self.assertUsaIndice(Familia.objects.filter(recebe_programas_sociais=True), 'familia_programas_nome_idx')
+
+
+class ConsultasPorPaginaTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        encontro = Encontro.objects.create(data=date(2024, 5, 4))
+        for i in range(25):
+            familia = criar_familia(f'Família {i:02d}')
+            Responsavel.objects.create(
+                nome_completo=f'Responsável {i}', telefone='11 99999-0000',
+                data_nascimento=date(1985, 1, 1), sexo='F', familia=familia
+            )
+            membro = criar_membro(familia, f'Membro {i}')
+            Presenca.objects.create(membro=membro, encontro=encontro, usuario_registro=self.usuario)
+            EntregaCesta.objects.create(familia=familia, data_entrega=date(2024, 5, 4), usuario_registro=self.usuario)
+
+    def test_listas_paginadas(self):
+        # COUNT da paginação + a página (+ os programas sociais das famílias)
+        response = self.assertConsultasNoMaximo(3, '/api/familias/')
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertIn('rua', response.data['results'][0]['endereco'])
+
+        for url in ('/api/responsaveis/', '/api/membros/', '/api/presencas/', '/api/entregas-cestas/'):
+            with self.subTest(url=url):
+                self.assertConsultasNoMaximo(2, url)
+
+    def test_busca_por_familia(self):
+        self.assertConsultasNoMaximo(3, '/api/familias/', {'search': 'Família', 'membros_ativos': '1'})
+        self.assertConsultasNoMaximo(2, '/api/membros/', {'search': 'Família 1'})
+
+
+class RelatoriosCacheTests(APITestCase):
+    url = '/api/relatorios/grade-roupas/'
+
+    def setUp(self):
+        super().setUp()
+        self.familia = criar_familia()
+        criar_membro(self.familia, 'Ana', tamanho_camiseta='P')
+
+    def test_resultado_em_cache_e_invalidado(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['camisetas'], [{'tamanho': 'P', 'total': 1}])
+
+        # A invalidação acontece no commit
+        with self.captureOnCommitCallbacks(execute=True):
+            criar_membro(self.familia, 'Bia', tamanho_camiseta='P')
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['camisetas'], [{'tamanho': 'P', 'total': 2}])
+
+    def test_chave_normaliza_parametros(self):
+        url = '/api/relatorios/frequencia-membros/'
+        self.client.get(url + '?data_inicio=2024-01-01&data_fim=2024-12-31')
+        with self.assertNumQueries(0):
+            self.client.get(url + '?data_fim=2024-12-31&data_inicio=2024-01-01&format=json')
+
+    def test_registro_em_lote_invalida(self):
+        url = '/api/relatorios/frequencia-membros/'
+        params = {'data_inicio': '2024-01-01', 'data_fim': '2024-12-31'}
+        membro = MembroFamilia.objects.get(nome_completo='Ana')
+        encontro = Encontro.objects.create(data=date(2024, 2, 3))
+        self.assertEqual(self.client.get(url, params).data[0]['total_presente'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                f'/api/encontros/{encontro.id}/registrar_presencas/',
+                {'presencas': [{'membro_id': membro.id, 'presente': True}]}, format='json'
+            )
+        self.assertEqual(self.client.get(url, params).data[0]['total_presente'], 1)
+
+
+class ProgramasSociaisTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        criar_familia('Silva', recebe_programas_sociais=True, programas_sociais='Bolsa Família;Vale Gás\nBPC')
+        criar_familia('Souza', recebe_programas_sociais=True, programas_sociais='Bolsa Família, BPC')
+        criar_familia('Lima', recebe_programas_sociais=False, programas_sociais='Bolsa Família')
+
+    def test_texto_sincroniza_relacao(self):
+        familia = Familia.objects.get(nome='Silva')
+        self.assertEqual(
+            sorted(familia.programas.values_list('nome', flat=True)),
+            ['BPC', 'Bolsa Família', 'Vale Gás']
+        )
+        familia.programas_sociais = 'BPC'
+        familia.save()
+        self.assertEqual(list(familia.programas.values_list('nome', flat=True)), ['BPC'])
+
+    def test_edicao_sem_mudar_programas_nao_sincroniza(self):
+        familia = Familia.objects.get(nome='Silva')
+        familia.observacoes = 'Mudou de endereço'
+        # Só o UPDATE da família
+        with self.assertNumQueries(1):
+            familia.save()
+        with self.assertNumQueries(1):
+            familia.save(update_fields=['observacoes'])
+        self.assertEqual(familia.programas.count(), 3)
+
+    def test_relatorio_agrupado(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/relatorios/programas-sociais/')
+        self.assertEqual(response.data['total_familias'], 2)
+        self.assertEqual(response.data['programas'], [
+            {'programa': 'BPC', 'total_familias': 2},
+            {'programa': 'Bolsa Família', 'total_familias': 2},
+            {'programa': 'Vale Gás', 'total_familias': 1},
+        ])
+
+    def test_filtro_por_programa(self):
+        response = self.client.get('/api/familias/', {'programa_social': 'gás'})
+        self.assertEqual([f['nome'] for f in response.data['results']], ['Silva'])
+        self.assertEqual(sorted(response.data['results'][0]['programas']), ['BPC', 'Bolsa Família', 'Vale Gás'])
+
+
+class BuscaTextualTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        familia = criar_familia('Conceição')
+        criar_membro(familia, 'João Antônio')
+        criar_membro(familia, 'Maria José')
+
+    def test_busca_parcial(self):
+        response = self.client.get('/api/membros/', {'search': 'Antô'})
+        self.assertEqual([m['nome_completo'] for m in response.data['results']], ['João Antônio'])
+
+    @skipUnless(connection.vendor == 'postgresql', 'busca sem acentos depende do PostgreSQL')
+    def test_busca_ignora_acentos_e_ordena_por_relevancia(self):
+        response = self.client.get('/api/membros/', {'search': 'joao antonio'})
+        self.assertEqual([m['nome_completo'] for m in response.data['results']], ['João Antônio'])
+
+        response = self.client.get('/api/membros/', {'search': 'conceicao'})
+        self.assertEqual(len(response.data['results']), 2)
+
+
+class PaginacaoCursorTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(45):
+            EntregaCesta.objects.create(familia=criar_familia(f'Família {i}'), data_entrega=date(2024, 1 + i % 12, 1))
+
+    def test_percorre_todas_as_paginas_sem_count(self):
+        url = '/api/entregas-cestas/?paginacao=cursor'
+        vistos = []
+        while url:
+            with CaptureQueriesContext(connection) as consultas:
+                response = self.client.get(url)
+            self.assertEqual(len(consultas), 1)
+            self.assertNotIn('OFFSET', consultas.captured_queries[0]['sql'].upper())
+            vistos += [e['id'] for e in response.data['results']]
+            url = response.data['next']
+
+        esperado = list(EntregaCesta.objects.order_by('-data_entrega', '-id').values_list('id', flat=True))
+        self.assertEqual(vistos, esperado)
+
+        # Volta da última página para a anterior
+        anterior = self.client.get(response.data['previous'])
+        self.assertEqual([e['id'] for e in anterior.data['results']], esperado[20:40])
+
+    def test_paginacao_por_numero_continua_padrao(self):
+        response = self.client.get('/api/entregas-cestas/')
+        self.assertEqual(response.data['count'], 45)
+        self.assertNotIn('count', self.client.get('/api/presencas/', {'paginacao': 'cursor'}).data)
+
+
+class MetricasTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        metricas.limpar()
+
+    @override_settings(METRICS_TOKEN='segredo')
+    def test_server_timing_e_prometheus(self):
+        response = self.client.get('/api/relatorios/grade-roupas/')
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="\d+ queries", serializer;dur=[\d.]+, encode;dur=[\d.]+, total;dur=[\d.]+')
+
+        texto = self.client.get('/api/_metrics', HTTP_AUTHORIZATION='Bearer segredo').content.decode()
+        rotulos = 'view="RelatoriosViewSet.grade_roupas",method="GET",status="200"'
+        self.assertIn(f'social_requests_total{{{rotulos}}} 1', texto)
+        self.assertIn(f'social_db_queries_total{{{rotulos}}} 3', texto)
+        self.assertIn(f'social_request_duration_seconds_count{{{rotulos}}} 1', texto)
+
+    @override_settings(METRICS_TOKEN='segredo')
+    def test_tempo_de_serializacao(self):
+        criar_familia()
+        self.assertEqual(self.client.get('/api/familias/').status_code, 200)
+
+        texto = self.client.get('/api/_metrics', HTTP_AUTHORIZATION='Bearer segredo').content.decode()
+        prefixo = 'social_serializer_duration_seconds_total{view="FamiliaViewSet.list",method="GET",status="200"} '
+        linha = next(linha for linha in texto.splitlines() if linha.startswith(prefixo))
+        self.assertGreater(float(linha[len(prefixo):]), 0)
+
+    @override_settings(METRICS_TOKEN='segredo')
+    def test_token(self):
+        self.assertEqual(self.client.get('/api/_metrics').status_code, 403)
+        response = self.client.get('/api/_metrics', HTTP_AUTHORIZATION='Bearer segredo')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_sem_token_so_em_debug(self):
+        self.assertEqual(self.client.get('/api/_metrics').status_code, 403)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.client.get('/api/_metrics').status_code, 200)
+
+
+@override_settings(CACHES=CACHE_TESTES)
+class BenchmarkTests(TestCase):
+    def test_dados_sinteticos_e_benchmark(self):
+        call_command('gerar_dados_sinteticos', familias=5, encontros=3, stdout=io.StringIO())
+        self.assertEqual(Familia.objects.count(), 5)
+        self.assertEqual(Encontro.objects.count(), 3)
+        self.assertTrue(Presenca.objects.exists())
+
+        with tempfile.TemporaryDirectory() as pasta:
+            saida = os.path.join(pasta, 'baseline.json')
+            call_command('benchmark_api', repeticoes=2, saida=saida, filtro='Relatorios', stdout=io.StringIO())
+            with open(saida) as arquivo:
+                resultado = json.load(arquivo)
+
+        self.assertEqual(resultado['volume']['Familia'], 5)
+        endpoint = resultado['endpoints']['RelatoriosViewSet.frequencia_membros']
+        self.assertEqual(endpoint['status'], 200)
+        self.assertGreater(endpoint['consultas'], 0)
+        self.assertLessEqual(endpoint['p50_ms'], endpoint['p95_ms'])
+
+
+class FrequenciaMensalTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        familia = criar_familia()
+        self.membro = criar_membro(familia, 'Ana')
+        self.outro = criar_membro(familia, 'Bruno')
+        self.encontros = [
+            Encontro.objects.create(data=date(2024, 3, 2)),
+            Encontro.objects.create(data=date(2024, 3, 9)),
+            Encontro.objects.create(data=date(2024, 4, 6)),
+        ]
+
+    def resumo(self, membro, mes):
+        return FrequenciaMensal.objects.filter(membro=membro, mes=mes).values_list(
+            'total_encontros', 'total_presente', 'total_faltas'
+        ).first()
+
+    def test_atualizacao_incremental(self):
+        marco = date(2024, 3, 1)
+        presenca = Presenca.objects.create(membro=self.membro, encontro=self.encontros[0])
+        Presenca.objects.create(membro=self.membro, encontro=self.encontros[1], presente=False)
+        self.assertEqual(self.resumo(self.membro, marco), (2, 1, 1))
+
+        presenca.presente = False
+        presenca.save()
+        self.assertEqual(self.resumo(self.membro, marco), (2, 0, 2))
+
+        # Presença movida para outro membro
+        presenca.membro = self.outro
+        presenca.save()
+        self.assertEqual(self.resumo(self.membro, marco), (2, 0, 1))
+        self.assertEqual(self.resumo(self.outro, marco), (2, 0, 1))
+
+        presenca.delete()
+        self.assertIsNone(self.resumo(self.outro, marco))
+
+        # Encontro desativado deixa de contar
+        self.encontros[1].ativo = False
+        self.encontros[1].save()
+        self.assertIsNone(self.resumo(self.membro, marco))
+        self.encontros[1].ativo = True
+        self.encontros[1].save()
+        self.assertEqual(self.resumo(self.membro, marco), (2, 0, 1))
+
+        # Novo encontro no mês altera o total de todos os membros
+        Encontro.objects.create(data=date(2024, 3, 16))
+        self.assertEqual(self.resumo(self.membro, marco), (3, 0, 1))
+
+    def test_exclusoes_em_cascata_e_em_lote(self):
+        marco = date(2024, 3, 1)
+        for encontro in self.encontros[:2]:
+            Presenca.objects.create(membro=self.membro, encontro=encontro)
+            Presenca.objects.create(membro=self.outro, encontro=encontro, presente=False)
+        self.assertEqual(self.resumo(self.membro, marco), (2, 2, 0))
+
+        # As presenças saem junto com o encontro sem recálculo por linha: só o do mês
+        with CaptureQueriesContext(connection) as consultas:
+            self.encontros[0].delete()
+        self.assertLessEqual(len(consultas), 7)
+        self.assertEqual(self.resumo(self.membro, marco), (1, 1, 0))
+        self.assertEqual(self.resumo(self.outro, marco), (1, 0, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Presenca.objects.filter(membro=self.outro).delete()
+        self.assertIsNone(self.resumo(self.outro, marco))
+        self.assertEqual(self.resumo(self.membro, marco), (1, 1, 0))
+
+        self.membro.delete()
+        self.assertFalse(FrequenciaMensal.objects.exists())
+
+    def test_registrar_presencas_e_reconstrucao(self):
+        url = f'/api/encontros/{self.encontros[2].id}/registrar_presencas/'
+        payload = {'presencas': [
+            {'membro_id': self.membro.id, 'presente': True},
+            {'membro_id': self.outro.id, 'presente': False},
+        ]}
+        self.client.post(url, payload, format='json')
+        abril = date(2024, 4, 1)
+        self.assertEqual(self.resumo(self.membro, abril), (1, 1, 0))
+        self.assertEqual(self.resumo(self.outro, abril), (1, 0, 1))
+
+        incremental = list(FrequenciaMensal.objects.values_list('membro_id', 'mes', 'total_presente', 'total_faltas'))
+        FrequenciaMensal.objects.all().delete()
+        call_command('reconstruir_frequencia_mensal', stdout=io.StringIO())
+        self.assertCountEqual(
+            FrequenciaMensal.objects.values_list('membro_id', 'mes', 'total_presente', 'total_faltas'),
+            incremental
+        )
+
+    def test_relatorio_e_historico(self):
+        Presenca.objects.create(membro=self.membro, encontro=self.encontros[0])
+        Presenca.objects.create(membro=self.membro, encontro=self.encontros[2])
+        params = {'data_inicio': '2024-03-15', 'data_fim': '2024-04-30'}
+        # encontros por mês, resumo, membros
+        response = self.assertConsultasNoMaximo(3, '/api/relatorios/frequencia-mensal/', params)
+        linha = next(r for r in response.data if r['membro_id'] == self.membro.id)
+        self.assertEqual((linha['total_encontros'], linha['total_presente']), (3, 2))
+        self.assertEqual([m['mes'] for m in linha['meses']], ['2024-03', '2024-04'])
+        self.assertEqual(linha['frequencia_percentual'], 66.67)
+
+        response = self.client.get('/api/relatorios/frequencia-mensal/', {'data_inicio': 'x', 'data_fim': '2024-04-30'})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get(f'/api/membros/{self.membro.id}/frequencia/')
+        self.assertEqual([r['mes'] for r in response.data], ['2024-04-01', '2024-03-01'])
+
+
+class ResumoMensalEntregasTests(APITestCase):
+    url = '/api/entregas-cestas/resumo_mensal/'
+
+    def setUp(self):
+        super().setUp()
+        self.familias = [criar_familia(f'Família {i}') for i in range(3)]
+        for familia in self.familias:
+            EntregaCesta.objects.create(familia=familia, data_entrega=date(2024, 3, 2))
+        EntregaCesta.objects.create(familia=self.familias[0], data_entrega=date(2024, 4, 6))
+        EntregaCesta.objects.create(familia=self.familias[1], data_entrega=date(2024, 5, 1))
+
+    def test_agrupa_por_mes_em_uma_consulta(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(r['mes_ano'], r['mes'], r['ano'], r['total']) for r in response.data],
+            [('05/2024', 5, 2024, 1), ('04/2024', 4, 2024, 1), ('03/2024', 3, 2024, 3)]
+        )
+
+        # data_fim inclui o próprio dia e nenhum dia a mais
+        response = self.client.get(self.url, {'data_inicio': '2024-03-03', 'data_fim': '2024-04-30'})
+        self.assertEqual([r['mes_ano'] for r in response.data], ['04/2024'])
+
+        response = self.client.get(self.url, {'data_fim': '30/04/2024'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_etag(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # A versão muda só com o commit: até lá as outras requisições não veem a entrega
+        with self.captureOnCommitCallbacks(execute=True):
+            EntregaCesta.objects.create(familia=self.familias[2], data_entrega=date(2024, 4, 6))
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data[1]['total'], 2)
+
+
+class EntregaMensalUnicaTests(APITestCase):
+    url = '/api/entregas-cestas/'
+
+    def setUp(self):
+        super().setUp()
+        self.familia = criar_familia()
+
+    def test_uma_entrega_por_mes(self):
+        response = self.client.post(self.url, {'familia': self.familia.id, 'data_entrega': '2024-03-02'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['mes_referencia'], '2024-03-01')
+
+        # Sem consulta prévia: a constraint do banco rejeita a segunda entrega do mês
+        with self.assertNumQueries(5):  # família, savepoint, insert, rollback, release
+            response = self.client.post(self.url, {'familia': self.familia.id, 'data_entrega': '2024-03-30'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('data_entrega', response.data)
+
+        response = self.client.post(self.url, {'familia': self.familia.id, 'data_entrega': '2024-04-06'})
+        self.assertEqual(response.status_code, 201)
+
+        # Mudar a data para um mês já atendido também é rejeitado
+        response = self.client.patch(f"{self.url}{response.data['id']}/", {'data_entrega': '2024-03-16'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_create_e_formulario(self):
+        EntregaCesta.objects.bulk_create([
+            EntregaCesta(familia=self.familia, data_entrega=date(2024, 5, 4)),
+            EntregaCesta(familia=criar_familia('Outra'), data_entrega=date(2024, 5, 4)),
+        ])
+        self.assertEqual(set(EntregaCesta.objects.values_list('mes_referencia', flat=True)), {date(2024, 5, 1)})
+
+        with self.assertRaises(ValidationError):
+            EntregaCesta(familia=self.familia, data_entrega=date(2024, 5, 25)).full_clean()
+
+
+class EntregasLoteTests(APITestCase):
+    url = '/api/entregas-cestas/lote/'
+
+    def setUp(self):
+        super().setUp()
+        self.familias = [criar_familia(f'Família {i}') for i in range(4)]
+        EntregaCesta.objects.create(familia=self.familias[0], data_entrega=date(2024, 3, 2))
+
+    def test_resultados_por_familia(self):
+        ids = [f.id for f in self.familias]
+        payload = {'data_entrega': '2024-03-16', 'familias': ids + [ids[1], 999999, 'x']}
+        response = self.client.post(self.url, payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        status = [r['status'] for r in response.data['resultados']]
+        self.assertEqual(status, ['skipped', 'created', 'created', 'created', 'skipped', 'error', 'error'])
+        self.assertEqual(response.data['total_registradas'], 3)
+
+        entrega = EntregaCesta.objects.get(familia=self.familias[1])
+        self.assertEqual(response.data['resultados'][1]['entrega_id'], entrega.id)
+        self.assertEqual(entrega.usuario_registro, self.usuario)
+        self.assertEqual(EntregaCesta.objects.filter(mes_referencia=date(2024, 3, 1)).count(), 4)
+
+    def test_consultas_constantes(self):
+        familias = [criar_familia(f'Extra {i}') for i in range(20)]
+        payload = {'data_entrega': '2024-04-06', 'familias': [f.id for f in familias]}
+        # savepoint, elegibilidade com as famílias travadas, insert, ids, release
+        with self.assertNumQueries(5):
+            response = self.client.post(self.url, payload, format='json')
+        self.assertEqual(response.data['total_registradas'], 20)
+
+    def test_data_invalida(self):
+        response = self.client.post(self.url, {'familias': [self.familias[1].id]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class IdadeMembrosTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.familia = criar_familia()
+
+    def test_idade_exata_no_banco(self):
+        hoje = date(2024, 3, 10)
+        criar_membro(self.familia, 'Fez ontem', date(2014, 3, 9))
+        criar_membro(self.familia, 'Faz hoje', date(2014, 3, 10))
+        criar_membro(self.familia, 'Faz amanhã', date(2014, 3, 11))
+        idades = dict(MembroFamilia.objects.com_idade(hoje).values_list('nome_completo', 'idade'))
+        self.assertEqual(idades, {'Fez ontem': 10, 'Faz hoje': 10, 'Faz amanhã': 9})
+
+        nomes = MembroFamilia.objects.idade_entre(10, 10, hoje=hoje).values_list('nome_completo', flat=True)
+        self.assertCountEqual(nomes, ['Fez ontem', 'Faz hoje'])
+
+    def test_29_de_fevereiro(self):
+        bissexto = criar_membro(self.familia, 'Bissexto', date(2016, 2, 29))
+        hoje = date(2024, 2, 29)
+        # Não quebra com datas que não existem em anos comuns (2023-02-29)
+        self.assertEqual(list(MembroFamilia.objects.idade_entre(1, 7, hoje=hoje)), [])
+        self.assertEqual(list(MembroFamilia.objects.idade_entre(8, 8, hoje=hoje)), [bissexto])
+        # Em ano comum o aniversário só conta a partir de 1º de março
+        self.assertEqual(MembroFamilia.objects.com_idade(date(2023, 2, 28)).get().idade, 6)
+        self.assertEqual(MembroFamilia.objects.idade_entre(7, hoje=date(2023, 2, 28)).count(), 0)
+        self.assertEqual(MembroFamilia.objects.idade_entre(7, hoje=date(2023, 3, 1)).count(), 1)
+
+    def test_api(self):
+        criar_membro(self.familia, 'Bebê', date.today() - timedelta(days=200))
+        criar_membro(self.familia, 'Criança', date.today() - timedelta(days=365 * 7 + 10))
+        criar_membro(self.familia, 'Adolescente', date.today() - timedelta(days=365 * 15 + 10))
+
+        response = self.client.get('/api/membros/', {'ordering': 'idade'})
+        self.assertEqual([m['idade'] for m in response.data['results']], [0, 7, 15])
+
+        response = self.client.get('/api/membros/', {'idade_min': 5, 'idade_max': 10})
+        self.assertEqual([m['nome_completo'] for m in response.data['results']], ['Criança'])
+        self.assertEqual(self.client.get('/api/membros/', {'idade_min': 'x'}).status_code, 400)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/membros/faixas_etarias/', {'faixas': '0,6,12'})
+        self.assertEqual(
+            [(f['faixa'], f['total']) for f in response.data],
+            [('0-5', 1), ('6-11', 1), ('12+', 1)]
+        )
+
+        turma = Turma.objects.create(nome='6 a 8 anos', idade_minima=6, idade_maxima=8)
+        response = self.client.get(f'/api/turmas/{turma.id}/membros/')
+        self.assertEqual([m['nome_completo'] for m in response.data], ['Criança'])
+
+
+class ListasPorTurmaTests(APITestCase):
+    url = '/api/turmas/membros_por_turma/'
+
+    def setUp(self):
+        super().setUp()
+        familia = criar_familia()
+        hoje = date.today()
+        self.turmas = [
+            Turma.objects.create(nome='Pequenos', idade_minima=3, idade_maxima=5),
+            Turma.objects.create(nome='Médios', idade_minima=6, idade_maxima=8),
+            Turma.objects.create(nome='Inativa', idade_minima=0, idade_maxima=17, ativo=False),
+        ]
+        self.pequeno = criar_membro(familia, 'Pequeno', hoje - timedelta(days=365 * 4 + 10))
+        self.medio = criar_membro(familia, 'Médio', hoje - timedelta(days=365 * 7 + 10))
+        criar_membro(familia, 'Bebê', hoje - timedelta(days=100))
+        criar_membro(familia, 'Inativo', hoje - timedelta(days=365 * 7 + 10), ativo=False)
+
+    def listas(self, response):
+        return {t['nome']: [m['nome_completo'] for m in t['membros']] for t in response.data}
+
+    def test_todas_as_turmas(self):
+        # turmas e membros, qualquer que seja o número de turmas
+        response = self.assertConsultasNoMaximo(2, self.url)
+        self.assertEqual(self.listas(response), {'Pequenos': ['Pequeno'], 'Médios': ['Médio']})
+        self.assertEqual(response.data[0]['total_membros'], 1)
+
+    @override_settings(TURMAS_ALOCACAO_PRECALCULADA=True)
+    def test_alocacao_precalculada(self):
+        call_command('atualizar_alocacao_turmas', stdout=io.StringIO())
+        self.assertEqual(AlocacaoTurma.objects.count(), 2)
+
+        # Membro alterado é realocado na hora
+        self.medio.data_nascimento = self.pequeno.data_nascimento
+        self.medio.save()
+        response = self.assertConsultasNoMaximo(2, self.url)
+        self.assertEqual(self.listas(response), {'Pequenos': ['Médio', 'Pequeno'], 'Médios': []})
+
+        # Nova turma sobreposta
+        Turma.objects.create(nome='Todos', idade_minima=0, idade_maxima=17)
+        response = self.client.get(self.url)
+        self.assertEqual(self.listas(response)['Todos'], ['Bebê', 'Médio', 'Pequeno'])
+
+
+class CamposEsparsosTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.familia = criar_familia(observacoes='Texto longo', programas_sociais='Bolsa Família')
+        self.membro = criar_membro(self.familia, 'Ana', date(2015, 5, 10))
+
+    def test_fields_restringe_resposta_e_colunas(self):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get('/api/familias/', {'fields': 'id,nome'})
+        self.assertEqual(response.data['results'], [{'id': self.familia.id, 'nome': 'Família Teste'}])
+        sql = consultas.captured_queries[-1]['sql']
+        self.assertNotIn('observacoes', sql)
+        # Sem o endereço e os programas, não há JOIN nem prefetch
+        self.assertNotIn('atendimento_endereco', sql)
+        self.assertFalse(any('programasocial' in q['sql'] for q in consultas.captured_queries))
+
+    def test_omit_e_campos_derivados(self):
+        response = self.client.get(f'/api/familias/{self.familia.id}/', {'omit': 'observacoes,programas_sociais'})
+        self.assertNotIn('observacoes', response.data)
+        self.assertEqual(response.data['endereco']['cidade'], 'São Paulo')
+        self.assertEqual(response.data['programas'], ['Bolsa Família'])
+
+        response = self.client.get('/api/membros/', {'fields': 'id,idade'})
+        self.assertEqual(response.data['results'], [{'id': self.membro.id, 'idade': self.membro.idade}])
+
+    def test_paginacao_por_cursor_sem_consultas_extras(self):
+        encontro = Encontro.objects.create(data=date(2024, 3, 2))
+        Presenca.objects.create(membro=self.membro, encontro=encontro)
+        response = self.assertConsultasNoMaximo(
+            1, '/api/presencas/', {'paginacao': 'cursor', 'fields': 'id,presente'}
+        )
+        self.assertEqual(list(response.data['results'][0]), ['id', 'presente'])
+
+    def test_escrita_ignora_fields(self):
+        response = self.client.post('/api/turmas/?fields=id', {'nome': 'Nova', 'idade_minima': 3, 'idade_maxima': 5})
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('nome', response.data)
+
+
+class AutocompleteTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.familia = criar_familia('Família Conceição')
+            self.joao = criar_membro(self.familia, 'João Conceição Silva')
+            self.jose = criar_membro(self.familia, 'José Araújo')
+            criar_membro(self.familia, 'Joana Inativa', ativo=False)
+
+    def test_prefixo_sem_acentos_em_qualquer_palavra(self):
+        response = self.client.get('/api/membros/autocomplete/', {'q': 'jo'})
+        self.assertEqual(response.json(), [[self.joao.id, 'João Conceição Silva'], [self.jose.id, 'José Araújo']])
+
+        response = self.client.get('/api/membros/autocomplete/', {'q': 'CONCEICAO s'})
+        self.assertEqual(response.json(), [[self.joao.id, 'João Conceição Silva']])
+
+        response = self.client.get('/api/familias/autocomplete/', {'q': 'concei'})
+        self.assertEqual(response.json(), [[self.familia.id, 'Família Conceição']])
+
+    def test_busca_aquecida_nao_consulta_o_banco(self):
+        self.client.get('/api/membros/autocomplete/', {'q': 'jo'})
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/membros/autocomplete/', {'q': 'ara', 'limite': 1})
+        self.assertEqual(response.json(), [[self.jose.id, 'José Araújo']])
+
+    def test_indice_acompanha_alteracoes(self):
+        self.client.get('/api/membros/autocomplete/', {'q': 'jo'})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.jose.nome_completo = 'Pedro Araújo'
+            self.jose.save()
+            criar_membro(self.familia, 'Josefa Lima')
+
+        response = self.client.get('/api/membros/autocomplete/', {'q': 'jo'})
+        self.assertEqual([nome for _, nome in response.json()], ['João Conceição Silva', 'Josefa Lima'])
+
+    def test_indice_expira_sem_invalidacao(self):
+        # Alteração feita em outra instância, sem o sinal chegar ao cache deste processo
+        self.client.get('/api/membros/autocomplete/', {'q': 'jo'})
+        MembroFamilia.objects.filter(pk=self.jose.pk).update(nome_completo='Pedro Araújo')
+        self.assertEqual(len(self.client.get('/api/membros/autocomplete/', {'q': 'jo'}).json()), 2)
+
+        with mock.patch('atendimento.autocomplete.RECONSTRUIR_APOS', -1), \
+                mock.patch('atendimento.autocomplete.VERIFICAR_A_CADA', -1):
+            response = self.client.get('/api/membros/autocomplete/', {'q': 'jo'})
+        self.assertEqual(response.json(), [[self.joao.id, 'João Conceição Silva']])
+
+    def test_familias_sem_nome(self):
+        criar_familia(None)
+        criar_familia('  ')
+        response = self.client.get('/api/familias/autocomplete/', {'q': 'concei'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [[self.familia.id, 'Família Conceição']])
+
+
+def imagem_teste(largura=1200, altura=900, formato='JPEG'):
+    saida = io.BytesIO()
+    Image.new('RGB', (largura, altura), (200, 80, 40)).save(saida, formato)
+    return saida.getvalue()
+
+
+@override_settings(MINIATURAS_ASSINCRONAS=False)
+class MiniaturasFotoTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        media = override_settings(MEDIA_ROOT=self.media.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.familia = criar_familia()
+
+    def test_upload_gera_miniaturas(self):
+        foto = SimpleUploadedFile('foto.jpg', imagem_teste(), content_type='image/jpeg')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/membros/', {
+                'nome_completo': 'Ana', 'data_nascimento': '2015-05-10', 'sexo': 'F',
+                'familia': self.familia.id, 'foto': foto,
+            }, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        membro = MembroFamilia.objects.get()
+        self.assertNotIn('/None/', membro.foto.name)
+
+        response = self.client.get(f'/api/membros/{membro.id}/')
+        self.assertNotIn('foto_miniaturas', response.data)
+        self.assertEqual(set(response.data['foto_thumb']), {'96', '320'})
+        self.assertTrue(response.data['foto_thumb']['96']['webp'].endswith('-96.webp'))
+        with Image.open(membro.foto.storage.path(membro.foto_miniaturas['320']['jpeg'])) as miniatura:
+            self.assertEqual(miniatura.size, (320, 320))
+
+        # Sem foto, as miniaturas antigas são apagadas
+        antigas = miniaturas.nomes_gerados(membro.foto_miniaturas)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/membros/{membro.id}/', {'foto': ''}, format='multipart')
+        self.assertIsNone(self.client.get(f'/api/membros/{membro.id}/').data['foto_thumb'])
+        self.assertFalse(any(membro.foto.storage.exists(nome) for nome in antigas))
+
+    def test_segundo_plano_libera_conexao_durante_renderizacao(self):
+        membro = criar_membro(self.familia, 'Bia')
+        MembroFamilia.objects.filter(pk=membro.pk).update(foto='membros_fotos/bia.jpg')
+        default_storage.save('membros_fotos/bia.jpg', ContentFile(imagem_teste()))
+        eventos = []
+        with mock.patch.object(miniaturas, 'connection') as conexao, \
+                mock.patch.object(miniaturas, 'close_old_connections'), \
+                mock.patch.object(miniaturas, 'renderizar', side_effect=lambda arquivo: eventos.append('renderizar') or {}):
+            conexao.in_atomic_block = False
+            conexao.close.side_effect = lambda: eventos.append('close')
+            miniaturas._gerar_em_segundo_plano(membro.id)
+        # A conexão volta ao pool antes da decodificação, que não precisa do banco
+        self.assertEqual(eventos[:2], ['close', 'renderizar'])
+
+    def test_comando_move_fotos_sem_id_e_gera_miniaturas(self):
+        membro = criar_membro(self.familia, 'Bruno')
+        antigo = default_storage.save('membros_fotos/None/bruno.png', ContentFile(imagem_teste(formato='PNG')))
+        MembroFamilia.objects.filter(pk=membro.pk).update(foto=antigo)
+
+        call_command('gerar_miniaturas_fotos', stdout=io.StringIO())
+
+        membro.refresh_from_db()
+        self.assertNotIn('/None/', membro.foto.name)
+        self.assertFalse(default_storage.exists(antigo))
+        self.assertTrue(miniaturas.atualizadas(membro))
+
+
+class ClaimsJWTAuthenticationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        usuarios.limpar()
+        self.client = APIClient()
+        response = self.client.post('/api/token/', {'email': 'atendente@example.com', 'password': 'senha-forte-123'})
+        self.tokens = response.data
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.tokens['access']}")
+
+    def consultas_ao_usuario(self, metodo, url, dados=None):
+        with CaptureQueriesContext(connection) as consultas:
+            response = getattr(self.client, metodo)(url, dados)
+        self.assertLess(response.status_code, 300, response.data)
+        return sum('atendimento_usuario' in q['sql'] for q in consultas.captured_queries), response
+
+    def test_leitura_usa_apenas_os_claims(self):
+        consultas, _ = self.consultas_ao_usuario('get', '/api/turmas/')
+        self.assertEqual(consultas, 0)
+
+    def test_perfil_vem_do_banco(self):
+        User.objects.filter(pk=self.usuario.pk).update(first_name='Ana', tipo='admin')
+        consultas, response = self.consultas_ao_usuario('get', '/api/auth/me/')
+        self.assertEqual(consultas, 1)
+        self.assertEqual((response.data['first_name'], response.data['tipo']), ('Ana', 'admin'))
+
+    def test_escrita_usa_usuario_em_cache(self):
+        dados = {'nome': 'Turma', 'idade_minima': 3, 'idade_maxima': 5}
+        self.assertEqual(self.consultas_ao_usuario('post', '/api/turmas/', dados)[0], 1)
+        self.assertEqual(self.consultas_ao_usuario('post', '/api/turmas/', dados)[0], 0)
+
+    def test_token_sem_claims_consulta_o_banco(self):
+        token = RefreshToken.for_user(self.usuario).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(self.consultas_ao_usuario('get', '/api/turmas/')[0], 1)
+
+    def test_usuario_desativado(self):
+        self.usuario.is_active = False
+        self.usuario.save()
+        response = self.client.post('/api/turmas/', {'nome': 'Turma', 'idade_minima': 3, 'idade_maxima': 5})
+        self.assertEqual(response.status_code, 401)
+        response = self.client.post('/api/token/refresh/', {'refresh': self.tokens['refresh']})
+        self.assertEqual(response.status_code, 401)
+
+    def test_usuario_desativado_em_outro_worker(self):
+        dados = {'nome': 'Turma', 'idade_minima': 3, 'idade_maxima': 5}
+        self.assertEqual(self.client.post('/api/turmas/', dados).status_code, 201)
+        copias = dict(usuarios.usuarios)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.is_active = False
+            self.usuario.save()
+        # O processo que não atendeu a alteração ainda tem a cópia antiga
+        usuarios.usuarios.update(copias)
+        self.assertEqual(self.client.post('/api/turmas/', dados).status_code, 401)
+
+
+class ThrottlingTests(APITestCase):
+    def test_janela_deslizante(self):
+        contador = throttling.contador()
+        self.assertEqual([contador.registrar('throttle_teste', 2, 60)[0] for _ in range(3)], [True, True, False])
+        self.assertGreater(contador.registrar('throttle_teste', 2, 60)[1], 0)
+        # Metade da janela anterior ainda conta: 4 * 0.5 + 1 + 1 > 3
+        self.assertEqual(throttling.espera(4, 1, 0.5, 3, 60), 15)
+
+    # THROTTLE_RATES é lido de DEFAULT_THROTTLE_RATES na importação do DRF
+    @mock.patch.dict(SimpleRateThrottle.THROTTLE_RATES, {'user': '3/min', 'relatorios': '2/min', 'chamada': '3/min'})
+    def test_escopos_tem_limites_separados(self):
+        relatorio = '/api/relatorios/grade-roupas/'
+        self.assertEqual([self.client.get(relatorio).status_code for _ in range(3)], [200, 200, 429])
+        self.assertIn('Retry-After', self.client.get(relatorio))
+        # Relatórios esgotados não afetam a chamada nem as demais leituras
+        self.assertEqual(self.client.get('/api/presencas/').status_code, 200)
+        self.assertEqual([self.client.get('/api/turmas/').status_code for _ in range(4)], [200, 200, 200, 429])
+
+    @mock.patch.dict(SimpleRateThrottle.THROTTLE_RATES, {'anon': '1/min', 'autenticacao': '2/min'})
+    def test_autenticacao_tem_limite_proprio(self):
+        self.client.force_authenticate(None)
+        credenciais = {'email': 'atendente@example.com', 'password': 'errada'}
+        self.assertEqual(
+            [self.client.post('/api/token/', credenciais).status_code for _ in range(3)], [401, 401, 429]
+        )
+
+    def test_arquivo_travado_libera_requisicao(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        caminho = os.path.join(pasta.name, 'throttle.sqlite3')
+        contador = throttling.ContadorSQLite(caminho)
+        contador.conexao().execute('PRAGMA busy_timeout = 0')
+        outra = sqlite3.connect(caminho, isolation_level=None)
+        outra.execute('BEGIN IMMEDIATE')
+        try:
+            with self.assertLogs('atendimento.throttling', 'WARNING'):
+                self.assertEqual(contador.registrar('throttle_teste', 1, 60), (True, 0))
+        finally:
+            outra.execute('ROLLBACK')
+            outra.close()
+        self.assertFalse(contador.conexao().in_transaction)
+        self.assertEqual([contador.registrar('throttle_teste', 1, 60)[0] for _ in range(2)], [True, False])
+
+
+# Rotas como no perfil ASGI (SERVIDOR=asgi); as de core.urls seguem o perfil dos testes (WSGI)
+urlpatterns = [
+    path('api/relatorios/grade-roupas/', RelatoriosViewSet.as_view({'get': 'grade_roupas'}, assincrona=True)),
+    path(
+        'api/encontros/<pk>/registrar_presencas/',
+        EncontroViewSet.as_view({'post': 'registrar_presencas'}, assincrona=True)
+    ),
+]
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class ASGITests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.async_client.force_login(self.usuario)
+        self.familia = criar_familia()
+        self.ana = criar_membro(self.familia, 'Ana', tamanho_camiseta='P')
+        self.encontro = Encontro.objects.create(data=date(2024, 3, 2))
+
+    async def test_relatorio_em_streaming(self):
+        response = await self.async_client.get('/api/relatorios/grade-roupas/', {'format': 'ndjson'})
+        self.assertEqual(response.status_code, 200)
+        # Iterador assíncrono: as linhas saem em lotes, sem carregar o relatório inteiro
+        self.assertTrue(response.is_async)
+        linhas = [json.loads(linha) async for linha in response.streaming_content]
+        self.assertEqual(linhas, [{'categoria': 'camisetas', 'tamanho': 'P', 'total': 1}])
+
+    async def test_registrar_presencas(self):
+        response = await self.async_client.post(
+            f'/api/encontros/{self.encontro.id}/registrar_presencas/',
+            {'presencas': [{'membro_id': self.ana.id, 'presente': True}, {'membro_id': 0}]},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['status'] for r in response.json()['resultados']], ['created', 'error'])
+        self.assertEqual(await Presenca.objects.filter(presente=True).acount(), 1)
+        # As consultas feitas fora do event loop entram nas métricas
+        self.assertRegex(response['Server-Timing'], r'desc="([1-9]\d*) queries"')
+
+    async def test_erros_passam_pelo_tratamento_do_drf(self):
+        response = await self.async_client.post(
+            '/api/encontros/0/registrar_presencas/', {'presencas': []}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 404)
+        response = await AsyncClient().get('/api/relatorios/grade-roupas/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_rotas_assincronas_so_no_perfil_asgi(self):
+        self.assertTrue(iscoroutinefunction(resolve('/api/relatorios/grade-roupas/').func))
+        with override_settings(ROOT_URLCONF='core.urls'):
+            # Perfil WSGI: view síncrona do DRF, sem async_to_sync em volta da requisição inteira
+            self.assertFalse(iscoroutinefunction(resolve('/api/relatorios/grade-roupas/').func))
+            response = self.client.get('/api/relatorios/grade-roupas/')
+        self.assertEqual(response.status_code, 200)
+        with override_settings(PERFIL_SERVIDOR=dict(settings.PERFIL_SERVIDOR, asgi=True)):
+            self.assertTrue(iscoroutinefunction(RelatoriosViewSet.as_view({'get': 'grade_roupas'})))
+            self.assertFalse(iscoroutinefunction(RelatoriosViewSet.as_view({'get': 'list'})))
+
+
+class PerfilServidorTests(TestCase):
+    def cgroup(self, arquivos):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        raiz = pasta.name
+        for caminho, conteudo in arquivos.items():
+            os.makedirs(os.path.dirname(os.path.join(raiz, caminho)), exist_ok=True)
+            with open(os.path.join(raiz, caminho), 'w') as arquivo:
+                arquivo.write(conteudo)
+        return raiz
+
+    @mock.patch('os.sched_getaffinity', return_value=set(range(16)))
+    def test_limites_cgroup_v2(self, _):
+        # 2 CPUs permitiriam 5 workers, mas 1 GB só comporta 4 de 200 MB
+        raiz = self.cgroup({'cpu.max': '200000 100000', 'memory.max': str(1024 ** 3)})
+        perfil = servidor.perfil({}, raiz)
+        self.assertEqual((perfil['cpus'], perfil['memoria_mb']), (2, 1024))
+        self.assertEqual((perfil['workers'], perfil['threads'], perfil['worker_class']), (4, 3, 'gthread'))
+
+        sem_limite = servidor.perfil({}, self.cgroup({'cpu.max': 'max 100000', 'memory.max': 'max'}))
+        self.assertEqual((sem_limite['cpus'], sem_limite['workers']), (16, 33))
+
+    @mock.patch('os.sched_getaffinity', return_value=set(range(16)))
+    def test_limites_cgroup_v1(self, _):
+        raiz = self.cgroup({
+            'cpu/cpu.cfs_quota_us': '50000',
+            'cpu/cpu.cfs_period_us': '100000',
+            'memory/memory.limit_in_bytes': str(512 * 1024 ** 2),
+        })
+        perfil = servidor.perfil({}, raiz)
+        # Meia CPU conta como uma: 3 workers, e 512 MB comportam 2
+        self.assertEqual((perfil['cpus'], perfil['workers']), (1, 2))
+
+    def test_variaveis_de_ambiente(self):
+        raiz = self.cgroup({'cpu.max': '100000 100000', 'memory.max': str(256 * 1024 ** 2)})
+        self.assertEqual(servidor.perfil({}, raiz)['workers'], 1)
+        perfil = servidor.perfil({'WEB_CONCURRENCY': '6', 'GUNICORN_THREADS': '8'}, raiz)
+        self.assertEqual((perfil['workers'], perfil['threads']), (6, 8))
+
+        asgi = servidor.perfil({'SERVIDOR': 'asgi'}, raiz)
+        self.assertEqual((asgi['threads'], asgi['worker_class']), (1, 'uvicorn.workers.UvicornWorker'))
+
+    def test_pool_de_conexoes_por_worker(self):
+        raiz = self.cgroup({'cpu.max': '100000 100000', 'memory.max': 'max'})
+        self.assertEqual(servidor.perfil({'GUNICORN_THREADS': '4'}, raiz)['conexoes_banco'], 4)
+        # 3 workers dividem as 20 conexões do Postgres
+        perfil = servidor.perfil({'GUNICORN_THREADS': '8', 'DB_CONEXOES_MAXIMAS': '20'}, raiz)
+        self.assertEqual((perfil['workers'], perfil['conexoes_banco']), (3, 6))
+
+
+def conexao_falsa():
+    conexao = mock.Mock(closed=False, autocommit=True)
+    conexao.info.transaction_status = 0
+    return conexao
+
+
+class PoolConexoesTests(TestCase):
+    def test_reutiliza_e_limita_conexoes(self):
+        pool = pools.Pool('teste', 1, espera=0.05)
+        conectar = mock.Mock(side_effect=conexao_falsa)
+        conexao = pool.obter(conectar)
+        with self.assertRaises(pools.PoolEsgotado):
+            pool.obter(conectar)
+        pool.devolver(conexao)
+        self.assertIs(pool.obter(conectar), conexao)
+        conectar.assert_called_once()
+
+        estatisticas = pool.estatisticas()
+        self.assertEqual((estatisticas['abertas'], estatisticas['em_uso'], estatisticas['esgotado']), (1, 1, 1))
+
+    def test_espera_conexao_devolvida(self):
+        pool = pools.Pool('teste', 1, espera=5)
+        conexao = pool.obter(conexao_falsa)
+        devolucao = threading.Timer(0.05, pool.devolver, [conexao])
+        devolucao.start()
+        self.assertIs(pool.obter(conexao_falsa), conexao)
+        devolucao.join()
+        self.assertEqual(pool.estatisticas()['esperas'], 1)
+
+    def test_descarta_conexoes_quebradas_ou_velhas(self):
+        pool = pools.Pool('teste', 2, vida_maxima=600, verificar=lambda conexao: False)
+        quebrada = pool.obter(conexao_falsa)
+        pool.devolver(quebrada, descartar=True)
+        quebrada.close.assert_called_once()
+
+        # Ociosa há mais de VERIFICAR_APOS segundos e reprovada na verificação: abre outra
+        ociosa = pool.obter(conexao_falsa)
+        pool.devolver(ociosa)
+        with mock.patch.object(pools, 'VERIFICAR_APOS', -1):
+            self.assertIsNot(pool.obter(conexao_falsa), ociosa)
+        ociosa.close.assert_called_once()
+        self.assertEqual(pool.estatisticas()['descartadas'], 2)
+
+    def test_backend_devolve_conexao_no_fim_da_requisicao(self):
+        from core.banco import base as backend
+        self.addCleanup(pools.encerrar, lambda pool: pool.nome == 'teste_pool')
+        conexao = conexao_falsa()
+        configuracao = {**connection.settings_dict, 'ENGINE': 'core.banco', 'POOL': {'TAMANHO': 2}}
+
+        with mock.patch.object(backend.base.DatabaseWrapper, 'get_new_connection', return_value=conexao) as conectar:
+            # Duas threads, uma depois da outra, usam a mesma conexão do Postgres
+            for _ in range(2):
+                wrapper = backend.DatabaseWrapper(configuracao, alias='teste_pool')
+                wrapper.connection = wrapper.get_new_connection({'dbname': 'social'})
+                self.assertIs(wrapper.connection, conexao)
+                wrapper._close()
+            conectar.assert_called_once()
+
+            # Depois de um erro de banco a conexão é fechada, não devolvida
+            wrapper = backend.DatabaseWrapper(configuracao, alias='teste_pool')
+            wrapper.connection = wrapper.get_new_connection({'dbname': 'social'})
+            wrapper.errors_occurred = True
+            wrapper._close()
+        conexao.close.assert_called_once()
+        self.assertEqual(banco.estatisticas()['teste_pool']['abertas'], 0)
+
+    def test_configuracao_por_modo(self):
+        postgres = {'ENGINE': 'django.db.backends.postgresql', 'NAME': 'social', 'CONN_MAX_AGE': 600}
+        perfil = {'asgi': False, 'conexoes_banco': 3}
+
+        interno = banco.configurar(postgres, 'interno', perfil, espera=5)
+        self.assertEqual((interno['ENGINE'], interno['CONN_MAX_AGE']), ('core.banco', 0))
+        self.assertEqual(interno['POOL'], {'TAMANHO': 3, 'ESPERA': 5, 'VIDA_MAXIMA': 600})
+
+        pgbouncer = banco.configurar(postgres, 'pgbouncer', perfil)
+        self.assertEqual(pgbouncer['ENGINE'], 'django.db.backends.postgresql')
+        self.assertTrue(pgbouncer['DISABLE_SERVER_SIDE_CURSORS'])
+        self.assertEqual(banco.configurar(postgres, 'desativado', {**perfil, 'asgi': True})['CONN_MAX_AGE'], 0)
+
+        sqlite = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': 'db.sqlite3'}
+        self.assertEqual(banco.configurar(sqlite, 'interno', perfil), sqlite)
+        with self.assertRaises(ImproperlyConfigured):
+            banco.configurar(postgres, 'pgpool', perfil)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'o pool só é usado com PostgreSQL')
+class PoolPostgresTests(TestCase):
+    # Conexões reais do pool, fora da transação do TestCase (alias próprio)
+    def setUp(self):
+        self.addCleanup(pools.encerrar, lambda pool: pool.nome == 'teste_pg')
+        self.addCleanup(delattr, connections._connections, 'teste_pg')
+
+    def conectar(self):
+        from core.banco import base as backend
+        configuracao = {**connection.settings_dict, 'ENGINE': 'core.banco', 'CONN_MAX_AGE': 0, 'POOL': {'TAMANHO': 2}}
+        wrapper = backend.DatabaseWrapper(configuracao, alias='teste_pg')
+        # Registrada para transaction.atomic(using='teste_pg')
+        connections['teste_pg'] = wrapper
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def consultar(self, wrapper, sql):
+        with wrapper.cursor() as cursor:
+            cursor.execute(sql)
+            return cursor.fetchone()[0]
+
+    def test_reutiliza_conexao_do_servidor(self):
+        primeira = self.conectar()
+        pid = self.consultar(primeira, 'SELECT pg_backend_pid()')
+        primeira.close()
+        segunda = self.conectar()
+        self.assertEqual(self.consultar(segunda, 'SELECT pg_backend_pid()'), pid)
+        segunda.close()
+        self.assertEqual(banco.estatisticas()['teste_pg']['criadas'], 1)
+
+    def test_fechar_dentro_de_atomic_descarta_conexao(self):
+        wrapper = self.conectar()
+        # Dentro de um atomic() o Django continua usando a conexão até o fim do bloco
+        with self.assertRaises(InterfaceError):
+            with transaction.atomic(using='teste_pg'):
+                pid = self.consultar(wrapper, 'SELECT pg_backend_pid()')
+                wrapper.close()
+                self.consultar(wrapper, 'SELECT 1')
+        outra = self.conectar()
+        self.assertNotEqual(self.consultar(outra, 'SELECT pg_backend_pid()'), pid)
+        self.assertEqual(banco.estatisticas()['teste_pg']['descartadas'], 1)
+
+    def test_cursor_with_hold_nao_volta_ao_pool(self):
+        # .iterator() fora de transação usa um cursor do servidor WITH HOLD
+        wrapper = self.conectar()
+        cursor = wrapper.chunked_cursor()
+        cursor.execute('SELECT generate_series(1, 100)')
+        cursor.fetchmany(10)
+        wrapper.close()
+        outra = self.conectar()
+        self.assertEqual(self.consultar(outra, 'SELECT count(*) FROM pg_cursors'), 0)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class SaudeTests(TestCase):
+    def test_status_do_banco(self):
+        resposta = self.client.get('/api/_saude')
+        self.assertEqual(resposta.status_code, 200)
+        # Sem token, nada além do status
+        self.assertEqual(resposta.json(), {'status': 'ok', 'banco': {'disponivel': True}})
+
+        with mock.patch('django.db.backends.utils.CursorWrapper.execute', side_effect=DatabaseError):
+            self.assertEqual(self.client.get('/api/_saude').status_code, 503)
+
+    @override_settings(METRICS_TOKEN='segredo')
+    def test_detalhes_exigem_token(self):
+        self.assertNotIn('pools', self.client.get('/api/_saude', HTTP_AUTHORIZATION='Bearer outro').json())
+        dados = self.client.get('/api/_saude', HTTP_AUTHORIZATION='Bearer segredo').json()
+        self.assertIn('pools', dados)
+        self.assertIn('conexoes_banco', dados['perfil'])
@@ -0,0 +1,209 @@
+"""
+Throttling com contadores compartilhados entre os processos.
+
+Os throttles do DRF guardam o histórico no cache padrão, que sem REDIS_URL é
+um LocMemCache por processo: com vários workers do gunicorn o limite efetivo
+se multiplica. Aqui cada limite é uma janela deslizante aproximada (contador
+da janela atual + contador da anterior, ponderado pelo tempo que falta),
+atualizada atomicamente no Redis por um script Lua ou, sem Redis, num arquivo
+SQLite local compartilhado pelos processos da máquina.
+
+Views com throttle_scope (relatórios, chamada, autenticação) contam apenas no
+próprio escopo, para que o abuso de um tipo de requisição não esgote o limite
+do outro.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from rest_framework import throttling
+
+logger = logging.getLogger(__name__)
+
+SCRIPT_REDIS = """
+local anterior = tonumber(redis.call('GET', KEYS[1]) or '0')
+local corrente = tonumber(redis.call('GET', KEYS[2]) or '0')
+if anterior * tonumber(ARGV[1]) + corrente + 1 > tonumber(ARGV[2]) then
+    return {0, anterior, corrente}
+end
+corrente = redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return {1, anterior, corrente}
+"""
+
+
+def janela(agora, duracao):
+    """
+    Índice da janela atual e fração dela já decorrida.
+    """
+    indice = int(agora // duracao)
+    return indice, (agora - indice * duracao) / duracao
+
+
+def espera(anterior, corrente, decorrido, limite, duracao):
+    """
+    Segundos até a estimativa da janela deslizante abrir espaço para mais uma requisição.
+    """
+    if corrente + 1 > limite or not anterior:
+        return (1 - decorrido) * duracao
+    # anterior * (1 - d) + corrente + 1 <= limite
+    return max(0.0, 1 - (limite - corrente - 1) / anterior - decorrido) * duracao
+
+
+class ContadorRedis:
+    def __init__(self, url):
+        import redis
+        self.cliente = redis.Redis.from_url(url)
+        self.script = self.cliente.register_script(SCRIPT_REDIS)
+
+    def registrar(self, chave, limite, duracao):
+        indice, decorrido = janela(time.time(), duracao)
+        permitido, anterior, corrente = self.script(
+            keys=[f'{chave}:{indice - 1}', f'{chave}:{indice}'],
+            args=[1 - decorrido, limite, duracao * 2],
+        )
+        if permitido:
+            return True, 0
+        return False, espera(anterior, corrente, decorrido, limite, duracao)
+
+    def limpar(self):
+        for chave in self.cliente.scan_iter('throttle_*'):
+            self.cliente.delete(chave)
+
+
+class ContadorSQLite:
+    """
+    Mesma janela deslizante num arquivo SQLite (desenvolvimento, testes e servidor único).
+    """
+    # Intervalo (s) entre as remoções de contadores expirados, por processo
+    LIMPAR_A_CADA = 60
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.local = threading.local()
+        self.limpo_em = 0
+
+    def conexao(self):
+        conexao = getattr(self.local, 'conexao', None)
+        if conexao is None:
+            conexao = sqlite3.connect(self.caminho, timeout=5, isolation_level=None)
+            conexao.execute('PRAGMA journal_mode=WAL')
+            # Com WAL, perder os últimos incrementos numa queda do servidor é aceitável
+            conexao.execute('PRAGMA synchronous=NORMAL')
+            conexao.execute(
+                'CREATE TABLE IF NOT EXISTS contadores ('
+                'chave TEXT NOT NULL, janela INTEGER NOT NULL, total INTEGER NOT NULL, expira REAL NOT NULL, '
+                'PRIMARY KEY (chave, janela))'
+            )
+            conexao.execute('CREATE INDEX IF NOT EXISTS contadores_expira ON contadores (expira)')
+            self.local.conexao = conexao
+        return conexao
+
+    def registrar(self, chave, limite, duracao):
+        agora = time.time()
+        indice, decorrido = janela(agora, duracao)
+        conexao = self.conexao()
+        try:
+            # BEGIN IMMEDIATE: leitura e incremento sob a trava de escrita do arquivo
+            conexao.execute('BEGIN IMMEDIATE')
+            if agora - self.limpo_em > self.LIMPAR_A_CADA:
+                self.limpo_em = agora
+                conexao.execute('DELETE FROM contadores WHERE expira < ?', (agora,))
+            totais = dict(conexao.execute(
+                'SELECT janela, total FROM contadores WHERE chave = ? AND janela IN (?, ?)',
+                (chave, indice - 1, indice)
+            ))
+            anterior, corrente = totais.get(indice - 1, 0), totais.get(indice, 0)
+            permitido = anterior * (1 - decorrido) + corrente + 1 <= limite
+            if permitido:
+                conexao.execute(
+                    'INSERT INTO contadores (chave, janela, total, expira) VALUES (?, ?, 1, ?) '
+                    'ON CONFLICT (chave, janela) DO UPDATE SET total = total + 1',
+                    (chave, indice, (indice + 2) * duracao)
+                )
+            conexao.execute('COMMIT')
+        except sqlite3.OperationalError:
+            # Arquivo travado além do timeout: melhor deixar passar que responder 500
+            if conexao.in_transaction:
+                conexao.execute('ROLLBACK')
+            logger.warning('Contador de throttling indisponível, requisição liberada', exc_info=True)
+            return True, 0
+        except BaseException:
+            if conexao.in_transaction:
+                conexao.execute('ROLLBACK')
+            raise
+        if permitido:
+            return True, 0
+        return False, espera(anterior, corrente, decorrido, limite, duracao)
+
+    def limpar(self):
+        self.conexao().execute('DELETE FROM contadores')
+
+
+_contadores = {}
+_contadores_lock = threading.Lock()
+
+
+def contador():
+    """
+    Contador configurado: Redis com THROTTLE_REDIS_URL, senão o arquivo THROTTLE_SQLITE_PATH.
+    """
+    configuracao = (settings.THROTTLE_REDIS_URL, settings.THROTTLE_SQLITE_PATH)
+    with _contadores_lock:
+        if configuracao not in _contadores:
+            if settings.THROTTLE_REDIS_URL:
+                _contadores[configuracao] = ContadorRedis(settings.THROTTLE_REDIS_URL)
+            else:
+                os.makedirs(os.path.dirname(settings.THROTTLE_SQLITE_PATH), exist_ok=True)
+                _contadores[configuracao] = ContadorSQLite(settings.THROTTLE_SQLITE_PATH)
+        return _contadores[configuracao]
+
+
+class JanelaDeslizanteMixin:
+    """
+    Troca o histórico em cache do SimpleRateThrottle pelo contador compartilhado.
+    """
+    espera = None
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        permitido, self.espera = contador().registrar(self.key, self.num_requests, self.duration)
+        return permitido
+
+    def wait(self):
+        return self.espera
+
+
+class AnonThrottle(JanelaDeslizanteMixin, throttling.AnonRateThrottle):
+    def get_cache_key(self, request, view):
+        # Login e renovação do token contam só no escopo 'autenticacao'
+        if getattr(view, 'throttle_scope', None):
+            return None
+        return super().get_cache_key(request, view)
+
+
+class UsuarioThrottle(JanelaDeslizanteMixin, throttling.UserRateThrottle):
+    def get_cache_key(self, request, view):
+        # Views com escopo próprio contam só no EscopoThrottle
+        if getattr(view, 'throttle_scope', None):
+            return None
+        return super().get_cache_key(request, view)
+
+
+class EscopoThrottle(JanelaDeslizanteMixin, throttling.ScopedRateThrottle):
+    def allow_request(self, request, view):
+        # Como em ScopedRateThrottle: o limite depende do throttle_scope da view
+        self.scope = getattr(view, self.scope_attr, None)
+        if not self.scope:
+            return True
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
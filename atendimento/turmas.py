@@ -0,0 +1,81 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Turma, MembroFamilia, AlocacaoTurma
+
+# Tamanho dos lotes lidos e gravados no banco
+BATCH_SIZE = 2000
+
+
+def turmas_da_idade(idade, turmas):
+    return [turma for turma in turmas if turma.idade_minima <= idade <= turma.idade_maxima]
+
+
+def membros_elegiveis(turmas, hoje):
+    # Membros ativos dentro da faixa coberta pelas turmas, com a idade calculada pelo banco
+    return MembroFamilia.objects.filter(ativo=True).idade_entre(
+        min(turma.idade_minima for turma in turmas),
+        max(turma.idade_maxima for turma in turmas),
+        hoje=hoje
+    ).com_idade(hoje)
+
+
+def alocar(membro_ids=None, hoje=None):
+    """
+    Refaz a tabela AlocacaoTurma dos membros indicados (None = todos).
+
+    Custa duas leituras (turmas e membros) e as gravações em lote,
+    independente da quantidade de turmas.
+    """
+    hoje = hoje or timezone.localdate()
+    turmas = list(Turma.objects.filter(ativo=True))
+
+    novas = []
+    if turmas:
+        membros = membros_elegiveis(turmas, hoje)
+        if membro_ids is not None:
+            membros = membros.filter(id__in=membro_ids)
+        for membro in membros.only('id', 'data_nascimento').iterator(chunk_size=BATCH_SIZE):
+            novas.extend(
+                AlocacaoTurma(turma=turma, membro_id=membro.id, data_referencia=hoje)
+                for turma in turmas_da_idade(membro.idade, turmas)
+            )
+
+    with transaction.atomic():
+        atuais = AlocacaoTurma.objects.all()
+        if membro_ids is not None:
+            atuais = atuais.filter(membro_id__in=membro_ids)
+        atuais.delete()
+        AlocacaoTurma.objects.bulk_create(novas, batch_size=BATCH_SIZE)
+    return len(novas)
+
+
+def listas_por_turma(hoje=None):
+    """
+    Membros de cada turma ativa: [(turma, [membros])], na ordem das turmas.
+
+    Sempre duas consultas (turmas e membros): com TURMAS_ALOCACAO_PRECALCULADA
+    os membros vêm da tabela AlocacaoTurma; sem, são distribuídos pela idade
+    calculada no banco. Um membro pode aparecer em mais de uma turma se as
+    faixas se sobrepuserem.
+    """
+    hoje = hoje or timezone.localdate()
+    turmas = list(Turma.objects.filter(ativo=True).order_by('idade_minima', 'nome'))
+    if not turmas:
+        return []
+
+    listas = {turma.id: [] for turma in turmas}
+    if settings.TURMAS_ALOCACAO_PRECALCULADA:
+        membros = MembroFamilia.objects.filter(
+            ativo=True, alocacoes_turma__turma__in=listas
+        ).annotate(turma_alocada=F('alocacoes_turma__turma_id')).com_idade(hoje)
+        for membro in membros:
+            listas[membro.turma_alocada].append(membro)
+    else:
+        for membro in membros_elegiveis(turmas, hoje):
+            for turma in turmas_da_idade(membro.idade, turmas):
+                listas[turma.id].append(membro)
+
+    return [(turma, listas[turma.id]) for turma in turmas]
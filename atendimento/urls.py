@@ -36,6 +36,9 @@ urlpatterns = [
     path('relatorios/frequencia-membros/', 
          views.RelatoriosViewSet.as_view({'get': 'frequencia_membros'}), 
          name='relatorio-frequencia-membros'),
+    path('relatorios/frequencia-mensal/', 
+         views.RelatoriosViewSet.as_view({'get': 'frequencia_mensal'}), 
+         name='relatorio-frequencia-mensal'),
     path('relatorios/entregas-cestas/', 
          views.RelatoriosViewSet.as_view({'get': 'entregas_cestas'}), 
          name='relatorio-entregas-cestas'),
@@ -1,21 +1,40 @@
+from asgiref.sync import sync_to_async
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.settings import api_settings
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Count, Q, F, Sum, Case, When, IntegerField, Value, BooleanField, CharField
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, OuterRef, Q, F, Sum, Case, When, IntegerField, Value, BooleanField, CharField
 from django.db.models.functions import Concat
-from django.utils import timezone
-from datetime import timedelta
+from django.utils.dateparse import parse_date
+from django.utils.http import parse_etags
 
 from .models import (
     Endereco, Familia, Responsavel, MembroFamilia, 
-    Turma, Encontro, Presenca, EntregaCesta, ConfiguracaoSistema
+    Turma, Encontro, Presenca, EntregaCesta, ConfiguracaoSistema, ProgramaSocial,
+    MENSAGEM_ENTREGA_DUPLICADA
 )
 from .serializers import *
+from . import autocomplete, frequencia, relatorios, turmas
+from .assincrono import AsyncViewSetMixin, servido_por_asgi
+from .campos import CamposDinamicosViewMixin
+from .filters import BuscaTextualFilter
+from .pagination import CursorOpcionalPagination
+from . import cache as cache_relatorios
+from .renderers import NDJSONRenderer, CSVRenderer, resposta_streaming
+
+def autocomplete_response(request, indice):
+    try:
+        limite = min(int(request.query_params.get('limite', 10)), 50)
+    except ValueError:
+        limite = 10
+    return Response(indice.buscar(request.query_params.get('q', ''), max(limite, 1)))
 
 # ViewSets
-class EnderecoViewSet(viewsets.ModelViewSet):
+class EnderecoViewSet(CamposDinamicosViewMixin, viewsets.ModelViewSet):
     queryset = Endereco.objects.all()
     serializer_class = EnderecoSerializer
     permission_classes = [IsAuthenticated]
@@ -24,12 +43,13 @@ class EnderecoViewSet(viewsets.ModelViewSet):
     search_fields = ['rua', 'bairro', 'cidade', 'cep']
     ordering_fields = ['cidade', 'bairro', 'rua']
 
-class FamiliaViewSet(viewsets.ModelViewSet):
-    queryset = Familia.objects.all()
+class FamiliaViewSet(CamposDinamicosViewMixin, viewsets.ModelViewSet):
+    # O endereço e os programas sociais são serializados em cada família
+    queryset = Familia.objects.select_related('endereco').prefetch_related('programas')
     serializer_class = FamiliaSerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['recebe_programas_sociais']
+    filter_backends = [DjangoFilterBackend, BuscaTextualFilter, filters.OrderingFilter]
+    filterset_fields = ['recebe_programas_sociais', 'programas']
     search_fields = ['nome', 'endereco__rua', 'endereco__bairro', 'endereco__cidade']
     ordering_fields = ['nome', 'data_cadastro']
     
@@ -41,17 +61,19 @@ class FamiliaViewSet(viewsets.ModelViewSet):
         if membros_ativos is not None:
             queryset = queryset.filter(membros__ativo=True).distinct()
         
-        # Filtro por programa social
+        # Filtro por programa social (busca na tabela de programas e segue pelo índice da relação)
         programa_social = self.request.query_params.get('programa_social', None)
         if programa_social:
-            queryset = queryset.filter(programas_sociais__icontains=programa_social)
+            queryset = queryset.filter(
+                programas__in=ProgramaSocial.objects.filter(nome__icontains=programa_social)
+            ).distinct()
             
         return queryset
     
     @action(detail=True, methods=['get'])
     def membros(self, request, pk=None):
         familia = self.get_object()
-        membros = familia.membros.all()
+        membros = familia.membros.com_idade()
         serializer = MembroFamiliaSerializer(membros, many=True)
         return Response(serializer.data)
     
@@ -68,49 +90,95 @@ class FamiliaViewSet(viewsets.ModelViewSet):
         entregas = familia.entregas_cestas.all()
         serializer = EntregaCestaSerializer(entregas, many=True)
         return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        # [[id, nome], ...] do índice em memória, sem consulta ao banco
+        return autocomplete_response(request, autocomplete.familias)
 
-class ResponsavelViewSet(viewsets.ModelViewSet):
+class ResponsavelViewSet(CamposDinamicosViewMixin, viewsets.ModelViewSet):
     queryset = Responsavel.objects.all()
     serializer_class = ResponsavelSerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, BuscaTextualFilter, filters.OrderingFilter]
     filterset_fields = ['principal', 'sexo']
     search_fields = ['nome_completo', 'cpf', 'telefone', 'familia__nome']
     ordering_fields = ['nome_completo', 'data_nascimento']
 
-class MembroFamiliaViewSet(viewsets.ModelViewSet):
+class MembroFamiliaViewSet(CamposDinamicosViewMixin, viewsets.ModelViewSet):
     queryset = MembroFamilia.objects.all()
     serializer_class = MembroFamiliaSerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    # Definido por ação: @action(throttle_scope=...)
+    throttle_scope = None
+    filter_backends = [DjangoFilterBackend, BuscaTextualFilter, filters.OrderingFilter]
     filterset_fields = ['sexo', 'ativo', 'tamanho_camiseta']
     search_fields = ['nome_completo', 'familia__nome']
-    ordering_fields = ['nome_completo', 'data_nascimento']
+    ordering_fields = ['nome_completo', 'data_nascimento', 'idade']
+    # Faixas padrão do histograma: idade inicial de cada faixa
+    faixas_padrao = [0, 3, 6, 9, 12, 15, 18]
     
     def get_queryset(self):
-        queryset = super().get_queryset()
-        
-        # Filtro por faixa etária
-        idade_min = self.request.query_params.get('idade_min', None)
-        idade_max = self.request.query_params.get('idade_max', None)
+        # Idade calculada pelo banco: serializada, ordenável (?ordering=idade) e filtrável
+        queryset = super().get_queryset().com_idade()
         
+        # Filtro por faixa etária (idade exata, convertida em intervalo de datas)
+        idade_min = self.idade_param('idade_min')
+        idade_max = self.idade_param('idade_max')
         if idade_min is not None or idade_max is not None:
-            today = timezone.now().date()
-            
-            if idade_min is not None:
-                min_date = today.replace(year=today.year - int(idade_min) - 1)
-                queryset = queryset.filter(data_nascimento__lte=min_date)
-                
-            if idade_max is not None:
-                max_date = today.replace(year=today.year - int(idade_max) - 1)
-                queryset = queryset.filter(data_nascimento__gte=max_date)
+            queryset = queryset.idade_entre(idade_min, idade_max)
         
         return queryset
+    
+    def idade_param(self, nome, padrao=None):
+        valor = self.request.query_params.get(nome)
+        if valor in (None, ''):
+            return padrao
+        try:
+            idade = int(valor)
+        except ValueError:
+            idade = -1
+        if idade < 0:
+            raise ValidationError({nome: 'Informe uma idade em anos (inteiro não negativo).'})
+        return idade
+    
+    @action(detail=False, methods=['get'], throttle_scope='relatorios')
+    def faixas_etarias(self, request):
+        # Histograma por faixa etária em uma consulta; ?faixas=0,3,6,12 define as idades iniciais
+        try:
+            limites = [int(x) for x in request.query_params.get('faixas', '').split(',') if x.strip()]
+        except ValueError:
+            limites = None
+        if limites is not None and any(limite < 0 for limite in limites):
+            limites = None
+        if limites is None:
+            return Response(
+                {'error': 'faixas deve ser uma lista de idades separadas por vírgula'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        membros = self.filter_queryset(self.get_queryset())
+        return Response(membros.faixas_etarias(limites or self.faixas_padrao))
+    
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        # [[id, nome], ...] de membros ativos, do índice em memória
+        return autocomplete_response(request, autocomplete.membros)
+    
+    @action(detail=True, methods=['get'])
+    def frequencia(self, request, pk=None):
+        # Histórico mês a mês, lido do resumo FrequenciaMensal
+        membro = self.get_object()
+        frequencias = membro.frequencias_mensais.order_by('-mes')
+        serializer = FrequenciaMensalSerializer(frequencias, many=True)
+        return Response(serializer.data)
 
-class TurmaViewSet(viewsets.ModelViewSet):
+class TurmaViewSet(CamposDinamicosViewMixin, viewsets.ModelViewSet):
     queryset = Turma.objects.all()
     serializer_class = TurmaSerializer
     permission_classes = [IsAuthenticated]
+    # Definido por ação: @action(throttle_scope=...)
+    throttle_scope = None
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['ativo']
     search_fields = ['nome', 'descricao']
@@ -119,43 +187,33 @@ class TurmaViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def membros(self, request, pk=None):
         turma = self.get_object()
-        hoje = timezone.now().date()
         
-        # Calcula a data de nascimento mínima e máxima para a turma
-        data_nasc_min = hoje.replace(year=hoje.year - turma.idade_maxima - 1)
-        data_nasc_max = hoje.replace(year=hoje.year - turma.idade_minima)
-        
-        membros = MembroFamilia.objects.filter(
-            data_nascimento__gte=data_nasc_min,
-            data_nascimento__lte=data_nasc_max,
-            ativo=True
-        )
-        
-        # Anota cada membro com sua idade
-        membros = membros.annotate(
-            idade=hoje.year - F('data_nascimento__year') - 
-                  Case(
-                      When(
-                          data_nascimento__month__gt=hoje.month,
-                          then=Value(1)
-                      ),
-                      When(
-                          data_nascimento__month=hoje.month,
-                          data_nascimento__day__gt=hoje.day,
-                          then=Value(1)
-                      ),
-                      default=Value(0),
-                      output_field=IntegerField()
-                  )
-        )
+        # Membros ativos com idade exata dentro da faixa da turma
+        membros = MembroFamilia.objects.filter(ativo=True).idade_entre(
+            turma.idade_minima, turma.idade_maxima
+        ).com_idade()
         
         serializer = MembroFamiliaSerializer(membros, many=True)
         return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'], throttle_scope='chamada')
+    def membros_por_turma(self, request):
+        # Listas de todas as turmas ativas de uma vez, para a recepção antes do encontro
+        return Response([
+            {
+                **TurmaSerializer(turma).data,
+                'total_membros': len(membros),
+                'membros': MembroFamiliaSerializer(membros, many=True).data,
+            }
+            for turma, membros in turmas.listas_por_turma()
+        ])
 
-class EncontroViewSet(viewsets.ModelViewSet):
+class EncontroViewSet(AsyncViewSetMixin, CamposDinamicosViewMixin, viewsets.ModelViewSet):
     queryset = Encontro.objects.all()
     serializer_class = EncontroSerializer
     permission_classes = [IsAuthenticated]
+    # Definido por ação: @action(throttle_scope=...)
+    throttle_scope = None
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['ativo']
     search_fields = ['descricao']
@@ -175,16 +233,16 @@ class EncontroViewSet(viewsets.ModelViewSet):
             
         return queryset
     
-    @action(detail=True, methods=['get'])
+    @action(detail=True, methods=['get'], throttle_scope='chamada')
     def presencas(self, request, pk=None):
         encontro = self.get_object()
         presencas = encontro.presencas.all()
         serializer = PresencaSerializer(presencas, many=True)
         return Response(serializer.data)
     
-    @action(detail=True, methods=['post'])
-    def registrar_presencas(self, request, pk=None):
-        encontro = self.get_object()
+    @action(detail=True, methods=['post'], throttle_scope='chamada')
+    async def registrar_presencas(self, request, pk=None):
+        encontro = await sync_to_async(self.get_object)()
         presencas_data = request.data.get('presencas', [])
         
         # Validação básica
@@ -194,47 +252,88 @@ class EncontroViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Processa cada registro de presença
+        # Valida todos os membros de uma vez
+        ids_informados = set()
+        for presenca_data in presencas_data:
+            try:
+                ids_informados.add(int(presenca_data.get('membro_id')))
+            except (TypeError, ValueError):
+                pass
+        membros_validos = {
+            membro_id async for membro_id in
+            MembroFamilia.objects.filter(id__in=ids_informados, ativo=True).values_list('id', flat=True)
+        }
+        existentes = {
+            membro_id async for membro_id in
+            Presenca.objects.filter(encontro=encontro, membro_id__in=membros_validos).values_list('membro_id', flat=True)
+        }
+        
+        # Monta os registros; se um membro aparecer mais de uma vez, vale o último
         resultados = []
+        registros = {}
         for presenca_data in presencas_data:
             membro_id = presenca_data.get('membro_id')
-            presente = presenca_data.get('presente', False)
-            observacoes = presenca_data.get('observacoes', '')
-            
             try:
-                membro = MembroFamilia.objects.get(id=membro_id, ativo=True)
-                
-                # Atualiza ou cria o registro de presença
-                presenca, created = Presenca.objects.update_or_create(
-                    membro=membro,
-                    encontro=encontro,
-                    defaults={
-                        'presente': presente,
-                        'observacoes': observacoes,
-                        'usuario_registro': request.user
-                    }
-                )
-                
-                resultados.append({
-                    'membro_id': membro_id,
-                    'status': 'created' if created else 'updated',
-                    'presenca_id': presenca.id
-                })
-                
-            except MembroFamilia.DoesNotExist:
+                membro_pk = int(membro_id)
+            except (TypeError, ValueError):
+                membro_pk = None
+            
+            if membro_pk not in membros_validos:
                 resultados.append({
                     'membro_id': membro_id,
                     'status': 'error',
                     'error': 'Membro não encontrado ou inativo'
                 })
+                continue
+            
+            created = membro_pk not in existentes and membro_pk not in registros
+            registros[membro_pk] = Presenca(
+                membro_id=membro_pk,
+                encontro=encontro,
+                presente=presenca_data.get('presente', False),
+                observacoes=presenca_data.get('observacoes', ''),
+                usuario_registro=request.user
+            )
+            resultados.append({
+                'membro_id': membro_id,
+                'status': 'created' if created else 'updated',
+                'membro_pk': membro_pk
+            })
+        
+        # Transações não são assíncronas no Django: a gravação roda numa thread
+        presenca_ids = await sync_to_async(self.gravar_presencas)(encontro, registros)
+        
+        for resultado in resultados:
+            if 'membro_pk' in resultado:
+                resultado['presenca_id'] = presenca_ids[resultado.pop('membro_pk')]
         
         return Response({
             'encontro_id': encontro.id,
             'data': encontro.data,
             'resultados': resultados
         })
+    
+    def gravar_presencas(self, encontro, registros):
+        # Grava tudo em uma única instrução (INSERT ... ON CONFLICT DO UPDATE)
+        with transaction.atomic():
+            Presenca.objects.bulk_create(
+                registros.values(),
+                update_conflicts=True,
+                unique_fields=['membro', 'encontro'],
+                update_fields=['presente', 'observacoes', 'usuario_registro']
+            )
+            presenca_ids = dict(
+                Presenca.objects.filter(encontro=encontro, membro_id__in=registros)
+                .values_list('membro_id', 'id')
+            ) if registros else {}
+            
+            # bulk_create não dispara post_save: atualiza o resumo mensal e o cache aqui
+            frequencia.recalcular(membro_ids=registros, meses=[encontro.data])
+        
+        cache_relatorios.invalidar_modelo(Presenca)
+        return presenca_ids
 
-class PresencaViewSet(viewsets.ModelViewSet):
+class PresencaViewSet(CamposDinamicosViewMixin, viewsets.ModelViewSet):
     queryset = Presenca.objects.all()
     serializer_class = PresencaSerializer
     permission_classes = [IsAuthenticated]
@@ -242,52 +341,188 @@ class PresencaViewSet(viewsets.ModelViewSet):
     filterset_fields = ['presente', 'membro', 'encontro']
     search_fields = ['membro__nome_completo', 'encontro__descricao', 'observacoes']
     ordering_fields = ['-data_registro', '-encontro__data']
+    # Ordenação estável e indexada, usada também pela paginação por cursor
+    ordering = ('-data_registro', '-id')
+    pagination_class = CursorOpcionalPagination
+    throttle_scope = 'chamada'
     
     def perform_create(self, serializer):
         serializer.save(usuario_registro=self.request.user)
 
-class EntregaCestaViewSet(viewsets.ModelViewSet):
+class EntregaCestaViewSet(CamposDinamicosViewMixin, viewsets.ModelViewSet):
     queryset = EntregaCesta.objects.all()
     serializer_class = EntregaCestaSerializer
     permission_classes = [IsAuthenticated]
+    # Definido por ação: @action(throttle_scope=...)
+    throttle_scope = None
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['familia']
     search_fields = ['familia__nome', 'observacoes']
     ordering_fields = ['-data_entrega', '-data_registro']
+    # Ordenação estável e indexada, usada também pela paginação por cursor
+    ordering = ('-data_entrega', '-id')
+    pagination_class = CursorOpcionalPagination
     
     def get_queryset(self):
         queryset = super().get_queryset()
         
-        # Filtro por período
-        data_inicio = self.request.query_params.get('data_inicio', None)
-        data_fim = self.request.query_params.get('data_fim', None)
+        # Filtro por período (data_entrega é DateField: __lte já inclui o dia final)
+        data_inicio = self.data_param('data_inicio')
+        data_fim = self.data_param('data_fim')
         
         if data_inicio:
             queryset = queryset.filter(data_entrega__gte=data_inicio)
         if data_fim:
-            # Adiciona 1 dia para incluir o dia final
-            data_fim_obj = timezone.datetime.strptime(data_fim, '%Y-%m-%d').date()
-            queryset = queryset.filter(data_entrega__lte=data_fim_obj + timedelta(days=1))
+            queryset = queryset.filter(data_entrega__lte=data_fim)
             
         return queryset
     
+    def data_param(self, nome):
+        valor = self.request.query_params.get(nome)
+        if not valor:
+            return None
+        try:
+            data = parse_date(valor)
+        except ValueError:
+            data = None
+        if data is None:
+            raise ValidationError({nome: 'Data inválida, use o formato AAAA-MM-DD.'})
+        return data
+    
     def perform_create(self, serializer):
-        serializer.save(usuario_registro=self.request.user)
+        self.salvar(serializer, usuario_registro=self.request.user)
     
-    @action(detail=False, methods=['get'])
+    def perform_update(self, serializer):
+        self.salvar(serializer)
+    
+    def salvar(self, serializer, **kwargs):
+        # Uma entrega por família por mês: quem garante é a constraint entrega_familia_mes_unica,
+        # sem consulta prévia e sem corrida entre dois voluntários registrando a mesma família
+        try:
+            with transaction.atomic():
+                serializer.save(**kwargs)
+        except IntegrityError:
+            raise ValidationError({'data_entrega': [MENSAGEM_ENTREGA_DUPLICADA]})
+    
+    @action(detail=False, methods=['post'])
+    def lote(self, request):
+        """
+        Registra de uma vez as entregas do dia de distribuição.
+        
+        Espera {"data_entrega": "AAAA-MM-DD", "familias": [ids], "observacoes": "..."}
+        e devolve o resultado de cada família na ordem recebida.
+        """
+        familias_data = request.data.get('familias', [])
+        if not isinstance(familias_data, list):
+            return Response(
+                {'error': 'familias deve ser uma lista de ids'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            data_entrega = parse_date(str(request.data.get('data_entrega', '')))
+        except ValueError:
+            data_entrega = None
+        if data_entrega is None:
+            return Response(
+                {'error': 'data_entrega é obrigatória (AAAA-MM-DD)'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        mes_referencia = data_entrega.replace(day=1)
+        observacoes = request.data.get('observacoes') or None
+        
+        ids_informados = set()
+        for familia_id in familias_data:
+            try:
+                ids_informados.add(int(familia_id))
+            except (TypeError, ValueError):
+                pass
+        
+        with transaction.atomic():
+            # Elegibilidade de todas as famílias em uma consulta (existe e ainda não recebeu no
+            # mês), travando as famílias: a entrega de outra requisição para elas (o INSERT faz
+            # FOR KEY SHARE na família) espera esta transação, e a que veio antes já aparece aqui
+            elegibilidade = dict(
+                Familia.objects.select_for_update().filter(id__in=ids_informados).annotate(
+                    ja_recebeu=Exists(EntregaCesta.objects.filter(
+                        familia=OuterRef('pk'), mes_referencia=mes_referencia
+                    ))
+                ).order_by().values_list('id', 'ja_recebeu')
+            )
+            
+            resultados = []
+            novas = {}
+            for familia_id in familias_data:
+                try:
+                    familia_pk = int(familia_id)
+                except (TypeError, ValueError):
+                    familia_pk = None
+                
+                if familia_pk not in elegibilidade:
+                    resultados.append({'familia_id': familia_id, 'status': 'error', 'error': 'Família não encontrada'})
+                elif elegibilidade[familia_pk] or familia_pk in novas:
+                    resultados.append({'familia_id': familia_id, 'status': 'skipped', 'error': MENSAGEM_ENTREGA_DUPLICADA})
+                else:
+                    novas[familia_pk] = EntregaCesta(
+                        familia_id=familia_pk,
+                        data_entrega=data_entrega,
+                        observacoes=observacoes,
+                        usuario_registro=request.user
+                    )
+                    resultados.append({'familia_id': familia_id, 'status': 'created', 'familia_pk': familia_pk})
+            
+            # Uma instrução de INSERT. Com as famílias travadas, as entregas do mês delas que
+            # existirem depois dele são as desta requisição; ignore_conflicts fica como garantia
+            EntregaCesta.objects.bulk_create(novas.values(), ignore_conflicts=True)
+            entrega_ids = dict(
+                EntregaCesta.objects.filter(
+                    mes_referencia=mes_referencia, familia_id__in=novas
+                ).values_list('familia_id', 'id')
+            ) if novas else {}
+        
+        # bulk_create não dispara post_save
+        cache_relatorios.invalidar_modelo(EntregaCesta)
+        
+        for resultado in resultados:
+            familia_pk = resultado.pop('familia_pk', None)
+            if familia_pk is None:
+                continue
+            if familia_pk in entrega_ids:
+                resultado['entrega_id'] = entrega_ids[familia_pk]
+            else:
+                resultado.update(status='skipped', error=MENSAGEM_ENTREGA_DUPLICADA)
+        
+        return Response({
+            'data_entrega': data_entrega,
+            'total_registradas': len(entrega_ids),
+            'resultados': resultados
+        })
+    
+    @action(detail=False, methods=['get'], throttle_scope='relatorios')
     def resumo_mensal(self, request):
-        # Agrupa as entregas por mês/ano
-        resumo = EntregaCesta.objects.extra({
-            'mes_ano': "to_char(data_entrega, 'MM/YYYY')"
-        }).values('mes_ano').annotate(
-            total=Count('id'),
-            mes=Min('data_entrega__month'),
-            ano=Min('data_entrega__year')
-        ).order_by('-ano', '-mes')
-        
-        return Response(resumo)
+        # A ETag muda junto com a versão das entregas no cache: sem alterações, 304 sem ir ao banco
+        etag = cache_relatorios.etag('resumo_mensal', request.query_params, request.accepted_renderer.format)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        
+        def produzir():
+            # Agrupa as entregas pelo mês de referência numa única consulta (filtros e período aplicados)
+            meses = self.filter_queryset(self.get_queryset()).order_by().values(
+                'mes_referencia'
+            ).annotate(total=Count('id')).order_by('-mes_referencia')
+            return [
+                {
+                    'mes_ano': linha['mes_referencia'].strftime('%m/%Y'),
+                    'mes': linha['mes_referencia'].month,
+                    'ano': linha['mes_referencia'].year,
+                    'total': linha['total'],
+                }
+                for linha in meses
+            ]
+        
+        resumo = cache_relatorios.obter('resumo_mensal', request.query_params, produzir)
+        return Response(resumo, headers={'ETag': etag, 'Cache-Control': 'private, no-cache'})
 
-class ConfiguracaoSistemaViewSet(viewsets.ModelViewSet):
+class ConfiguracaoSistemaViewSet(CamposDinamicosViewMixin, viewsets.ModelViewSet):
     queryset = ConfiguracaoSistema.objects.all()
     serializer_class = ConfiguracaoSistemaSerializer
     permission_classes = [IsAdminUser]  # Apenas administradores podem modificar
@@ -307,12 +542,53 @@ class ConfiguracaoSistemaViewSet(viewsets.ModelViewSet):
         return super().get_object()
 
 # Views para relatórios e dashboards
-class RelatoriosViewSet(viewsets.ViewSet):
+class RelatoriosViewSet(AsyncViewSetMixin, viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
+    # Relatórios têm limite próprio (DEFAULT_THROTTLE_RATES), separado da chamada e das leituras
+    throttle_scope = 'relatorios'
+    # ?format=ndjson e ?format=csv devolvem o relatório em streaming
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [NDJSONRenderer, CSVRenderer]
+    formatos_streaming = (NDJSONRenderer.format, CSVRenderer.format)
+    
+    def is_streaming(self, request):
+        return request.accepted_renderer.format in self.formatos_streaming
+    
+    def streaming(self, request, nome, linhas, linhas_csv=None):
+        formato = request.accepted_renderer.format
+        if formato == CSVRenderer.format and linhas_csv is not None:
+            linhas = linhas_csv(linhas)
+        return resposta_streaming(
+            formato, linhas, relatorios.COLUNAS_CSV[nome], nome, assincrono=servido_por_asgi(request)
+        )
+    
+    def periodo(self, request):
+        """
+        (data_inicio, data_fim) já convertidas, ou (None, None) se faltarem ou forem inválidas.
+
+        Os relatórios em streaming só consultam o banco durante o envio, quando o
+        status 200 já saiu: parâmetros inválidos precisam ser recusados antes (400).
+        """
+        try:
+            data_inicio = parse_date(request.query_params.get('data_inicio', ''))
+            data_fim = parse_date(request.query_params.get('data_fim', ''))
+        except ValueError:
+            return None, None
+        return data_inicio, data_fim
+    
+    def filtro_id(self, request, nome):
+        valor = request.query_params.get(nome)
+        if valor and not valor.isdigit():
+            raise ValidationError({nome: 'Informe um id numérico.'})
+        return valor
+    
+    async def em_cache(self, request, nome, produzir):
+        # Resultado compartilhado entre os workers, invalidado pelos sinais de atendimento.signals.
+        # As consultas do relatório rodam fora do event loop.
+        return await sync_to_async(cache_relatorios.obter)(nome, request.query_params, produzir)
     
     def list(self, request):
         # Lista de relatórios disponíveis
-        relatorios = [
+        disponiveis = [
             {
                 'nome': 'frequencia_membros',
                 'descricao': 'Frequência de membros por período',
@@ -323,6 +599,16 @@ class RelatoriosViewSet(viewsets.ViewSet):
                     {'nome': 'familia_id', 'tipo': 'integer', 'obrigatorio': False},
                 ]
             },
+            {
+                'nome': 'frequencia_mensal',
+                'descricao': 'Frequência de membros mês a mês',
+                'parametros': [
+                    {'nome': 'data_inicio', 'tipo': 'date', 'obrigatorio': True},
+                    {'nome': 'data_fim', 'tipo': 'date', 'obrigatorio': True},
+                    {'nome': 'membro_id', 'tipo': 'integer', 'obrigatorio': False},
+                    {'nome': 'familia_id', 'tipo': 'integer', 'obrigatorio': False},
+                ]
+            },
             {
                 'nome': 'entregas_cestas',
                 'descricao': 'Entregas de cestas por período',
@@ -342,200 +628,97 @@ class RelatoriosViewSet(viewsets.ViewSet):
                 'parametros': []
             }
         ]
-        return Response(relatorios)
+        return Response(disponiveis)
     
     @action(detail=False, methods=['get'])
-    def frequencia_membros(self, request):
-        data_inicio = request.query_params.get('data_inicio')
-        data_fim = request.query_params.get('data_fim')
-        membro_id = request.query_params.get('membro_id')
-        familia_id = request.query_params.get('familia_id')
+    async def frequencia_membros(self, request):
+        data_inicio, data_fim = self.periodo(request)
+        membro_id = self.filtro_id(request, 'membro_id')
+        familia_id = self.filtro_id(request, 'familia_id')
         
         if not data_inicio or not data_fim:
             return Response(
-                {'error': 'Os parâmetros data_inicio e data_fim são obrigatórios'},
+                {'error': 'Os parâmetros data_inicio e data_fim são obrigatórios (AAAA-MM-DD)'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Filtra os encontros no período
-        encontros = Encontro.objects.filter(
-            data__gte=data_inicio,
-            data__lte=data_fim,
-            ativo=True
-        ).order_by('data')
-        
-        # Filtra os membros ativos
-        membros = MembroFamilia.objects.filter(ativo=True)
-        if membro_id:
-            membros = membros.filter(id=membro_id)
-        if familia_id:
-            membros = membros.filter(familia_id=familia_id)
-        
-        # Prepara os dados para o relatório
-        resultado = []
-        
-        for membro in membros:
-            # Conta presenças e faltas
-            presencas = Presenca.objects.filter(
-                membro=membro,
-                encontro__in=encontros
-            ).select_related('encontro')
-            
-            total_encontros = encontros.count()
-            total_presente = presencas.filter(presente=True).count()
-            total_faltas = presencas.filter(presente=False).count()
-            
-            # Calcula a frequência percentual
-            frequencia_percentual = 0
-            if total_encontros > 0:
-                frequencia_percentual = (total_presente / total_encontros) * 100
-            
-            # Detalhes das presenças
-            detalhes = []
-            for encontro in encontros:
-                presenca = presencas.filter(encontro=encontro).first()
-                detalhes.append({
-                    'data': encontro.data,
-                    'presente': presenca.presente if presenca else False,
-                    'observacoes': presenca.observacoes if presenca else ''
-                })
-            
-            resultado.append({
-                'membro_id': membro.id,
-                'membro_nome': membro.nome_completo,
-                'familia_id': membro.familia.id,
-                'familia_nome': str(membro.familia),
-                'total_encontros': total_encontros,
-                'total_presente': total_presente,
-                'total_faltas': total_faltas,
-                'frequencia_percentual': round(frequencia_percentual, 2),
-                'detalhes': detalhes
-            })
+        resultado = relatorios.frequencia_membros(
+            data_inicio, data_fim,
+            membro_id=membro_id,
+            familia_id=familia_id
+        )
         
-        return Response(resultado)
+        if self.is_streaming(request):
+            return self.streaming(request, 'frequencia_membros', resultado, relatorios.frequencia_membros_csv)
+        return Response(await self.em_cache(request, 'frequencia_membros', lambda: list(resultado)))
     
     @action(detail=False, methods=['get'])
-    def entregas_cestas(self, request):
-        data_inicio = request.query_params.get('data_inicio')
-        data_fim = request.query_params.get('data_fim')
+    async def frequencia_mensal(self, request):
+        data_inicio, data_fim = self.periodo(request)
         
         if not data_inicio or not data_fim:
             return Response(
-                {'error': 'Os parâmetros data_inicio e data_fim são obrigatórios'},
+                {'error': 'Os parâmetros data_inicio e data_fim são obrigatórios (AAAA-MM-DD)'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Filtra as entregas no período
-        entregas = EntregaCesta.objects.filter(
-            data_entrega__gte=data_inicio,
-            data_entrega__lte=data_fim
-        ).select_related('familia', 'usuario_registro')
+        # Lê o resumo mensal em vez das presenças
+        resultado = relatorios.frequencia_mensal(
+            data_inicio, data_fim,
+            membro_id=self.filtro_id(request, 'membro_id'),
+            familia_id=self.filtro_id(request, 'familia_id')
+        )
         
-        # Agrupa por mês/ano
-        resultado = {}
+        if self.is_streaming(request):
+            return self.streaming(request, 'frequencia_mensal', resultado, relatorios.frequencia_mensal_csv)
+        return Response(await self.em_cache(request, 'frequencia_mensal', lambda: list(resultado)))
+    
+    @action(detail=False, methods=['get'])
+    async def entregas_cestas(self, request):
+        data_inicio, data_fim = self.periodo(request)
         
-        for entrega in entregas:
-            mes_ano = entrega.data_entrega.strftime('%m/%Y')
-            
-            if mes_ano not in resultado:
-                resultado[mes_ano] = {
-                    'mes_ano': mes_ano,
-                    'mes': entrega.data_entrega.month,
-                    'ano': entrega.data_entrega.year,
-                    'total_entregas': 0,
-                    'familias': []
-                }
-            
-            resultado[mes_ano]['total_entregas'] += 1
-            resultado[mes_ano]['familias'].append({
-                'familia_id': entrega.familia.id,
-                'familia_nome': str(entrega.familia),
-                'data_entrega': entrega.data_entrega,
-                'usuario_registro': entrega.usuario_registro.get_full_name() if entrega.usuario_registro else 'Sistema',
-                'observacoes': entrega.observacoes
-            })
+        if not data_inicio or not data_fim:
+            return Response(
+                {'error': 'Os parâmetros data_inicio e data_fim são obrigatórios (AAAA-MM-DD)'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        # Ordena por data (mais recente primeiro)
-        resultado_ordenado = sorted(
-            resultado.values(),
-            key=lambda x: (x['ano'], x['mes']),
-            reverse=True
-        )
+        # Entregas agrupadas por mês (mais recente primeiro)
+        resultado = relatorios.entregas_cestas(data_inicio, data_fim)
         
-        return Response(resultado_ordenado)
+        if self.is_streaming(request):
+            return self.streaming(request, 'entregas_cestas', resultado, relatorios.entregas_cestas_csv)
+        return Response(await self.em_cache(request, 'entregas_cestas', lambda: list(resultado)))
     
     @action(detail=False, methods=['get'])
-    def grade_roupas(self, request):
+    async def grade_roupas(self, request):
         # Agrupa os membros por tamanho de roupa e calçado
-        membros = MembroFamilia.objects.filter(ativo=True)
-        
-        # Tamanhos de camiseta
-        tamanhos_camiseta = dict(MembroFamilia.TAMANHO_CAMISETA_CHOICES)
-        contagem_camisetas = membros.filter(tamanho_camiseta__isnull=False)\
-            .values('tamanho_camiseta')\
-            .annotate(total=Count('id'))\
-            .order_by('tamanho_camiseta')
-        
-        # Tamanhos de calça/bermuda
-        contagem_calcas = membros.filter(tamanho_calca__isnull=False)\
-            .values('tamanho_calca')\
-            .annotate(total=Count('id'))\
-            .order_by('tamanho_calca')
-        
-        # Números de calçado
-        contagem_calcados = membros.filter(numero_calcado__isnull=False)\
-            .values('numero_calcado')\
-            .annotate(total=Count('id'))\
-            .order_by('numero_calcado')
-        
-        # Formata os resultados
-        resultado = {
-            'camisetas': [
-                {'tamanho': tamanhos_camiseta.get(item['tamanho_camiseta'], item['tamanho_camiseta']), 
-                 'total': item['total']}
-                for item in contagem_camisetas
-            ],
-            'calcas': [
-                {'tamanho': item['tamanho_calca'], 'total': item['total']}
-                for item in contagem_calcas
-            ],
-            'calcados': [
-                {'numero': item['numero_calcado'], 'total': item['total']}
-                for item in contagem_calcados
-            ]
-        }
+        resultado = relatorios.grade_roupas()
         
-        return Response(resultado)
+        if self.is_streaming(request):
+            return self.streaming(request, 'grade_roupas', resultado)
+        return Response(await self.em_cache(
+            request, 'grade_roupas', lambda: relatorios.agrupar_grade_roupas(resultado)
+        ))
     
     @action(detail=False, methods=['get'])
-    def programas_sociais(self, request):
-        # Conta famílias por programa social
-        familias = Familia.objects.filter(recebe_programas_sociais=True)
+    async def programas_sociais(self, request):
+        # Conta famílias por programa social (maior primeiro)
+        resultado = relatorios.programas_sociais()
         
-        # Extrai programas sociais únicos
-        programas = {}
+        if self.is_streaming(request):
+            return self.streaming(request, 'programas_sociais', resultado)
         
-        for familia in familias:
-            if familia.programas_sociais:
-                # Divide por vírgula, ponto-e-vírgula ou quebra de linha
-                programas_familia = [p.strip() for p in familia.programas_sociais.replace(';', ',').replace('\n', ',').split(',') if p.strip()]
-                
-                for programa in programas_familia:
-                    if programa not in programas:
-                        programas[programa] = 0
-                    programas[programa] += 1
-        
-        # Ordena por quantidade (maior primeiro)
-        programas_ordenados = [
-            {'programa': programa, 'total_familias': total}
-            for programa, total in sorted(programas.items(), key=lambda x: x[1], reverse=True)
-        ]
-        
-        # Total de famílias que recebem algum programa
-        total_familias = familias.count()
+        def produzir():
+            programas_ordenados = list(resultado)
+            
+            # Total de famílias que recebem algum programa
+            total_familias = Familia.objects.filter(recebe_programas_sociais=True).count()
+            
+            return {
+                'total_familias': total_familias,
+                'total_programas': len(programas_ordenados),
+                'programas': programas_ordenados
+            }
         
-        return Response({
-            'total_familias': total_familias,
-            'total_programas': len(programas_ordenados),
-            'programas': programas_ordenados
-        })
+        return Response(await self.em_cache(request, 'programas_sociais', produzir))
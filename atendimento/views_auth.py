@@ -1,19 +1,25 @@
+from django.contrib.auth import get_user_model
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from .serializers_auth import CustomTokenObtainPairSerializer, UserSerializer
+from .serializers_auth import CustomTokenObtainPairSerializer, CustomTokenRefreshSerializer, UserSerializer
 
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
+    throttle_scope = 'autenticacao'
 
 class CustomTokenRefreshView(TokenRefreshView):
-    pass
+    serializer_class = CustomTokenRefreshSerializer
+    throttle_scope = 'autenticacao'
 
 class UserProfileView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        serializer = UserSerializer(request.user)
+        # Lido do banco: é aqui que o cliente atualiza nome, tipo e is_staff, que nos
+        # claims do token (atendimento.authentication) só mudam quando ele expira
+        usuario = get_user_model().objects.get(pk=request.user.pk)
+        serializer = UserSerializer(usuario)
         return Response(serializer.data)
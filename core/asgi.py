@@ -22,6 +22,8 @@ if project_path not in sys.path:
 
 # Define o módulo de configurações do Django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+# Servido por ASGI: relatórios e registro de presenças como views assíncronas (atendimento.assincrono)
+os.environ.setdefault('SERVIDOR', 'asgi')
 
 # Importa e configura a aplicação ASGI do Django
 from django.core.asgi import get_asgi_application
@@ -0,0 +1,45 @@
+"""
+Conexões com o PostgreSQL, escolhidas por DB_POOL:
+
+    desativado  conexões persistentes por thread (CONN_MAX_AGE), o padrão
+    pgbouncer   conexões persistentes por thread, sem cursores do lado do servidor,
+                para um pgbouncer em modo transaction na frente do banco
+    interno     backend core.banco: cada worker mantém um pool do tamanho das suas
+                threads, e as requisições pegam e devolvem conexões já abertas
+"""
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .pool import estatisticas  # noqa: F401
+
+MODOS = ('interno', 'pgbouncer', 'desativado')
+
+
+def configurar(banco, modo, perfil, espera=10, vida_maxima=600):
+    """
+    Configuração de DATABASES[alias] para o modo de pool e o perfil do gunicorn (core.servidor).
+    """
+    if banco['ENGINE'] != 'django.db.backends.postgresql':
+        return banco
+    if modo not in MODOS:
+        raise ImproperlyConfigured(f'DB_POOL deve ser um de {", ".join(MODOS)}, não "{modo}"')
+
+    banco = dict(banco)
+    if modo == 'interno':
+        banco.update({
+            'ENGINE': 'core.banco',
+            # A conexão volta ao pool no fim de cada requisição; o pool é que a mantém aberta
+            'CONN_MAX_AGE': 0,
+            'POOL': {'TAMANHO': perfil['conexoes_banco'], 'ESPERA': espera, 'VIDA_MAXIMA': vida_maxima},
+        })
+        return banco
+
+    # Sob ASGI o código síncrono de cada requisição roda numa thread própria;
+    # conexões persistentes ficariam presas a threads já descartadas
+    banco['CONN_MAX_AGE'] = 0 if perfil['asgi'] else vida_maxima
+    banco['CONN_HEALTH_CHECKS'] = True
+    if modo == 'pgbouncer':
+        # Em modo transaction o cursor de .iterator() poderia ir para outra conexão do servidor
+        banco['DISABLE_SERVER_SIDE_CURSORS'] = True
+    return banco
+
@@ -0,0 +1,102 @@
+"""
+Backend PostgreSQL com pool de conexões por processo (ENGINE 'core.banco').
+
+Igual ao backend do Django, mas abrir e fechar a conexão passam a ser pegar e
+devolver uma conexão do pool. Tamanho e tempos em DATABASES[alias]['POOL'],
+preenchidos por core.banco.configurar().
+"""
+
+from functools import partial
+
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.backends.postgresql import base, creation
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+
+from . import pool as pools
+
+# TRANSACTION_STATUS_IDLE no psycopg2, TransactionStatus.IDLE no psycopg 3
+TRANSACAO_OCIOSA = 0
+
+
+def conexao_utilizavel(conexao):
+    try:
+        with conexao.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        if not conexao.autocommit:
+            conexao.rollback()
+    except base.Database.Error:
+        return False
+    return True
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Conexões ociosas no pool impediriam o DROP DATABASE
+        pools.encerrar(lambda pool: pool.nome == self.connection.alias)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+    pool = None
+    # Cursores do servidor (.iterator()) abertos com esta conexão
+    cursores_nomeados = False
+
+    def obter_pool(self, conn_params):
+        configuracao = self.settings_dict.get('POOL', {})
+        # Um pool por banco: os testes trocam NAME pelo banco de testes
+        chave = (self.alias, repr(sorted(conn_params.items())))
+        return pools.obter_pool(chave, lambda: pools.Pool(
+            self.alias,
+            configuracao.get('TAMANHO', 4),
+            espera=configuracao.get('ESPERA', 10),
+            vida_maxima=configuracao.get('VIDA_MAXIMA', 600),
+            verificar=conexao_utilizavel,
+        ))
+
+    def get_new_connection(self, conn_params):
+        # Criação e remoção do banco de testes usam conexões avulsas
+        if self.alias == NO_DB_ALIAS:
+            return super().get_new_connection(conn_params)
+
+        pool = self.obter_pool(conn_params)
+        try:
+            conexao = pool.obter(partial(super().get_new_connection, conn_params))
+        except pools.PoolEsgotado as exc:
+            raise self.Database.OperationalError(str(exc)) from exc
+        self.pool = pool
+        # super().get_new_connection() define o nível de isolamento só para conexões novas
+        nivel = self.settings_dict['OPTIONS'].get('isolation_level')
+        self.isolation_level = IsolationLevel.READ_COMMITTED if nivel is None else IsolationLevel(nivel)
+        return conexao
+
+    def create_cursor(self, name=None):
+        if name:
+            self.cursores_nomeados = True
+        return super().create_cursor(name)
+
+    def _close(self):
+        if self.pool is None or self.connection is None:
+            return super()._close()
+        pool, self.pool = self.pool, None
+        with self.wrap_database_errors:
+            # Depois de um erro a conexão pode estar quebrada: abre-se outra no lugar.
+            # Dentro de um atomic() o Django continua com a referência até o fim do bloco,
+            # então a conexão não pode ir para outra thread.
+            descartar = self.errors_occurred or self.in_atomic_block or self.connection.closed
+            if not descartar and self.connection.info.transaction_status != TRANSACAO_OCIOSA:
+                # Transação aberta sem atomic() (autocommit desligado): desfaz antes de devolver
+                try:
+                    self.connection.rollback()
+                except self.Database.Error:
+                    descartar = True
+            if not descartar and self.cursores_nomeados:
+                # Em autocommit o cursor de .iterator() é WITH HOLD e sobrevive ao commit:
+                # não pode seguir aberto na conexão emprestada à próxima requisição
+                try:
+                    with self.connection.cursor() as cursor:
+                        cursor.execute('CLOSE ALL')
+                except self.Database.Error:
+                    descartar = True
+            self.cursores_nomeados = False
+            pool.devolver(self.connection, descartar)
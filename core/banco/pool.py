@@ -0,0 +1,160 @@
+"""
+Pool de conexões por processo, usado pelo backend core.banco.
+
+Cada requisição pega uma conexão emprestada e a devolve ao terminar (o Django
+fecha a conexão no fim da requisição com CONN_MAX_AGE = 0), então as threads de
+um worker dividem poucas conexões já abertas, e o total no Postgres fica em
+workers x tamanho do pool. Sem psycopg2 aqui: quem pede a conexão sabe abri-la.
+"""
+
+import os
+import threading
+import time
+
+# Conexões ociosas há mais tempo que isso são testadas antes de voltar ao uso
+VERIFICAR_APOS = 30
+
+
+class PoolEsgotado(Exception):
+    pass
+
+
+class Pool:
+    def __init__(self, nome, tamanho, espera=10, vida_maxima=600, verificar=None):
+        self.nome = nome
+        self.tamanho = tamanho
+        self.espera = espera
+        self.vida_maxima = vida_maxima
+        self.verificar = verificar
+        self.pid = os.getpid()
+        self.encerrado = False
+        self.condicao = threading.Condition()
+        # (conexão, aberta em, devolvida em); a última devolvida sai primeiro
+        self.ociosas = []
+        self.abertas_em = {}
+        self.em_uso = 0
+        self.aguardando = 0
+        self.contadores = {'criadas': 0, 'descartadas': 0, 'emprestimos': 0, 'esperas': 0, 'esgotado': 0}
+        self.tempo_espera = 0.0
+
+    def obter(self, conectar):
+        """
+        Uma conexão ociosa ou, se houver vaga, uma nova aberta por conectar().
+        """
+        inicio = time.monotonic()
+        with self.condicao:
+            while not self.ociosas and self.em_uso >= self.tamanho:
+                restante = self.espera - (time.monotonic() - inicio)
+                if restante <= 0:
+                    self.contadores['esgotado'] += 1
+                    raise PoolEsgotado(
+                        f'Pool de conexões "{self.nome}" esgotado: {self.tamanho} em uso após {self.espera}s'
+                    )
+                self.aguardando += 1
+                try:
+                    self.condicao.wait(restante)
+                finally:
+                    self.aguardando -= 1
+            espera = time.monotonic() - inicio
+            if espera > 0.001:
+                self.contadores['esperas'] += 1
+                self.tempo_espera += espera
+            self.contadores['emprestimos'] += 1
+            self.em_uso += 1
+            ociosa = self.ociosas.pop() if self.ociosas else None
+
+        if ociosa is not None:
+            conexao, _, devolvida_em = ociosa
+            if self.verificar is None or time.monotonic() - devolvida_em < VERIFICAR_APOS or self.verificar(conexao):
+                return conexao
+            self.descartar(conexao)
+        try:
+            conexao = conectar()
+        except BaseException:
+            self.liberar()
+            raise
+        with self.condicao:
+            self.abertas_em[id(conexao)] = time.monotonic()
+            self.contadores['criadas'] += 1
+        return conexao
+
+    def devolver(self, conexao, descartar=False):
+        aberta_em = self.abertas_em.get(id(conexao), 0)
+        if descartar or self.encerrado or conexao.closed or time.monotonic() - aberta_em > self.vida_maxima:
+            self.descartar(conexao)
+            self.liberar()
+            return
+        with self.condicao:
+            self.ociosas.append((conexao, aberta_em, time.monotonic()))
+            self.em_uso -= 1
+            self.condicao.notify()
+
+    def liberar(self):
+        with self.condicao:
+            self.em_uso -= 1
+            self.condicao.notify()
+
+    def descartar(self, conexao):
+        with self.condicao:
+            self.abertas_em.pop(id(conexao), None)
+            self.contadores['descartadas'] += 1
+        try:
+            conexao.close()
+        except Exception:
+            pass
+
+    def encerrar(self):
+        """
+        Fecha as conexões ociosas (as emprestadas são fechadas ao voltar).
+        """
+        with self.condicao:
+            ociosas, self.ociosas = self.ociosas, []
+            self.encerrado = True
+        for conexao, _, _ in ociosas:
+            self.descartar(conexao)
+
+    def estatisticas(self):
+        with self.condicao:
+            return {
+                'tamanho': self.tamanho,
+                'abertas': len(self.abertas_em),
+                'em_uso': self.em_uso,
+                'ociosas': len(self.ociosas),
+                'aguardando': self.aguardando,
+                **self.contadores,
+                'espera_media_ms': round(self.tempo_espera / self.contadores['esperas'] * 1000, 2)
+                if self.contadores['esperas'] else 0,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def obter_pool(chave, criar):
+    """
+    Pool registrado para a chave neste processo, criado por criar() na primeira vez.
+    """
+    with _pools_lock:
+        pool = _pools.get(chave)
+        # Depois de um fork o processo filho não usa as conexões herdadas
+        if pool is None or pool.pid != os.getpid():
+            pool = _pools[chave] = criar()
+        return pool
+
+
+def estatisticas():
+    with _pools_lock:
+        pools = [pool for pool in _pools.values() if pool.pid == os.getpid()]
+    return {pool.nome: pool.estatisticas() for pool in pools}
+
+
+def encerrar(filtro=None):
+    """
+    Encerra os pools (todos ou os aceitos por filtro); o próximo uso cria outro.
+    """
+    with _pools_lock:
+        chaves = [chave for chave, pool in _pools.items() if filtro is None or filtro(pool)]
+        pools = [_pools.pop(chave) for chave in chaves]
+    for pool in pools:
+        pool.encerrar()
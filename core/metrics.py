@@ -0,0 +1,242 @@
+"""
+Instrumentação das requisições: número de consultas SQL, tempo no banco,
+tempo de serialização (``serializer.data``, medido pelo
+``CamposDinamicosSerializerMixin``), tempo de codificação da resposta (o
+renderer transformando ``response.data`` em bytes) e latência total por
+endpoint.
+
+Toda resposta recebe o cabeçalho ``Server-Timing`` e os números são
+agregados por processo, expostos no formato texto do Prometheus por
+``metricas_view`` (``/api/_metrics``, que exige ``METRICS_TOKEN`` fora do
+DEBUG). Cada worker do gunicorn mantém seus próprios contadores: colete de
+todos os workers ou some no Prometheus.
+"""
+
+import hmac
+import threading
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+# Limites superiores (segundos) das faixas do histograma de latência
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+class Metricas:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+
+    def registrar(self, view, metodo, status, duracao, consultas, tempo_db, tempo_serializacao, tempo_codificacao):
+        chave = (view, metodo, str(status))
+        with self.lock:
+            dados = self.endpoints.get(chave)
+            if dados is None:
+                dados = self.endpoints[chave] = {
+                    'requisicoes': 0,
+                    'duracao': 0.0,
+                    'consultas': 0,
+                    'tempo_db': 0.0,
+                    'tempo_serializacao': 0.0,
+                    'tempo_codificacao': 0.0,
+                    'buckets': [0] * len(BUCKETS),
+                }
+            dados['requisicoes'] += 1
+            dados['duracao'] += duracao
+            dados['consultas'] += consultas
+            dados['tempo_db'] += tempo_db
+            dados['tempo_serializacao'] += tempo_serializacao
+            dados['tempo_codificacao'] += tempo_codificacao
+            for i, limite in enumerate(BUCKETS):
+                if duracao <= limite:
+                    dados['buckets'][i] += 1
+
+    def limpar(self):
+        with self.lock:
+            self.endpoints.clear()
+
+    def prometheus(self):
+        with self.lock:
+            endpoints = {chave: dict(dados, buckets=list(dados['buckets'])) for chave, dados in self.endpoints.items()}
+
+        linhas = []
+
+        def metrica(nome, tipo, ajuda, campo):
+            linhas.append(f'# HELP {nome} {ajuda}')
+            linhas.append(f'# TYPE {nome} {tipo}')
+            for (view, metodo, status), dados in sorted(endpoints.items()):
+                linhas.append(f'{nome}{{{rotulos(view, metodo, status)}}} {dados[campo]}')
+
+        metrica('social_requests_total', 'counter', 'Requisições atendidas.', 'requisicoes')
+        metrica('social_db_queries_total', 'counter', 'Consultas SQL executadas.', 'consultas')
+        metrica('social_db_duration_seconds_total', 'counter', 'Tempo gasto em consultas SQL.', 'tempo_db')
+        metrica(
+            'social_serializer_duration_seconds_total', 'counter',
+            'Tempo gasto montando serializer.data.', 'tempo_serializacao'
+        )
+        metrica(
+            'social_encode_duration_seconds_total', 'counter',
+            'Tempo gasto pelo renderer codificando a resposta.', 'tempo_codificacao'
+        )
+
+        nome = 'social_request_duration_seconds'
+        linhas.append(f'# HELP {nome} Latência total da requisição.')
+        linhas.append(f'# TYPE {nome} histogram')
+        for (view, metodo, status), dados in sorted(endpoints.items()):
+            base = rotulos(view, metodo, status)
+            for limite, total in zip(BUCKETS, dados['buckets']):
+                linhas.append(f'{nome}_bucket{{{base},le="{limite}"}} {total}')
+            linhas.append(f'{nome}_bucket{{{base},le="+Inf"}} {dados["requisicoes"]}')
+            linhas.append(f'{nome}_sum{{{base}}} {dados["duracao"]}')
+            linhas.append(f'{nome}_count{{{base}}} {dados["requisicoes"]}')
+
+        return '\n'.join(linhas) + '\n'
+
+
+def rotulos(view, metodo, status):
+    view = view.replace('\\', '\\\\').replace('"', '\\"')
+    return f'view="{view}",method="{metodo}",status="{status}"'
+
+
+metricas = Metricas()
+
+
+def nome_da_view(request):
+    """
+    Nome da view resolvida, ex.: ``RelatoriosViewSet.frequencia_membros``.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    cls = getattr(match.func, 'cls', None)
+    if cls is None:
+        return match.view_name or match._func_path
+    actions = getattr(match.func, 'actions', None)
+    if actions:
+        acao = actions.get(request.method.lower())
+        if acao:
+            return f'{cls.__name__}.{acao}'
+    return cls.__name__
+
+
+class ContadorConsultas:
+    # Wrapper para connection.execute_wrapper()
+    def __init__(self):
+        self.consultas = 0
+        self.tempo = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tempo += time.perf_counter() - inicio
+            self.consultas += 1
+
+
+class MetricasMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        inicio = time.perf_counter()
+        contador = ContadorConsultas()
+        request._metricas_serializacao = 0.0
+        request._metricas_codificacao = 0.0
+
+        with self.instrumentar(contador):
+            response = self.get_response(request)
+        return self.concluir(request, response, inicio, contador)
+
+    async def __acall__(self, request):
+        inicio = time.perf_counter()
+        contador = ContadorConsultas()
+        request._metricas_serializacao = 0.0
+        request._metricas_codificacao = 0.0
+
+        # No ASGI as consultas rodam na thread síncrona da requisição, cujas
+        # conexões não são as do event loop: instala os wrappers lá
+        stack = await sync_to_async(self.instrumentar)(contador)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.concluir(request, response, inicio, contador)
+
+    def instrumentar(self, contador):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(contador))
+        return stack
+
+    def concluir(self, request, response, inicio, contador):
+        duracao = time.perf_counter() - inicio
+        tempo_serializacao = request._metricas_serializacao
+        tempo_codificacao = request._metricas_codificacao
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={contador.tempo * 1000:.1f};desc="{contador.consultas} queries"',
+            f'serializer;dur={tempo_serializacao * 1000:.1f}',
+            f'encode;dur={tempo_codificacao * 1000:.1f}',
+            f'total;dur={duracao * 1000:.1f}',
+        ])
+
+        metricas.registrar(
+            nome_da_view(request), request.method, response.status_code,
+            duracao, contador.consultas, contador.tempo, tempo_serializacao, tempo_codificacao
+        )
+        return response
+
+    def process_template_response(self, request, response):
+        # As respostas do DRF são renderizadas depois deste hook: mede até o callback pós-renderização
+        inicio = time.perf_counter()
+
+        def fim_codificacao(response):
+            request._metricas_codificacao += time.perf_counter() - inicio
+
+        response.add_post_render_callback(fim_codificacao)
+        return response
+
+
+def medir_serializacao(request, duracao):
+    """
+    Soma ``duracao`` ao tempo de serialização da requisição, se ela passou pelo middleware.
+    """
+    # Request do DRF: os atributos do middleware estão na HttpRequest original
+    request = getattr(request, '_request', request)
+    if hasattr(request, '_metricas_serializacao'):
+        request._metricas_serializacao += duracao
+
+
+def token_valido(request):
+    """
+    Se a requisição traz ``Authorization: Bearer <METRICS_TOKEN>``.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token:
+        return False
+    # Comparação em tempo constante: o tempo de resposta não revela quanto do token bateu
+    return hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode())
+
+
+def metricas_view(request):
+    """
+    Métricas agregadas das requisições no formato texto do Prometheus.
+    """
+    if getattr(settings, 'METRICS_TOKEN', ''):
+        if not token_valido(request):
+            return HttpResponseForbidden()
+    elif not settings.DEBUG:
+        # Sem token o endpoint seria público: só permitido em desenvolvimento
+        return HttpResponseForbidden()
+    return HttpResponse(metricas.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
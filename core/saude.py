@@ -0,0 +1,39 @@
+"""
+Health check (/api/_saude): 200 com o banco respondendo, 503 sem ele.
+
+Por padrão a resposta traz só o status. Com METRICS_TOKEN configurado e
+informado ("Authorization: Bearer <token>"), traz também a latência do banco,
+o estado dos pools de conexões (core.banco) e o perfil do gunicorn. Cada
+worker tem o seu pool: os números são do worker que atendeu.
+"""
+
+import os
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.http import JsonResponse
+
+from core import banco
+from core.metrics import token_valido
+
+
+def saude_view(request):
+    inicio = time.perf_counter()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        disponivel = True
+    except DatabaseError:
+        disponivel = False
+
+    latencia = round((time.perf_counter() - inicio) * 1000, 2)
+
+    resposta = {'status': 'ok' if disponivel else 'erro', 'banco': {'disponivel': disponivel}}
+    if token_valido(request):
+        resposta['banco']['latencia_ms'] = latencia
+        resposta['banco']['pool'] = settings.DB_POOL if connection.vendor == 'postgresql' else None
+        resposta['pid'] = os.getpid()
+        resposta['pools'] = banco.estatisticas()
+        resposta['perfil'] = settings.PERFIL_SERVIDOR
+    return JsonResponse(resposta, status=200 if disponivel else 503)
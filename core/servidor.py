@@ -0,0 +1,116 @@
+"""
+Perfil do gunicorn: quantos workers e threads cabem neste contêiner.
+
+os.cpu_count() devolve os núcleos do host, não o limite do contêiner, e
+cpu_count() * 2 + 1 workers estoura a memória de instâncias pequenas. Aqui os
+limites vêm do cgroup (v2 ou v1) e o número de workers é o menor entre o que
+a CPU comporta e o que cabe na memória. Usado por gunicorn.conf.py e pelo
+tamanho do pool de conexões (core.banco) em core.settings.
+
+Variáveis de ambiente:
+    WEB_CONCURRENCY                  força o número de workers
+    GUNICORN_THREADS                 força as threads por worker (gthread)
+    GUNICORN_MEMORIA_POR_WORKER_MB   memória reservada por worker (padrão 200)
+    SERVIDOR                         'asgi' para workers do uvicorn
+    DB_POOL_TAMANHO                  força o tamanho do pool de conexões por worker
+    DB_CONEXOES_MAXIMAS              conexões que o Postgres aceita da aplicação (divididas entre os workers)
+"""
+
+import math
+import os
+
+CGROUP = '/sys/fs/cgroup'
+
+# Memória (MB) de um worker com o Django carregado, somadas as threads
+MEMORIA_POR_WORKER_MB = 200
+# Fração do limite de memória usada pelos workers (o resto fica para o master e picos)
+FRACAO_MEMORIA = 0.8
+THREADS_PADRAO = 3
+# Sob ASGI cada requisição em andamento usa uma thread (e uma conexão) própria
+CONEXOES_ASGI = 10
+
+# Valores de memory.limit_in_bytes acima disso significam "sem limite" no cgroup v1
+SEM_LIMITE_V1 = 1 << 60
+
+
+def _ler(caminho):
+    try:
+        with open(caminho) as arquivo:
+            return arquivo.read().strip()
+    except OSError:
+        return None
+
+
+def limite_cpu(raiz=CGROUP):
+    """
+    CPUs permitidas pelo cgroup (pode ser fracionário), ou None sem limite.
+    """
+    # cgroup v2: "<quota> <período>" ou "max <período>"
+    valor = _ler(os.path.join(raiz, 'cpu.max'))
+    if valor:
+        quota, periodo = valor.split()
+        if quota == 'max':
+            return None
+        return int(quota) / int(periodo)
+    # cgroup v1: quota -1 significa sem limite
+    quota = _ler(os.path.join(raiz, 'cpu', 'cpu.cfs_quota_us'))
+    periodo = _ler(os.path.join(raiz, 'cpu', 'cpu.cfs_period_us'))
+    if quota and periodo and int(quota) > 0:
+        return int(quota) / int(periodo)
+    return None
+
+
+def limite_memoria(raiz=CGROUP):
+    """
+    Limite de memória do cgroup em bytes, ou None sem limite.
+    """
+    valor = _ler(os.path.join(raiz, 'memory.max'))
+    if valor:
+        return None if valor == 'max' else int(valor)
+    valor = _ler(os.path.join(raiz, 'memory', 'memory.limit_in_bytes'))
+    if valor and int(valor) < SEM_LIMITE_V1:
+        return int(valor)
+    return None
+
+
+def cpus_disponiveis(raiz=CGROUP):
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+    limite = limite_cpu(raiz)
+    if limite is not None:
+        cpus = min(cpus, max(1, math.ceil(limite)))
+    return cpus
+
+
+def perfil(ambiente=None, raiz=CGROUP):
+    """
+    Workers, threads e classe de worker para o gunicorn.
+    """
+    ambiente = os.environ if ambiente is None else ambiente
+    cpus = cpus_disponiveis(raiz)
+    memoria = limite_memoria(raiz)
+    memoria_por_worker = int(ambiente.get('GUNICORN_MEMORIA_POR_WORKER_MB', MEMORIA_POR_WORKER_MB)) * 1024 * 1024
+
+    workers = 2 * cpus + 1
+    if memoria is not None:
+        workers = min(workers, int(memoria * FRACAO_MEMORIA // memoria_por_worker))
+    if ambiente.get('WEB_CONCURRENCY'):
+        workers = int(ambiente['WEB_CONCURRENCY'])
+    workers = max(1, workers)
+
+    asgi = ambiente.get('SERVIDOR', 'wsgi') == 'asgi'
+    # Workers do uvicorn não usam threads do gunicorn
+    threads = 1 if asgi else int(ambiente.get('GUNICORN_THREADS', THREADS_PADRAO))
+
+    # Uma conexão por thread atendendo requisições, sem passar do limite do Postgres
+    conexoes = int(ambiente.get('DB_POOL_TAMANHO', CONEXOES_ASGI if asgi else threads))
+    if ambiente.get('DB_CONEXOES_MAXIMAS'):
+        conexoes = min(conexoes, int(ambiente['DB_CONEXOES_MAXIMAS']) // workers)
+    return {
+        'workers': workers,
+        'threads': threads,
+        'worker_class': 'uvicorn.workers.UvicornWorker' if asgi else 'gthread',
+        'asgi': asgi,
+        'cpus': cpus,
+        'memoria_mb': memoria // (1024 * 1024) if memoria is not None else None,
+        'conexoes_banco': max(1, conexoes),
+    }
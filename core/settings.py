@@ -14,8 +14,12 @@ https://docs.djangoproject.com/en/4.1/ref/settings/
 from pathlib import Path
 import os
 import sys
+import tempfile
 from decouple import config, Csv
 
+from core.banco import configurar as configurar_banco
+from core.servidor import perfil
+
 # Load environment variables from .env file
 if os.path.exists('.env'):
     from dotenv import load_dotenv
@@ -75,6 +79,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primeiro da lista para medir a requisição inteira
+    'core.metrics.MetricasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -131,6 +137,17 @@ if not all([DATABASES['default']['NAME'], DATABASES['default']['HOST']]):
         }
     }
 
+# Pool de conexões com o PostgreSQL (core.banco): DB_POOL=desativado, pgbouncer ou interno.
+# O pool interno (opcional) de cada worker tem o tamanho do perfil do gunicorn (core.servidor),
+# de modo que workers x DB_POOL_TAMANHO fique dentro de DB_CONEXOES_MAXIMAS
+PERFIL_SERVIDOR = perfil()
+DB_POOL = config('DB_POOL', default='desativado')
+DB_POOL_ESPERA = config('DB_POOL_ESPERA', default=10, cast=float)
+DB_POOL_VIDA_MAXIMA = config('DB_POOL_VIDA_MAXIMA', default=600, cast=int)
+DATABASES['default'] = configurar_banco(
+    DATABASES['default'], DB_POOL, PERFIL_SERVIDOR, espera=DB_POOL_ESPERA, vida_maxima=DB_POOL_VIDA_MAXIMA
+)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -231,10 +248,58 @@ LOGIN_URL = '/admin/login/'
 LOGIN_REDIRECT_URL = '/admin/'
 LOGOUT_REDIRECT_URL = '/admin/login/'
 
+# Cache
+# O cache dos relatórios, as ETags e o índice de autocomplete dependem de versões gravadas
+# no cache padrão, que precisa ser o mesmo para todos os workers. Com REDIS_URL ele é
+# compartilhado por todas as instâncias; sem ele, por arquivos em CACHE_DIR, compartilhados
+# pelos workers desta máquina (com mais de uma instância, configure REDIS_URL)
+REDIS_URL = config('REDIS_URL', default='')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': config('CACHE_DIR', default=os.path.join(tempfile.gettempdir(), 'social-cache')),
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+
+# Throttling (atendimento.throttling): contadores no Redis quando houver; sem ele,
+# num arquivo SQLite compartilhado pelos processos desta máquina
+THROTTLE_REDIS_URL = config('THROTTLE_REDIS_URL', default=REDIS_URL)
+THROTTLE_SQLITE_PATH = config(
+    'THROTTLE_SQLITE_PATH', default=os.path.join(tempfile.gettempdir(), 'social-throttle.sqlite3')
+)
+
+# Cache dos relatórios (RelatoriosViewSet)
+RELATORIOS_CACHE_ALIAS = config('RELATORIOS_CACHE_ALIAS', default='default')
+RELATORIOS_CACHE_TIMEOUT = config('RELATORIOS_CACHE_TIMEOUT', default=60 * 60, cast=int)
+
+# Listas de turmas lidas da tabela AlocacaoTurma em vez de calculadas a cada requisição.
+# Exige o comando diário "python manage.py atualizar_alocacao_turmas".
+TURMAS_ALOCACAO_PRECALCULADA = config('TURMAS_ALOCACAO_PRECALCULADA', default=False, cast=bool)
+
+# Miniaturas das fotos dos membros (atendimento.miniaturas), geradas num pool de threads
+# depois do commit. Com MINIATURAS_ASSINCRONAS=False são geradas no próprio processo da requisição.
+MINIATURAS_ASSINCRONAS = config('MINIATURAS_ASSINCRONAS', default=True, cast=bool)
+MINIATURAS_WORKERS = config('MINIATURAS_WORKERS', default=2, cast=int)
+
+# Métricas por endpoint (core.metrics), expostas em /api/_metrics
+# Se definido, o endpoint exige o cabeçalho "Authorization: Bearer <token>"
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
 # Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Leituras autenticadas pelos claims do token, sem consultar o usuário no banco
+        'atendimento.authentication.ClaimsJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     ],
@@ -257,13 +322,21 @@ REST_FRAMEWORK = {
         'rest_framework.parsers.FormParser',
         'rest_framework.parsers.MultiPartParser',
     ],
+    # Contadores compartilhados entre os workers (atendimento.throttling)
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle',
+        'atendimento.throttling.AnonThrottle',
+        'atendimento.throttling.UsuarioThrottle',
+        'atendimento.throttling.EscopoThrottle',
     ],
+    # Ajustáveis por ambiente (testes de carga numa instância local, por exemplo)
     'DEFAULT_THROTTLE_RATES': {
-        'anon': '100/day',
-        'user': '1000/day',
+        'anon': config('THROTTLE_ANON', default='100/day'),
+        'user': config('THROTTLE_USER', default='1000/day'),
+        # Escopos (throttle_scope) contados à parte do limite 'user'
+        'relatorios': config('THROTTLE_RELATORIOS', default='60/hour'),
+        'chamada': config('THROTTLE_CHAMADA', default='1000/hour'),
+        # Login e renovação do token, por IP (fora do limite 'anon')
+        'autenticacao': config('THROTTLE_AUTENTICACAO', default='20/min'),
     },
     'DEFAULT_SCHEMA_CLASS': 'rest_framework.schemas.coreapi.AutoSchema',
 }
@@ -292,7 +365,7 @@ SIMPLE_JWT = {
     
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
-    'TOKEN_USER_CLASS': 'rest_framework_simplejwt.models.TokenUser',
+    'TOKEN_USER_CLASS': 'atendimento.authentication.UsuarioToken',
     
     'JTI_CLAIM': 'jti',
     
@@ -301,14 +374,18 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=7),
     
     # Custom settings
-    'TOKEN_OBTAIN_SERIALIZER': 'rest_framework_simplejwt.serializers.TokenObtainPairSerializer',
-    'TOKEN_REFRESH_SERIALIZER': 'rest_framework_simplejwt.serializers.TokenRefreshSerializer',
+    'TOKEN_OBTAIN_SERIALIZER': 'atendimento.serializers_auth.CustomTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'atendimento.serializers_auth.CustomTokenRefreshSerializer',
     'TOKEN_VERIFY_SERIALIZER': 'rest_framework_simplejwt.serializers.TokenVerifySerializer',
     'TOKEN_BLACKLIST_SERIALIZER': 'rest_framework_simplejwt.serializers.TokenBlacklistSerializer',
     'SLIDING_TOKEN_OBTAIN_SERIALIZER': 'rest_framework_simplejwt.serializers.TokenObtainSlidingSerializer',
     'SLIDING_TOKEN_REFRESH_SERIALIZER': 'rest_framework_simplejwt.serializers.TokenRefreshSlidingSerializer',
 }
 
+# Segundos que cada processo guarda o Usuario carregado para requisições de escrita
+# (atendimento.authentication). 0 desliga o cache.
+JWT_USUARIO_CACHE_TTL = config('JWT_USUARIO_CACHE_TTL', default=30, cast=int)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
@@ -7,6 +7,8 @@ from .settings import *
 import os
 import dj_database_url
 
+from core.banco import configurar as configurar_banco
+
 # Security settings
 DEBUG = os.environ.get('DEBUG', 'False') == 'True'
 SECRET_KEY = os.environ.get('SECRET_KEY', 'django-insecure-default-key-for-development-only')
@@ -20,11 +22,14 @@ DATABASES = {
         'PASSWORD': os.environ.get('PGPASSWORD', ''),
         'HOST': os.environ.get('PGHOST', ''),
         'PORT': os.environ.get('PGPORT', ''),
-        'CONN_MAX_AGE': 600,
-        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Mesmo pool de conexões de settings.py (DB_POOL), dimensionado pelo perfil do gunicorn
+DATABASES['default'] = configurar_banco(
+    DATABASES['default'], DB_POOL, PERFIL_SERVIDOR, espera=DB_POOL_ESPERA, vida_maxima=DB_POOL_VIDA_MAXIMA
+)
+
 # Security settings
 ALLOWED_HOSTS = os.environ.get('ALLOWED_HOSTS', '*').split(',')
 CSRF_TRUSTED_ORIGINS = os.environ.get('CSRF_TRUSTED_ORIGINS', '').split(',')
@@ -86,12 +91,8 @@ EMAIL_HOST_PASSWORD = os.environ.get('SENDGRID_API_KEY', '')
 DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'noreply@example.com')
 
 # Cache settings
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
-    }
-}
+# CACHES comes from settings.py: set REDIS_URL so that every instance shares the
+# same cache (otherwise a file-based cache shared by this machine's workers is used)
 
 # Django REST Framework settings
 REST_FRAMEWORK = {
@@ -99,6 +100,8 @@ REST_FRAMEWORK = {
         'rest_framework.renderers.JSONRenderer',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        # Como em settings.py, sem BasicAuthentication
+        'atendimento.authentication.ClaimsJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -106,4 +109,18 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
+    # Contadores compartilhados entre os workers (atendimento.throttling)
+    'DEFAULT_THROTTLE_CLASSES': REST_FRAMEWORK['DEFAULT_THROTTLE_CLASSES'],
+    # Limites de produção, por usuário (ou por IP sem login). Folgados para um dia de
+    # atendimento: a recepção registra a chamada e busca membros a cada tecla, e toda
+    # a equipe pode sair pelo mesmo IP. Permissões são verificadas antes: requisições
+    # anônimas a endpoints protegidos recebem 401 sem contar no limite 'anon'
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': os.environ.get('THROTTLE_ANON', '100/hour'),
+        'user': os.environ.get('THROTTLE_USER', '1000/hour'),
+        'relatorios': os.environ.get('THROTTLE_RELATORIOS', '120/hour'),
+        'chamada': os.environ.get('THROTTLE_CHAMADA', '3000/hour'),
+        # Login e renovação do token (por IP): contra tentativa de senhas
+        'autenticacao': os.environ.get('THROTTLE_AUTENTICACAO', '20/min'),
+    },
 }
@@ -18,18 +18,19 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from django.views.generic import RedirectView
-from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
-    TokenRefreshView,
-    TokenVerifyView,
-)
+from core.metrics import metricas_view
+from core.saude import saude_view
+from rest_framework_simplejwt.views import TokenVerifyView
+from atendimento.views_auth import CustomTokenObtainPairView, CustomTokenRefreshView
 
 urlpatterns = [
     path('', RedirectView.as_view(url='/admin/', permanent=True)),
     path('admin/', admin.site.urls),
+    path('api/_metrics', metricas_view, name='metrics'),  # Prometheus
+    path('api/_saude', saude_view, name='saude'),  # Health check e pool de conexões
     path('api/', include('atendimento.urls')),  # API endpoints
-    path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('api/token/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('api/token/refresh/', CustomTokenRefreshView.as_view(), name='token_refresh'),
     path('api/token/verify/', TokenVerifyView.as_view(), name='token_verify'),
     path('api-auth/', include('rest_framework.urls')),  # DRF login URLs (opcional)
 ]
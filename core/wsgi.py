@@ -9,6 +9,7 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/wsgi/
 
 import os
 import sys
+import traceback
 from pathlib import Path
 
 # Define o diretório base do projeto
@@ -22,11 +23,11 @@ if str(BASE_DIR) not in sys.path:
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 # Debug de importação
-if os.environ.get('DJANGO_DEBUG_IMPORT', '').lower() == 'true':
+DEBUG_IMPORT = os.environ.get('DJANGO_DEBUG_IMPORT', '').lower() == 'true'
+if DEBUG_IMPORT:
     print("\n=== WSGI STARTUP DEBUGGING ===")
     print(f"Python version: {sys.version}")
     print(f"Current working directory: {os.getcwd()}")
-    print(f"Project root: {PROJECT_ROOT}")
     print(f"Base directory: {BASE_DIR}")
     print(f"Python path: {sys.path}")
     print(f"Script path: {os.path.abspath(__file__)}")
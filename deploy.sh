@@ -30,11 +30,9 @@ python manage.py collectstatic --noinput --clear
 # echo "from django.contrib.auth import get_user_model; User = get_user_model(); User.objects.filter(username='admin').exists() or User.objects.create_superuser('admin', 'admin@example.com', 'senha123')" | python manage.py shell
 
 echo "=== Iniciando o servidor Gunicorn ==="
-exec gunicorn core.wsgi:application \
+# Workers e threads vêm de gunicorn.conf.py
+exec gunicorn \
     --bind 0.0.0.0:$PORT \
-    --workers 4 \
-    --worker-class gthread \
-    --threads 2 \
     --log-level=info \
     --access-logfile - \
     --error-logfile -
@@ -1,21 +1,47 @@
-import multiprocessing
+"""
+Configuração única do gunicorn (lida automaticamente do diretório do projeto).
 
-# Workers
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = 'gthread'
-threads = 3
+Workers e threads vêm de core.servidor.perfil(), a partir dos limites de CPU e
+memória do contêiner; WEB_CONCURRENCY e GUNICORN_THREADS forçam os valores.
+Com SERVIDOR=asgi os workers são do uvicorn e servem core.asgi.
+Para comparar perfis, veja o comando teste_carga (README).
+"""
 
-# Logging
-accesslog = '-'  # Log to stdout
-access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s"'
-errorlog = '-'  # Log to stderr
-loglevel = 'info'
+import os
+import sys
 
-# Timeouts
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core.servidor import perfil  # noqa: E402
+
+PERFIL = perfil()
+
+# Server socket
+bind = '0.0.0.0:' + os.environ.get('PORT', '8000')
+
+# Worker processes
+workers = PERFIL['workers']
+worker_class = PERFIL['worker_class']
+threads = PERFIL['threads']
 worker_connections = 1000
+max_requests = 1000
+max_requests_jitter = 50
+if PERFIL['asgi']:
+    # Relatórios e registro de presenças são views assíncronas (atendimento.assincrono)
+    wsgi_app = 'core.asgi:application'
+else:
+    wsgi_app = 'core.wsgi:application'
+
+# Timeouts
 timeout = 120
 keepalive = 5
 
+# Logging
+accesslog = '-'
+errorlog = '-'
+loglevel = 'info'
+access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s"'
+
 # Security
 limit_request_line = 4094
 limit_request_fields = 100
@@ -25,12 +51,39 @@ limit_request_field_size = 8190
 reload = False
 preload_app = True
 
-# Server socket
-bind = '0.0.0.0:8000'
-
 # Process naming
 proc_name = 'social_backend'
 
-# Worker processes
-max_requests = 1000
-max_requests_jitter = 50
+
+def when_ready(server):
+    server.log.info(
+        'Perfil: %(workers)s workers %(worker_class)s x %(threads)s threads, '
+        'pool de %(conexoes_banco)s conexões por worker '
+        '(%(cpus)s CPUs, limite de memória %(memoria_mb)s MB)', PERFIL
+    )
+
+
+def fechar_conexoes():
+    from django.db import connections
+    from core.banco import pool
+    connections.close_all()
+    # Com o pool (core.banco), close_all() só devolve as conexões; aqui são fechadas
+    pool.encerrar()
+
+
+def pre_fork(server, worker):
+    # Com preload_app o Django é carregado no master; uma conexão aberta ali
+    # seria herdada (o mesmo socket) por todos os workers
+    fechar_conexoes()
+
+
+def post_fork(server, worker):
+    # Cada worker começa sem conexões e abre as suas no primeiro uso
+    # (o master já fechou as dele em pre_fork, então nenhum socket é compartilhado)
+    from django.db import connections
+    connections.close_all()
+
+
+def worker_exit(server, worker):
+    # Reciclagem do worker (max_requests): encerra as sessões no Postgres em vez de derrubá-las
+    fechar_conexoes()
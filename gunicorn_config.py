@@ -1,35 +0,0 @@
-import multiprocessing
-import os
-
-# Server socket
-bind = '0.0.0.0:' + os.environ.get('PORT', '8000')
-
-# Worker processes
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = 'gthread'
-threads = 3
-worker_connections = 1000
-max_requests = 1000
-max_requests_jitter = 50
-
-# Timeouts
-timeout = 120
-keepalive = 5
-
-# Logging
-accesslog = '-'
-errorlog = '-'
-loglevel = 'info'
-access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s"'
-
-# Security
-limit_request_line = 4094
-limit_request_fields = 100
-limit_request_field_size = 8190
-
-# Debugging
-reload = False
-preload_app = True
-
-# Process naming
-proc_name = 'social_backend'
@@ -4,5 +4,6 @@
 set -e
 
 # Start the Gunicorn server
+# Workers, threads e a aplicação (WSGI ou, com SERVIDOR=asgi, ASGI) vêm de gunicorn.conf.py
 echo "=== Starting Gunicorn server ==="
-exec gunicorn core.wsgi:application --bind 0.0.0.0:${PORT:-10000} --workers 4 --worker-class gthread --threads 2 --log-file -
+exec gunicorn --bind 0.0.0.0:${PORT:-10000} --log-file -